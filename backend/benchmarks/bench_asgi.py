@@ -0,0 +1,144 @@
+"""
+Load test the sync (WSGI) and async (ASGI) patient read endpoints.
+
+Serves one seeded database with gunicorn gthread workers (the current
+deployment, /api/patients/) and then with uvicorn workers (/api/async/patients/),
+and drives each with --connections keep-alive clients for --seconds. Requests
+are a mix of list pages, searches and patient details. Reports throughput,
+latency percentiles and errors per server. Needs gunicorn and uvicorn.
+
+    python benchmarks/bench_asgi.py --patients 100000 --workers 2 --threads 8 --connections 64
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+
+from common import BACKEND_DIR, setup_django
+
+SEARCH_TERMS = ["Smi", "John", "Okafor", "Mar", "Tana"]
+
+
+def servers(args, port):
+    return {
+        "wsgi": ("/api/", [
+            sys.executable, "-m", "gunicorn", "core.wsgi", "--bind", f"127.0.0.1:{port}",
+            "--workers", str(args.workers), "--worker-class", "gthread", "--threads", str(args.threads),
+            "--log-level", "warning",
+        ]),
+        "asgi": ("/api/async/", [
+            sys.executable, "-m", "uvicorn", "core.asgi:application", "--port", str(port),
+            "--workers", str(args.workers), "--log-level", "warning", "--no-access-log",
+        ]),
+    }
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        with socket.socket() as sock:
+            if sock.connect_ex(("127.0.0.1", port)) == 0:
+                return
+        time.sleep(0.1)
+    raise RuntimeError(f"Server did not start on port {port}")
+
+
+async def fetch(reader, writer, path):
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: keep-alive\r\n\r\n".encode())
+    await writer.drain()
+    status_line = await reader.readline()
+    length = 0
+    while (line := await reader.readline()) not in (b"\r\n", b""):
+        name, _, value = line.decode("latin-1").partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+    await reader.readexactly(length)
+    return int(status_line.split()[1])
+
+
+async def client(port, prefix, patients, deadline, rng, latencies, errors):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        while time.perf_counter() < deadline:
+            kind = rng.random()
+            if kind < 0.4:
+                path = f"{prefix}patients/?page={rng.randint(1, 50)}"
+            elif kind < 0.6:
+                path = f"{prefix}patients/?search={rng.choice(SEARCH_TERMS)}"
+            else:
+                path = f"{prefix}patients/{rng.randint(1, patients)}/"
+            started = time.perf_counter()
+            try:
+                status = await fetch(reader, writer, path)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                errors.append(path)
+                writer.close()
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+                continue
+            if status >= 500:
+                errors.append(path)
+            else:
+                latencies.append((time.perf_counter() - started) * 1000)
+    finally:
+        writer.close()
+
+
+async def load(port, prefix, args):
+    latencies, errors = [], []
+    deadline = time.perf_counter() + args.seconds
+    await asyncio.gather(*(
+        client(port, prefix, args.patients, deadline, random.Random(i), latencies, errors)
+        for i in range(args.connections)
+    ))
+    return latencies, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--patients", type=int, default=100_000)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--connections", type=int, default=64)
+    parser.add_argument("--seconds", type=float, default=15)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    db_path = setup_django("asgi", args.patients)
+    from django.db import connection
+
+    connection.close()
+
+    env = {
+        **os.environ,
+        "DATABASE_PATH": str(db_path),
+        "DEBUG": "False",
+        "RESPONSE_CACHE_ENABLED": "False",
+        "REQUEST_METRICS_ENABLED": "False",
+        "PYTHONWARNINGS": "ignore:No directory at",
+    }
+    print(f"{args.patients:,} patients, {args.workers} workers, {args.connections} connections, {args.seconds:.0f}s "
+          f"(wsgi: {args.threads} threads per worker)")
+    print(f"{'server':<8}{'req/s':>8}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}{'errors':>8}")
+    for name, (prefix, command) in servers(args, args.port).items():
+        server = subprocess.Popen(command, cwd=BACKEND_DIR, env=env)
+        try:
+            wait_for_port(args.port)
+            asyncio.run(load(args.port, prefix, argparse.Namespace(**{**vars(args), "seconds": 2})))  # warm up
+            latencies, errors = asyncio.run(load(args.port, prefix, args))
+        finally:
+            server.terminate()
+            server.wait()
+
+        ordered = sorted(latencies) or [0]
+        point = lambda p: ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+        print(f"{name:<8}{len(latencies) / args.seconds:>8.0f}{point(0.5):>8.1f}ms{point(0.95):>8.1f}ms"
+              f"{point(0.99):>8.1f}ms{ordered[-1]:>8.1f}ms{len(errors):>8}")
+
+
+if __name__ == "__main__":
+    main()
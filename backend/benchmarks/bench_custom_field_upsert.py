@@ -0,0 +1,81 @@
+"""
+Compare writing N custom field values one at a time with the bulk upsert endpoint.
+
+"put" sends one PUT per existing value, as the custom field editor does
+(timed on --sample values and extrapolated). "orm" is the cheapest per-row
+path, update_or_create in one transaction. "bulk" is one POST to
+/api/custom-field-values/bulk-upsert/ with half new and half existing values.
+
+    python benchmarks/bench_custom_field_upsert.py --values 10000
+"""
+
+import argparse
+import time
+
+from common import count_queries, setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--values", type=int, default=10_000)
+    parser.add_argument("--sample", type=int, default=200)
+    args = parser.parse_args()
+
+    patients = args.values // 2
+    setup_django("upsert", patients)
+
+    from django.db import transaction
+    from rest_framework.test import APIClient
+
+    from patients.models import CustomField, CustomFieldValue, Patient
+
+    client = APIClient()
+    fields = [CustomField.objects.get_or_create(name=name)[0] for name in ("Bench A", "Bench B")]
+    patient_ids = list(Patient.objects.values_list("pk", flat=True)[:patients])
+    # Half the values exist up front, so the upsert both inserts and updates
+    CustomFieldValue.objects.filter(field_definition__in=fields).delete()
+    CustomFieldValue.objects.bulk_create(
+        CustomFieldValue(patient_id=pk, field_definition=fields[0], value="0") for pk in patient_ids
+    )
+    triples = [
+        {"patient": pk, "field_definition": field.pk, "value": str(run)}
+        for run, field in enumerate(fields, start=1) for pk in patient_ids
+    ][:args.values]
+
+    existing = list(CustomFieldValue.objects.filter(field_definition=fields[0])[:args.sample])
+    start = time.perf_counter()
+    for value in existing:
+        client.put(
+            f"/api/custom-field-values/{value.pk}/",
+            {"field_definition": value.field_definition_id, "value": "put"},
+            format="json",
+        )
+    put = (time.perf_counter() - start) * len(triples) / len(existing)
+
+    start = time.perf_counter()
+    with transaction.atomic():
+        orm_queries = count_queries(lambda: [
+            CustomFieldValue.objects.update_or_create(
+                patient_id=row["patient"], field_definition_id=row["field_definition"],
+                defaults={"value": row["value"]},
+            )
+            for row in triples
+        ])
+        transaction.set_rollback(True)
+    orm = time.perf_counter() - start
+
+    result = {}
+    start = time.perf_counter()
+    bulk_queries = count_queries(lambda: result.update(
+        client.post("/api/custom-field-values/bulk-upsert/", {"values": triples}, format="json").data
+    ))
+    bulk = time.perf_counter() - start
+
+    print(f"{len(triples)} values over {patients} patients")
+    print(f"{'put':<6}{put:>9.2f}s  (extrapolated from {len(existing)} requests)")
+    print(f"{'orm':<6}{orm:>9.2f}s  {orm_queries:>7} statements")
+    print(f"{'bulk':<6}{bulk:>9.2f}s  {bulk_queries:>7} statements  {result}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Time a full discharge-readiness rescore (one UPDATE over every patient).
+
+"per-patient" is the old-style alternative for comparison: load each patient's
+scores and fit the slope in Python, then save. It is timed on --sample
+patients and extrapolated.
+
+    python benchmarks/bench_discharge_scoring.py --patients 1000000
+"""
+
+import argparse
+import time
+
+from common import setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--patients", type=int, default=100_000)
+    parser.add_argument("--sample", type=int, default=2000)
+    args = parser.parse_args()
+
+    setup_django("list", args.patients)
+
+    from django.db import transaction
+
+    from patients.models import Patient
+
+    start = time.perf_counter()
+    Patient.objects.all().score_discharge_readiness()
+    bulk = time.perf_counter() - start
+    print(f"bulk UPDATE       {args.patients:>9} patients {bulk:>8.2f}s")
+
+    def fit(scores):
+        if len({day for day, _ in scores}) < 2:
+            return None
+        xs = [day.toordinal() for day, _ in scores]
+        ys = [score for _, score in scores]
+        mean_x, mean_y = sum(xs) / len(xs), sum(ys) / len(ys)
+        return 7 * sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / sum((x - mean_x) ** 2 for x in xs)
+
+    start = time.perf_counter()
+    with transaction.atomic():
+        for patient in Patient.objects.all()[:args.sample]:
+            patient.isi_trend_slope = fit(list(patient.isi_scores.order_by('date').values_list('date', 'score')))
+            patient.save(update_fields=['isi_trend_slope'])
+        transaction.set_rollback(True)
+    sample = time.perf_counter() - start
+    print(f"per-patient loop  {args.patients:>9} patients {sample * args.patients / args.sample:>8.2f}s (extrapolated)")
+
+
+if __name__ == "__main__":
+    main()
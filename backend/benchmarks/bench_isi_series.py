@@ -0,0 +1,97 @@
+"""
+Time the ISI series aggregation on a large score table.
+
+Seeds ``--patients`` patients, then tops the score table up to ``--scores`` rows
+spread over two years. "trunc" groups on Django's TruncWeek/TruncMonth in SQL,
+which SQLite evaluates through a Python callback per row before a temporary
+sort; "rollup" is what the endpoint does: group by the raw date over a covering
+index and merge the daily rows into buckets. Query plans are printed so the
+index use can be checked.
+
+    python benchmarks/bench_isi_series.py --patients 100000 --scores 10000000
+"""
+
+import argparse
+import random
+from datetime import date, timedelta
+
+from common import setup_django, timeit
+
+
+def top_up_scores(target, batch_size=50_000):
+    from django.db import connection, transaction
+
+    from patients.models import ISIScore, Patient
+    from patients.synthetic import ANCHOR
+
+    existing = ISIScore.objects.count()
+    if existing >= target:
+        return
+    rng = random.Random(1)
+    max_patient = Patient.objects.order_by('-id').values_list('id', flat=True).first()
+    first_day = ANCHOR - timedelta(days=730)
+    table = ISIScore._meta.db_table
+    with transaction.atomic(), connection.cursor() as cursor:
+        for start in range(existing, target, batch_size):
+            rows = [
+                (rng.randint(1, max_patient), rng.randint(0, 28), first_day + timedelta(days=rng.randint(0, 730)))
+                for _ in range(min(batch_size, target - start))
+            ]
+            cursor.executemany(f'INSERT INTO {table} (patient_id, score, date) VALUES (%s, %s, %s)', rows)
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--patients", type=int, default=100_000)
+    parser.add_argument("--scores", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    setup_django(f"series-{args.scores}", args.patients)
+    top_up_scores(args.scores)
+
+    from django.db.models import Avg, Count, Max, Min
+    from django.db.models.functions import TruncDay, TruncMonth, TruncWeek
+
+    from patients.models import ISIScore
+    from patients.series import ISIScoreSeries
+
+    def trunc(bucket, patient=None, group='cohort', points=None):
+        queryset = ISIScore.objects.order_by()
+        if patient:
+            queryset = queryset.filter(patient__in=patient)
+        group_by = ['patient'] if group == 'patient' else []
+        truncate = {'day': TruncDay, 'week': TruncWeek, 'month': TruncMonth}[bucket]
+        return list(
+            queryset.annotate(bucket=truncate('date')).values(*group_by, 'bucket')
+            .annotate(mean=Avg('score'), min=Min('score'), max=Max('score'), count=Count('*'))
+            .order_by(*group_by, 'bucket')
+        )
+
+    patients = list(ISIScore.objects.values_list('patient', flat=True).distinct()[:20])
+    cases = {
+        "cohort/month": dict(bucket='month'),
+        "cohort/week": dict(bucket='week'),
+        "cohort/week lttb=50": dict(bucket='week', points=50),
+        "20 patients/week": dict(bucket='week', patient=patients, group='patient'),
+    }
+    variants = {
+        "trunc": trunc,
+        "rollup": lambda **params: ISIScoreSeries(**params).series(),
+    }
+
+    print(f"{ISIScore.objects.count():,} scores")
+    print(f"{'case':<22}{'variant':<9}{'p50':>10}{'p95':>10}")
+    for name, params in cases.items():
+        for variant, run in variants.items():
+            p50, p95 = timeit(lambda: run(**params), repeat=args.repeat, warmup=1)
+            print(f"{name:<22}{variant:<9}{p50:>8.1f}ms{p95:>8.1f}ms")
+
+    print("\ncohort plan:\n" + ISIScoreSeries(bucket='week').queryset().explain())
+    print("\nper-patient plan:\n" + ISIScoreSeries(bucket='week', patient=patients, group='patient').queryset().explain())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Measure patient import throughput (rows per second) against SQLite.
+
+Generates synthetic NDJSON and CSV input in memory and feeds it through the same
+PatientImporter used by POST /api/patients/bulk/ and `manage.py import_patients`.
+
+    python benchmarks/bench_patient_import.py --rows 20000 --chunk-size 250 500 1000
+"""
+
+import argparse
+import io
+import json
+import time
+
+from common import setup_django
+
+
+def synthetic_rows(count):
+    """Import payloads for ``count`` synthetic patients, each with its first address only, as CSV holds one."""
+    from patients.synthetic import ANCHOR, SEED, SyntheticPatients
+
+    generator = SyntheticPatients(seed=SEED, anchor=ANCHOR)
+    for _ in range(count):
+        patient, weeks = generator.patient()
+        address = next(generator.addresses(patient))
+        yield {
+            "first_name": patient.first_name,
+            "last_name": patient.last_name,
+            "date_of_birth": str(patient.date_of_birth),
+            "status": patient.status,
+            "last_visit": str(patient.last_visit) if patient.last_visit else None,
+            "addresses": [{
+                "address_line1": address.address_line1,
+                "city": address.city, "state": address.state, "postal_code": address.postal_code,
+            }],
+            "isi_scores": [{"score": score.score, "date": str(score.date)} for score in generator.scores(patient, weeks)],
+        }
+
+
+def to_csv_line(row):
+    address = row["addresses"][0]
+    scores = ";".join(f"{s['date']}:{s['score']}" for s in row["isi_scores"])
+    return ",".join([
+        row["first_name"], row["last_name"], row["date_of_birth"], row["status"], row["last_visit"] or "",
+        address["address_line1"], address["city"], address["state"], address["postal_code"], scores,
+    ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=20_000)
+    parser.add_argument("--chunk-size", type=int, nargs="+", default=[250, 500, 1000])
+    args = parser.parse_args()
+
+    setup_django("import", 0)
+
+    from patients.importers import PatientImporter
+    from patients.models import Patient
+
+    ndjson = "\n".join(json.dumps(row) for row in synthetic_rows(args.rows))
+    csv_body = "first_name,last_name,date_of_birth,status,last_visit,address_line1,city,state,postal_code,isi_scores\n"
+    csv_body += "\n".join(to_csv_line(row) for row in synthetic_rows(args.rows))
+
+    print(f"{'format':<8}{'chunk':>7}{'rows/s':>10}{'seconds':>9}")
+    for chunk_size in args.chunk_size:
+        for name, body in (("ndjson", ndjson), ("csv", csv_body)):
+            Patient.objects.all().delete()
+            importer = PatientImporter(chunk_size=chunk_size)
+            read = importer.read_csv if name == "csv" else importer.read_ndjson
+            start = time.perf_counter()
+            result = importer.run(read(io.StringIO(body)))
+            elapsed = time.perf_counter() - start
+            assert result["failed"] == 0, result["errors"][:3]
+            print(f"{name:<8}{chunk_size:>7}{result['created'] / elapsed:>10.0f}{elapsed:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
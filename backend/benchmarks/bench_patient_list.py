@@ -0,0 +1,76 @@
+"""
+Compare /api/patients/ list latency with and without the unconditional distinct().
+
+The "before" viewset reproduces the old list path: city/state filters joined
+through addresses, LIKE '%term%' name search and every list call wrapped in
+distinct().
+
+    python benchmarks/bench_patient_list.py --patients 100000
+"""
+
+import argparse
+
+from common import setup_django, timeit
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--patients", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    setup_django("list", args.patients)
+
+    from django_filters.rest_framework import CharFilter
+    from rest_framework import filters
+    from rest_framework.test import APIRequestFactory
+
+    from patients.views import PatientFilter, PatientViewSet
+
+    class LegacyPatientFilter(PatientFilter):
+        city = CharFilter(field_name='addresses__city', lookup_expr='icontains')
+        state = CharFilter(field_name='addresses__state', lookup_expr='icontains')
+
+    class LegacyPatientViewSet(PatientViewSet):
+        filterset_class = LegacyPatientFilter
+        filter_backends = [filters.SearchFilter, *PatientViewSet.filter_backends[1:]]
+
+        def get_queryset(self):
+            return super().get_queryset().distinct()
+
+    factory = APIRequestFactory()
+    cases = {
+        "default page": {},
+        "deep page": {"page": 2000},
+        "city filter": {"city": "bos"},
+        "city + state": {"city": "san", "state": "tx"},
+        "city prefix": {"city_prefix": "bos"},
+        "city exact": {"city_exact": "boston"},
+        "state + city": {"state_exact": "tx", "city_prefix": "san"},
+        "status filter": {"status": "active"},
+        "search": {"search": "okafor"},
+        "search prefix": {"search": "ja"},
+    }
+    views = {
+        "before": LegacyPatientViewSet.as_view({"get": "list"}),
+        "after": PatientViewSet.as_view({"get": "list"}),
+    }
+
+    print(f"{'case':<16}{'before p50':>12}{'after p50':>12}{'before p95':>12}{'after p95':>12}")
+    for label, params in cases.items():
+        timings = {}
+        for name, view in views.items():
+            request_params = dict(params)
+
+            def run():
+                view(factory.get("/api/patients/", request_params)).render()
+
+            timings[name] = timeit(run, repeat=args.repeat)
+        print(
+            f"{label:<16}{timings['before'][0]:>10.1f}ms{timings['after'][0]:>10.1f}ms"
+            f"{timings['before'][1]:>10.1f}ms{timings['after'][1]:>10.1f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Measure SQL statements and latency per patient save as ISI history grows.
+
+Creates a patient with N weekly ISI scores through POST /api/patients/, then
+appends one score with a full PUT of the patient, as the patient form does,
+with a PATCH naming only the new score, and with the nested
+POST /api/patients/{id}/isi-scores/ append endpoint.
+
+    python benchmarks/bench_patient_save.py --history 10 100 500
+"""
+
+import argparse
+from datetime import date, timedelta
+
+from common import count_queries, setup_django, timeit
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--history", type=int, nargs="+", default=[10, 100, 500])
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    setup_django("save", 0)
+
+    from rest_framework.test import APIClient
+
+    client = APIClient()
+
+    def payload(weeks):
+        return {
+            "first_name": "Bench",
+            "last_name": "Patient",
+            "date_of_birth": "1990-01-01",
+            "addresses": [
+                {"address_line1": "1 Main St", "city": "Boston", "state": "MA", "postal_code": "02101"}
+            ],
+            "isi_scores": [
+                {"score": week % 28, "date": str(date(2020, 1, 6) + timedelta(weeks=week))}
+                for week in range(weeks)
+            ],
+        }
+
+    print(
+        f"{'history':>8}{'create stmts':>14}{'update stmts':>14}{'append stmts':>14}"
+        f"{'create p50':>12}{'update p50':>12}{'patch p50':>12}{'append p50':>12}"
+    )
+    for weeks in args.history:
+        created = {}
+        create_queries = count_queries(
+            lambda: created.update(client.post("/api/patients/", payload(weeks), format="json").data)
+        )
+        patient = created
+
+        update = {**patient, "isi_scores": patient["isi_scores"] + [
+            {"id": None, "score": 7, "date": str(date(2020, 1, 6) + timedelta(weeks=weeks))}
+        ]}
+        url = f"/api/patients/{patient['id']}/"
+        update_queries = count_queries(lambda: client.put(url, update, format="json"))
+        # Re-PUT the same payload so repeated runs measure a steady-state save
+        update = client.get(url).data
+
+        days = iter(range(1, 10_000))
+
+        def next_score():
+            return {"score": 7, "date": str(date(2020, 1, 6) + timedelta(weeks=weeks, days=next(days)))}
+
+        append_url = f"/api/patients/{patient['id']}/isi-scores/"
+        append_queries = count_queries(lambda: client.post(append_url, next_score(), format="json"))
+
+        create_ms, _ = timeit(lambda: client.post("/api/patients/", payload(weeks), format="json"), repeat=args.repeat)
+        update_ms, _ = timeit(lambda: client.put(url, update, format="json"), repeat=args.repeat)
+        patch_ms, _ = timeit(
+            lambda: client.patch(url, {"isi_scores": [next_score()]}, format="json"), repeat=args.repeat
+        )
+        append_ms, _ = timeit(lambda: client.post(append_url, next_score(), format="json"), repeat=args.repeat)
+        print(
+            f"{weeks:>8}{create_queries:>14}{update_queries:>14}{append_queries:>14}"
+            f"{create_ms:>10.1f}ms{update_ms:>10.1f}ms{patch_ms:>10.1f}ms{append_ms:>10.1f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Compare payload size and serialization time of list representations.
+
+"full" is the nested PatientSerializer the list used to return, "compact" the
+PatientListSerializer row and "compact+isi" the compact row with ?expand=isi_scores.
+Times cover fetching the rows (with their prefetches) and rendering JSON.
+
+    python benchmarks/bench_patient_serialization.py --patients 100000 --rows 20 100 1000
+"""
+
+import argparse
+
+from common import setup_django, timeit
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--patients", type=int, default=100_000)
+    parser.add_argument("--rows", type=int, nargs="+", default=[20, 100, 1000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    setup_django("list", args.patients)
+
+    from rest_framework.renderers import JSONRenderer
+    from rest_framework.request import Request
+    from rest_framework.test import APIRequestFactory
+
+    from patients.models import Patient
+    from patients.serializers import PatientListSerializer, PatientSerializer
+    from patients.views import plan_prefetches
+
+    factory = APIRequestFactory()
+    variants = {
+        "full": (PatientSerializer, {}),
+        "compact": (PatientListSerializer, {}),
+        "compact+isi": (PatientListSerializer, {"expand": "isi_scores"}),
+    }
+
+    print(f"{'rows':>6}  {'variant':<12}{'bytes':>11}{'bytes/row':>11}{'p50':>10}{'p95':>10}")
+    for rows in args.rows:
+        for name, (serializer_class, params) in variants.items():
+            context = {"request": Request(factory.get("/api/patients/", params))}
+
+            def render():
+                serializer = serializer_class(context=context)
+                queryset = Patient.objects.prefetch_related(*plan_prefetches(serializer))
+                if "primary_city" in serializer.fields:
+                    queryset = queryset.with_primary_address()
+                data = serializer_class(queryset[:rows], many=True, context=context).data
+                return JSONRenderer().render(data)
+
+            size = len(render())
+            p50, p95 = timeit(render, repeat=args.repeat)
+            print(f"{rows:>6}  {name:<12}{size:>11}{size // rows:>11}{p50:>8.1f}ms{p95:>8.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""
+Compare read/write throughput of the "basic" and "concurrent" SQLite profiles.
+
+Starts --workers processes with --threads threads each, like gunicorn gthread
+workers, all hammering one database for --seconds. Reads are patient list
+pages and details; writes (--write-ratio of requests) append an ISI score or
+patch a patient's status. Each profile is run in turn against the same file,
+and lock errors, throughput and latency are reported.
+
+    python benchmarks/bench_sqlite_concurrency.py --patients 20000 --workers 4 --threads 4
+"""
+
+import argparse
+import json
+import logging
+import os
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from common import setup_django
+
+PROFILES = ["basic", "concurrent"]
+
+
+def worker(db_path, patients, seconds, threads, write_ratio, start_at, seed):
+    """Run one worker process and return its per-operation counts and latencies."""
+    import django
+    from django.conf import settings
+
+    settings.DATABASES["default"]["NAME"] = db_path
+    settings.DEBUG = False
+    settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, "testserver"]
+    settings.RESPONSE_CACHE_ENABLED = False
+    settings.REQUEST_METRICS_ENABLED = False
+    django.setup()
+    # Failed requests are counted below; keep their tracebacks out of the report
+    logging.getLogger("django.request").setLevel(logging.CRITICAL)
+
+    from django.test import Client
+
+    results = {"reads": [], "writes": [], "errors": 0, "locked": 0}
+    lock = threading.Lock()
+
+    def run(thread_seed):
+        rng = random.Random(thread_seed)
+        client = Client()
+        reads, writes, errors, locked = [], [], 0, 0
+        while time.time() < start_at:
+            time.sleep(0.001)
+        deadline = start_at + seconds
+        while time.time() < deadline:
+            patient = rng.randint(1, patients)
+            write = rng.random() < write_ratio
+            started = time.perf_counter()
+            try:
+                if not write:
+                    if rng.random() < 0.5:
+                        response = client.get("/api/patients/", {"page": rng.randint(1, 50)})
+                    else:
+                        response = client.get(f"/api/patients/{patient}/")
+                elif rng.random() < 0.5:
+                    response = client.post(
+                        f"/api/patients/{patient}/isi-scores/",
+                        {"score": rng.randint(0, 28), "date": f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"},
+                        content_type="application/json",
+                    )
+                else:
+                    response = client.patch(
+                        f"/api/patients/{patient}/", {"status": rng.choice(["active", "churned"])},
+                        content_type="application/json",
+                    )
+                failed = response.status_code >= 500
+            except Exception as exc:
+                failed = True
+                locked += "locked" in str(exc)
+            elapsed = (time.perf_counter() - started) * 1000
+            if failed:
+                errors += 1
+            else:
+                (writes if write else reads).append(elapsed)
+        with lock:
+            results["reads"] += reads
+            results["writes"] += writes
+            results["errors"] += errors
+            results["locked"] += locked
+
+    pool = [threading.Thread(target=run, args=(seed * 1000 + i,)) for i in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    return results
+
+
+def run_profile(profile, db_path, args):
+    # WAL is a property of the file, so put it back to a rollback journal for the basic profile
+    with sqlite3.connect(db_path) as conn:
+        conn.execute(f"PRAGMA journal_mode={'WAL' if profile == 'concurrent' else 'DELETE'}")
+    env = {**os.environ, "DATABASE_PROFILE": profile}
+    start_at = time.time() + 3
+    outputs, processes = [], []
+    for seed in range(args.workers):
+        output = tempfile.NamedTemporaryFile(suffix=".json", delete=False)
+        outputs.append(Path(output.name))
+        processes.append(subprocess.Popen(
+            [sys.executable, __file__, "--worker", output.name, "--db", str(db_path),
+             "--patients", str(args.patients), "--seconds", str(args.seconds), "--threads", str(args.threads),
+             "--write-ratio", str(args.write_ratio), "--start-at", str(start_at), "--seed", str(seed)],
+            env=env,
+        ))
+    for process in processes:
+        process.wait()
+
+    totals = {"reads": [], "writes": [], "errors": 0, "locked": 0}
+    for output in outputs:
+        result = json.loads(output.read_text())
+        output.unlink()
+        for key in totals:
+            totals[key] += result[key]
+    return totals
+
+
+def p95(samples):
+    return sorted(samples)[int(len(samples) * 0.95) - 1] if samples else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--patients", type=int, default=20_000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=15)
+    parser.add_argument("--write-ratio", type=float, default=0.2)
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--db", help=argparse.SUPPRESS)
+    parser.add_argument("--start-at", type=float, help=argparse.SUPPRESS)
+    parser.add_argument("--seed", type=int, default=0, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        result = worker(args.db, args.patients, args.seconds, args.threads, args.write_ratio, args.start_at, args.seed)
+        Path(args.worker).write_text(json.dumps(result))
+        return
+
+    db_path = setup_django("concurrency", args.patients)
+    from django.db import connection
+
+    connection.close()
+
+    print(f"{args.workers} workers x {args.threads} threads, {args.seconds:.0f}s, {args.write_ratio:.0%} writes")
+    print(f"{'profile':<12}{'req/s':>8}{'reads/s':>9}{'writes/s':>10}{'errors':>8}{'locked':>8}"
+          f"{'read p50':>10}{'write p50':>11}{'write p95':>11}")
+    for profile in PROFILES:
+        totals = run_profile(profile, db_path, args)
+        reads, writes = totals["reads"], totals["writes"]
+        print(
+            f"{profile:<12}{(len(reads) + len(writes)) / args.seconds:>8.0f}{len(reads) / args.seconds:>9.0f}"
+            f"{len(writes) / args.seconds:>10.0f}{totals['errors']:>8}{totals['locked']:>8}"
+            f"{statistics.median(reads) if reads else 0:>8.1f}ms{statistics.median(writes) if writes else 0:>9.1f}ms"
+            f"{p95(writes):>9.1f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
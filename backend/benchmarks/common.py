@@ -0,0 +1,89 @@
+"""
+Shared setup for the standalone benchmark scripts.
+
+Each benchmark runs against its own SQLite file in the system temp directory so the
+checked-in db.sqlite3 is never touched. Seeded databases are reused between runs.
+"""
+
+import os
+import statistics
+import sys
+import tempfile
+import time
+import warnings
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
+# Measure the production profile; settings only default to it when DATABASE_PATH is set
+os.environ.setdefault("DATABASE_PROFILE", "concurrent")
+warnings.filterwarnings("ignore", message="No directory at")
+
+
+def setup_django(name, patients, seeder=None):
+    """
+    Point Django at a benchmark database seeded with ``patients`` rows and migrate it.
+
+    ``seeder(patients)`` fills a fresh database; it defaults to ``seed``.
+    """
+    from django.conf import settings
+
+    db_path = Path(tempfile.gettempdir()) / f"stellar-bench-{name}-{patients}-synthetic.sqlite3"
+    settings.DATABASES["default"]["NAME"] = db_path
+    settings.DEBUG = False
+    # Time the real query and serialization path, not response cache hits
+    settings.RESPONSE_CACHE_ENABLED = False
+    settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, "testserver"]
+
+    import django
+    from django.core.management import call_command
+
+    django.setup()
+    fresh = not db_path.exists()
+    call_command("migrate", verbosity=0)
+    if fresh:
+        (seeder or seed)(patients)
+    return db_path
+
+
+def seed(patients):
+    """Generate ``patients`` synthetic patients with ``SyntheticPatients``, fixed ``SEED`` and ``ANCHOR``."""
+    from patients.synthetic import ANCHOR, SEED, SyntheticPatients
+
+    SyntheticPatients(seed=SEED, anchor=ANCHOR).generate(patients)
+
+
+class QueryCounter:
+    """Execute wrapper counting SQL statements, unaffected by DEBUG or request signals."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def count_queries(func):
+    """Run ``func`` and return the number of SQL statements it executed."""
+    from django.db import connection
+
+    counter = QueryCounter()
+    with connection.execute_wrapper(counter):
+        func()
+    return counter.count
+
+
+def timeit(func, repeat=20, warmup=2):
+    """Return (median, p95) wall time of ``func`` in milliseconds."""
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.95) - 1]
@@ -0,0 +1,165 @@
+"""
+Repeatable API benchmark suite over synthetic clinics of several sizes.
+
+Each --patients size gets its own database, generated once by
+``common.seed`` (``SyntheticPatients``, fixed seed and anchor date) and reused
+by later runs.
+Every case goes through the full middleware, view and serializer stack with
+the response cache off. Sizes run in separate processes, and results are
+written as JSON so runs from two commits can be compared:
+
+    python benchmarks/suite.py --patients 1000 100000 1000000 --output before.json
+    python benchmarks/suite.py --patients 1000 100000 1000000 --output after.json --compare before.json
+"""
+
+import argparse
+import json
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+from datetime import date, datetime, timezone
+from pathlib import Path
+
+from common import BACKEND_DIR, count_queries, setup_django, timeit
+
+
+def patient_payload(rng):
+    from patients.synthetic import ANCHOR
+
+    return {
+        "first_name": "Suite",
+        "last_name": f"Patient{rng.randint(0, 10**6)}",
+        "date_of_birth": "1980-05-17",
+        "status": "active",
+        "last_visit": str(ANCHOR),
+        "addresses": [
+            {"address_line1": "1 Main St", "city": "Boston", "state": "MA", "postal_code": "02101"},
+        ],
+        "isi_scores": [{"score": 20 - week, "date": str(date(2025, 1, 6 + week))} for week in range(10)],
+    }
+
+
+def run_size(patients, repeat):
+    """Time every case against a database of ``patients`` and return {case: result}."""
+    setup_django("suite", patients)
+
+    from django.conf import settings
+    from django.db import connection
+    from rest_framework.test import APIClient
+
+    from patients.models import Patient, PatientTombstone
+    from patients.synthetic import SEED
+
+    settings.REQUEST_METRICS_ENABLED = False
+
+    client = APIClient()
+    rng = random.Random(SEED)
+    max_id = Patient.objects.order_by("-id").values_list("id", flat=True).first()
+    sample_ids = list(Patient.objects.filter(pk__in=[rng.randint(1, max_id) for _ in range(200)])
+                      .values_list("id", flat=True))
+    update_id = sample_ids[0]
+    update_payload = client.get(f"/api/patients/{update_id}/").data
+
+    def get(url, params=None):
+        return lambda: client.get(url, params or {})
+
+    detail_ids = iter(sample_ids * (repeat + 10))
+    created = []
+
+    def create():
+        created.append(client.post("/api/patients/", patient_payload(rng), format="json").data["id"])
+
+    cases = {
+        "list": get("/api/patients/"),
+        "list deep page": get("/api/patients/", {"page": max(1, patients // 40)}),
+        "search": get("/api/patients/", {"search": "garc"}),
+        "filter status + state": get("/api/patients/", {"status": "active", "state_exact": "ca"}),
+        "filter city prefix": get("/api/patients/", {"city_prefix": "san"}),
+        "filter custom field": get("/api/patients/", {"cf_Shift Worker": "yes", "status": "active"}),
+        "order by latest ISI": get("/api/patients/", {"ordering": "-latest_isi_score"}),
+        "detail": lambda: client.get(f"/api/patients/{next(detail_ids)}/"),
+        "create": create,
+        "update": lambda: client.put(f"/api/patients/{update_id}/", update_payload, format="json"),
+    }
+
+    results = {}
+    for name, case in cases.items():
+        queries = count_queries(case)
+        p50, p95 = timeit(case, repeat=repeat, warmup=2)
+        results[name] = {"p50_ms": round(p50, 2), "p95_ms": round(p95, 2), "queries": queries}
+        print(f"{patients:>9} {name:<24}{p50:>9.1f}ms{p95:>9.1f}ms{queries:>6}", file=sys.stderr)
+
+    # Leave the cached database as it was generated, so later runs measure the same data
+    Patient.objects.filter(pk__in=created).delete()
+    PatientTombstone.objects.filter(patient_id__in=created).delete()
+    connection.close()
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline, current):
+    print(f"\n{'size':>9} {'case':<24}{'before p50':>12}{'after p50':>12}{'change':>9}")
+    for size, cases in current["results"].items():
+        for name, result in cases.items():
+            before = baseline["results"].get(size, {}).get(name)
+            if before is None:
+                continue
+            change = (result["p50_ms"] - before["p50_ms"]) / before["p50_ms"] * 100 if before["p50_ms"] else 0
+            print(f"{size:>9} {name:<24}{before['p50_ms']:>10.1f}ms{result['p50_ms']:>10.1f}ms{change:>+8.0f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--patients", type=int, nargs="+", default=[1_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--output", type=Path, help="Write results as JSON")
+    parser.add_argument("--compare", type=Path, help="Earlier --output file to compare against")
+    parser.add_argument("--size-output", type=Path, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.size_output:
+        # Child process: one size, results handed back through a file
+        args.size_output.write_text(json.dumps(run_size(args.patients[0], args.repeat)))
+        return
+
+    results = {}
+    print(f"{'size':>9} {'case':<24}{'p50':>11}{'p95':>11}{'stmts':>6}", file=sys.stderr)
+    for patients in args.patients:
+        with tempfile.NamedTemporaryFile(suffix=".json") as output:
+            subprocess.run(
+                [sys.executable, __file__, "--patients", str(patients), "--repeat", str(args.repeat),
+                 "--size-output", output.name],
+                check=True,
+            )
+            results[str(patients)] = json.loads(Path(output.name).read_text())
+
+    import django
+
+    report = {
+        "commit": git_commit(),
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "django": django.get_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "repeat": args.repeat,
+        "results": results,
+    }
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2) + "\n")
+    if args.compare:
+        compare(json.loads(args.compare.read_text()), report)
+
+
+if __name__ == "__main__":
+    main()
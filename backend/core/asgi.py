@@ -9,8 +9,12 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 
 import os
 
+from django.contrib.staticfiles.handlers import ASGIStaticFilesHandler
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+os.environ.setdefault('SERVER_INTERFACE', 'asgi')
 
-application = get_asgi_application()
+# WhiteNoise only runs under WSGI, so static files (admin and the browsable
+# API) are served from the app directories here
+application = ASGIStaticFilesHandler(get_asgi_application())
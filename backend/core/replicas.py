@@ -0,0 +1,125 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Whether reads in the current request may be served by a replica
+_replica_reads = ContextVar('replica_reads', default=False)
+
+
+def read_alias():
+    """The alias reads should use right now: a random replica or the primary."""
+    aliases = settings.DATABASE_REPLICA_ALIASES
+    if not aliases or not _replica_reads.get() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+        return DEFAULT_DB_ALIAS
+    return random.choice(aliases)
+
+
+def reads_from_replicas():
+    """Whether the current request's reads may be served by a (possibly lagging) replica."""
+    return bool(settings.DATABASE_REPLICA_ALIASES) and _replica_reads.get()
+
+
+@contextmanager
+def replica_reads(allowed=True):
+    """Allow (or with ``allowed=False`` forbid) replica reads inside the block."""
+    token = _replica_reads.set(allowed)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+def primary_reads():
+    """Read from the primary inside the block, e.g. where replica lag would skip rows."""
+    return replica_reads(False)
+
+
+class ReadReplicaRouter:
+    """
+    Send reads to ``DATABASE_REPLICA_ALIASES`` when ``ReplicaRoutingMiddleware``
+    allows it, and everything else to the primary.
+
+    Reads inside a transaction stay on the primary so they see its writes, and
+    related objects are fetched from the alias their instance came from.
+    Replicas are copies of the primary, so they are never migrated themselves.
+    """
+
+    def db_for_read(self, model, **hints):
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        return read_alias()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.DATABASE_REPLICA_ALIASES
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Let safe-method requests read from a replica, unless the client wrote recently.
+
+    A successful unsafe request pins its client (the signed-in user, or else
+    the client address) to the primary for ``DATABASE_REPLICA_PIN_SECONDS``,
+    so the next page load sees the write whatever the replica lag. Pins live
+    in the response cache, which workers share when it uses the file backend.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not settings.DATABASE_REPLICA_ALIASES:
+            return self.get_response(request)
+
+        pin_key = self.pin_key(request, getattr(request, 'user', None))
+        safe = request.method in SAFE_METHODS
+        with replica_reads(safe and not self.cache.get(pin_key)):
+            response = self.get_response(request)
+        if not safe and response.status_code < 400:
+            self.cache.set(pin_key, True, timeout=settings.DATABASE_REPLICA_PIN_SECONDS)
+        return response
+
+    async def __acall__(self, request):
+        if not settings.DATABASE_REPLICA_ALIASES:
+            return await self.get_response(request)
+
+        # request.user would load the session synchronously
+        user = await request.auser() if hasattr(request, 'auser') else None
+        pin_key = self.pin_key(request, user)
+        safe = request.method in SAFE_METHODS
+        with replica_reads(safe and not await self.cache.aget(pin_key)):
+            response = await self.get_response(request)
+        if not safe and response.status_code < 400:
+            await self.cache.aset(pin_key, True, timeout=settings.DATABASE_REPLICA_PIN_SECONDS)
+        return response
+
+    @property
+    def cache(self):
+        return caches[settings.RESPONSE_CACHE_ALIAS]
+
+    def pin_key(self, request, user):
+        if user is not None and user.is_authenticated:
+            return f'replica-pin:user:{user.pk}'
+        forwarded = request.META.get('HTTP_X_FORWARDED_FOR')
+        address = forwarded.split(',')[0].strip() if forwarded else request.META.get('REMOTE_ADDR', '')
+        return f'replica-pin:addr:{address}'
@@ -12,6 +12,9 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 import os
+import sys
+
+from corsheaders.defaults import default_headers
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -26,6 +29,8 @@ SECRET_KEY = os.environ.get('SECRET_KEY', 'django-insecure-p*p4xz+fust3r44i197#)
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = os.environ.get('DEBUG', 'True') == 'True'
 
+TESTING = len(sys.argv) > 1 and sys.argv[1] == 'test'
+
 ALLOWED_HOSTS = [
 	'stellar-sleep-patient-dashboard.onrender.com',
 	'localhost',
@@ -51,16 +56,25 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
+    'patients.metrics.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',  # whitenoise middleware for static files
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.replicas.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# core/asgi.py sets SERVER_INTERFACE=asgi. Under ASGI a sync-only middleware
+# hands every request to a thread, so WhiteNoise is left out there and
+# asgi.py serves static files itself.
+SERVER_INTERFACE = os.environ.get('SERVER_INTERFACE', 'wsgi')
+if SERVER_INTERFACE == 'asgi':
+    MIDDLEWARE.remove('whitenoise.middleware.WhiteNoiseMiddleware')
+
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
     "http://127.0.0.1:3000",
@@ -81,6 +95,15 @@ CORS_ALLOW_METHODS = [
     "PUT",
 ]
 
+CORS_ALLOW_HEADERS = [
+    *default_headers,
+    "if-modified-since",
+    "if-none-match",
+    "x-count",
+    "x-pagination",
+]
+CORS_EXPOSE_HEADERS = ["etag", "last-modified", "server-timing", "x-cache"]
+
 REST_FRAMEWORK = {
     "DEFAULT_FILTER_BACKENDS": [
         "django_filters.rest_framework.DjangoFilterBackend",
@@ -113,13 +136,122 @@ WSGI_APPLICATION = 'core.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+#
+# DATABASE_PROFILE picks how SQLite is driven. "concurrent" is meant for
+# several gunicorn workers: WAL so readers never block the writer, pragmas
+# applied on connect, reused connections and write transactions that queue
+# for the lock up front. "basic" keeps SQLite's own defaults. Switching to WAL
+# rewrites the database file's header, so the checked-in db.sqlite3 is opened
+# with "basic" unless DATABASE_PATH points elsewhere or a profile is set.
+
+DATABASE_PATH = os.environ.get('DATABASE_PATH')
+DATABASE_PROFILE = os.environ.get('DATABASE_PROFILE', 'concurrent' if DATABASE_PATH else 'basic')
+
+DATABASE_PROFILES = {
+    'basic': {
+        'ENGINE': 'django.db.backends.sqlite3',
+    },
+    'concurrent': {
+        'ENGINE': 'core.sqlite',
+        'CONN_MAX_AGE': int(os.environ.get('DATABASE_CONN_MAX_AGE', 600)),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # BEGIN IMMEDIATE takes the write lock when a transaction starts, so
+            # it waits its turn there rather than failing on its first write
+            'transaction_mode': 'IMMEDIATE',
+            'init_command': ';'.join([
+                'PRAGMA journal_mode=WAL',
+                'PRAGMA synchronous=NORMAL',
+                f"PRAGMA mmap_size={int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))}",
+                f"PRAGMA cache_size=-{int(os.environ.get('SQLITE_CACHE_SIZE_KB', 64 * 1024))}",
+                f"PRAGMA busy_timeout={int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))}",
+            ]),
+            'serialize_writes': True,
+        },
+    },
+}
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': DATABASE_PATH or BASE_DIR / 'db.sqlite3',
+        **DATABASE_PROFILES[DATABASE_PROFILE],
     }
 }
 
+# Read replicas
+# DATABASE_REPLICAS is a comma separated list of database files holding copies
+# of the primary, added as aliases replica1, replica2, ... with the same
+# profile. Safe-method requests (lists, details, exports, stats and series)
+# read from a random replica; writes, and reads by a client that wrote in the
+# last DATABASE_REPLICA_PIN_SECONDS, use the primary. Locally, a second SQLite
+# file refreshed with `manage.py sync_replicas` stands in for a replica.
+
+DATABASE_REPLICA_ALIASES = []
+for index, name in enumerate(filter(None, os.environ.get('DATABASE_REPLICAS', '').split(',')), start=1):
+    alias = f'replica{index}'
+    # Under the test runner replicas share the primary's test database
+    DATABASES[alias] = {**DATABASES['default'], 'NAME': name.strip(), 'TEST': {'MIRROR': 'default'}}
+    DATABASE_REPLICA_ALIASES.append(alias)
+
+DATABASE_ROUTERS = ['core.replicas.ReadReplicaRouter']
+DATABASE_REPLICA_PIN_SECONDS = int(os.environ.get('DATABASE_REPLICA_PIN_SECONDS', 10))
+
+
+# Caches
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+#
+# The "responses" cache backs the patient API response cache. Use the file
+# backend when running several gunicorn workers so they share entries and
+# invalidation counters; local memory is per process.
+
+RESPONSE_CACHE_BACKEND = os.environ.get('RESPONSE_CACHE_BACKEND', 'locmem')
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'responses': {
+        'BACKEND': {
+            'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+            'file': 'django.core.cache.backends.filebased.FileBasedCache',
+        }[RESPONSE_CACHE_BACKEND],
+        'LOCATION': (
+            os.environ.get('RESPONSE_CACHE_LOCATION', str(BASE_DIR / '.response-cache'))
+            if RESPONSE_CACHE_BACKEND == 'file' else 'patient-responses'
+        ),
+        'TIMEOUT': int(os.environ.get('RESPONSE_CACHE_TIMEOUT', 300)),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', 2000)),
+        },
+    },
+}
+
+RESPONSE_CACHE_ALIAS = 'responses'
+# On by default (1/true/yes or 0/false/no), but off under the test runner:
+# entries would outlive each test's rolled back data
+RESPONSE_CACHE_ENABLED = (
+    os.environ.get('RESPONSE_CACHE_ENABLED', 'true').strip().lower() in ('1', 'true', 'yes') and not TESTING
+)
+
+
+# Request metrics
+# Sampled requests get a Server-Timing header and feed the per-endpoint
+# percentiles at /api/_metrics/. Samples are kept per worker process, in a
+# rolling window of the last REQUEST_METRICS_WINDOW requests per endpoint.
+
+REQUEST_METRICS_ENABLED = os.environ.get('REQUEST_METRICS_ENABLED', 'True') == 'True'
+REQUEST_METRICS_SAMPLE_RATE = float(os.environ.get('REQUEST_METRICS_SAMPLE_RATE', 1.0))
+REQUEST_METRICS_WINDOW = int(os.environ.get('REQUEST_METRICS_WINDOW', 1000))
+
+
+# Async read endpoints
+# Requests under /api/async/ wait on the event loop rather than in a thread.
+# The SQLite driver itself is synchronous, so each query still runs in a
+# thread; at most ASYNC_READ_CONCURRENCY requests per process query at once
+# and the rest queue without holding a thread or their result rows.
+
+ASYNC_READ_CONCURRENCY = int(os.environ.get('ASYNC_READ_CONCURRENCY', 16))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
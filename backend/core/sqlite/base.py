@@ -0,0 +1,71 @@
+import threading
+
+from django.db import OperationalError
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    SQLite backend that queues write transactions inside the process.
+
+    With ``OPTIONS["serialize_writes"]`` the outermost atomic block waits on a
+    lock shared by every connection to the same database file before BEGIN,
+    and releases it at COMMIT or ROLLBACK. Threads of one worker then take
+    turns in arrival order instead of all polling in SQLite's busy handler;
+    other processes are still arbitrated by ``busy_timeout``.
+    ``OPTIONS["write_queue_timeout"]`` (seconds, default 30) bounds the wait.
+    """
+    _write_locks = {}
+    _write_locks_guard = threading.Lock()
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        options = self.settings_dict["OPTIONS"]
+        self.serialize_writes = options.get("serialize_writes", False)
+        self.write_queue_timeout = options.get("write_queue_timeout", 30)
+        self.holds_write_lock = False
+
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        kwargs.pop("serialize_writes", None)
+        kwargs.pop("write_queue_timeout", None)
+        return kwargs
+
+    def write_lock(self):
+        name = str(self.settings_dict["NAME"])
+        with self._write_locks_guard:
+            return self._write_locks.setdefault(name, threading.Lock())
+
+    def release_write_lock(self):
+        if self.holds_write_lock:
+            self.holds_write_lock = False
+            self.write_lock().release()
+
+    def _start_transaction_under_autocommit(self):
+        if self.serialize_writes and not self.holds_write_lock:
+            if not self.write_lock().acquire(timeout=self.write_queue_timeout):
+                raise OperationalError("database is locked: timed out waiting in the write queue")
+            self.holds_write_lock = True
+        try:
+            super()._start_transaction_under_autocommit()
+        except Exception:
+            self.release_write_lock()
+            raise
+
+    def _commit(self):
+        try:
+            return super()._commit()
+        finally:
+            self.release_write_lock()
+
+    def _rollback(self):
+        try:
+            return super()._rollback()
+        finally:
+            self.release_write_lock()
+
+    def _close(self):
+        try:
+            return super()._close()
+        finally:
+            self.release_write_lock()
@@ -0,0 +1,111 @@
+import asyncio
+import weakref
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ObjectDoesNotExist
+from django.http import JsonResponse
+from django.views import View
+from rest_framework.exceptions import APIException, NotFound
+from rest_framework.request import Request
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .views import ISIScoreViewSet, PatientViewSet
+
+# One semaphore per event loop, since asyncio primitives are bound to the loop they are used in
+_read_limits = weakref.WeakKeyDictionary()
+
+
+def read_limit():
+    loop = asyncio.get_running_loop()
+    limit = _read_limits.get(loop)
+    if limit is None:
+        limit = _read_limits[loop] = asyncio.Semaphore(settings.ASYNC_READ_CONCURRENCY)
+    return limit
+
+
+class AsyncReadView(View):
+    """
+    Async list and detail GETs for ``viewset_class`` on Django's async ORM.
+
+    The viewset still plans the query: filters, search, ordering, the
+    prefetches and the serializer, so responses match the sync endpoints.
+    Planning runs in a thread because filters may look up custom fields.
+    Rows are read with ``acount``/``aiterator``/``aget``, prefetches included,
+    and serialized without further queries. Pages are numbered only (no
+    cursor mode), and ETags and the response cache are left to the sync routes.
+    """
+    viewset_class = None
+
+    async def get(self, request, pk=None):
+        try:
+            async with read_limit():
+                data = await (self.list(request) if pk is None else self.retrieve(request, pk))
+        except APIException as exc:
+            detail = exc.detail if isinstance(exc.detail, (dict, list)) else {'detail': exc.detail}
+            return self.render(detail, status=exc.status_code)
+        return self.render(data)
+
+    def render(self, data, status=200):
+        # Compact, like DRF's JSONRenderer
+        return JsonResponse(
+            data, status=status, encoder=JSONEncoder, safe=False, json_dumps_params={'separators': (',', ':')},
+        )
+
+    def get_viewset(self, request, action, **kwargs):
+        return self.viewset_class(
+            request=Request(request), action=action, args=(), kwargs=kwargs, format_kwarg=None,
+        )
+
+    async def list(self, request):
+        viewset = self.get_viewset(request, 'list')
+        queryset = await sync_to_async(lambda: viewset.filter_queryset(viewset.get_queryset()))()
+
+        paginator = viewset.paginator
+        page_size = paginator.get_page_size(viewset.request)
+        count = await queryset.acount()
+        last_page = max(1, -(-count // page_size))
+        number = self.page_number(request, paginator.page_query_param, last_page, paginator.last_page_strings)
+
+        offset = (number - 1) * page_size
+        rows = [row async for row in queryset[offset:offset + page_size].aiterator(chunk_size=page_size)]
+        url = request.build_absolute_uri()
+        return {
+            'count': count,
+            'next': replace_query_param(url, paginator.page_query_param, number + 1) if number < last_page else None,
+            'previous': (
+                None if number == 1
+                else remove_query_param(url, paginator.page_query_param) if number == 2
+                else replace_query_param(url, paginator.page_query_param, number - 1)
+            ),
+            'results': viewset.get_serializer(rows, many=True).data,
+        }
+
+    def page_number(self, request, param, last_page, last_page_strings):
+        value = request.GET.get(param, 1)
+        if value in last_page_strings:
+            return last_page
+        try:
+            number = int(value)
+        except (TypeError, ValueError):
+            raise NotFound('Invalid page.')
+        if not 1 <= number <= last_page:
+            raise NotFound('Invalid page.')
+        return number
+
+    async def retrieve(self, request, pk):
+        viewset = self.get_viewset(request, 'retrieve', pk=pk)
+        try:
+            instance = await viewset.get_queryset().aget(pk=pk)
+        except ObjectDoesNotExist:
+            raise NotFound()
+        return viewset.get_serializer(instance).data
+
+
+class AsyncPatientView(AsyncReadView):
+    viewset_class = PatientViewSet
+
+
+class AsyncISIScoreView(AsyncReadView):
+    viewset_class = ISIScoreViewSet
@@ -0,0 +1,143 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework.response import Response
+
+from core.replicas import reads_from_replicas
+
+GENERATION_KEY = 'patients:generation:{}'
+RESPONSE_KEY = 'patients:response:{}'
+STATS_KEY = 'patients:stats:{}:{}'
+
+
+def get_cache():
+    return caches[settings.RESPONSE_CACHE_ALIAS]
+
+
+def model_label(model):
+    return model if isinstance(model, str) else model._meta.label_lower
+
+
+def response_cache_active():
+    """Whether this request reads and fills the response cache (see ``CachedResponseMixin``)."""
+    return settings.RESPONSE_CACHE_ENABLED and not reads_from_replicas()
+
+
+def get_generations(models):
+    """
+    Return the current generation of each model, creating missing counters.
+
+    New counters start from the clock rather than 1, so a counter that was
+    evicted and recreated never lines up with entries cached under its old value.
+    """
+    cache = get_cache()
+    keys = [GENERATION_KEY.format(model_label(model)) for model in models]
+    generations = cache.get_many(keys)
+    for key in keys:
+        if key not in generations:
+            cache.add(key, time.time_ns(), timeout=None)
+            generations[key] = cache.get(key)
+    return [generations[key] for key in keys]
+
+
+def bump_generations(*models):
+    """
+    Invalidate every cached response built from ``models``.
+
+    Bumps now, so the writer's next read misses, and again after the surrounding
+    transaction commits, so a response cached from pre-commit data is dropped too.
+    """
+    def bump():
+        cache = get_cache()
+        for model in models:
+            key = GENERATION_KEY.format(model_label(model))
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.add(key, time.time_ns(), timeout=None)
+
+    bump()
+    transaction.on_commit(bump)
+
+
+def record(view_name, outcome):
+    cache = get_cache()
+    key = STATS_KEY.format(view_name, outcome)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 1, timeout=None)
+
+
+def cache_stats(view_names):
+    """Hit/miss counters per view; shared across workers when the cache backend is."""
+    cache = get_cache()
+    stats = {}
+    for name in view_names:
+        counts = cache.get_many([STATS_KEY.format(name, 'hit'), STATS_KEY.format(name, 'miss')])
+        hits = counts.get(STATS_KEY.format(name, 'hit'), 0)
+        misses = counts.get(STATS_KEY.format(name, 'miss'), 0)
+        total = hits + misses
+        stats[name] = {'hits': hits, 'misses': misses, 'hit_rate': hits / total if total else None}
+    return stats
+
+
+class CachedResponseMixin:
+    """
+    Serve repeated list/retrieve requests from the response cache.
+
+    Entries are keyed by the view, action, normalized query params, the headers
+    in ``cache_vary_headers`` and the generation of every model in
+    ``cache_models``. Writes bump those generations (see signals.py), which
+    orphans old entries until the cache's TTL/LRU bound evicts them.
+
+    Requests reading from a replica bypass the cache: a lagging replica would
+    store pre-write data under the new generations, and a client pinned to
+    the primary after its write would be served that entry.
+    """
+    cache_models = ()
+    cache_vary_headers = ('X-Pagination', 'X-Count')
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
+
+    def get_cache_key(self, request):
+        params = sorted(
+            (name, sorted(request.query_params.getlist(name))) for name in request.query_params
+        )
+        parts = [
+            type(self).__name__,
+            self.action,
+            request.get_host(),
+            request.accepted_renderer.format,
+            sorted(self.kwargs.items()),
+            params,
+            [request.headers.get(header, '') for header in self.cache_vary_headers],
+            get_generations(self.cache_models),
+        ]
+        return RESPONSE_KEY.format(hashlib.sha256(repr(parts).encode()).hexdigest())
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        if not response_cache_active():
+            return handler(request, *args, **kwargs)
+
+        cache = get_cache()
+        view_name = type(self).__name__
+        key = self.get_cache_key(request)
+        data = cache.get(key)
+        if data is not None:
+            record(view_name, 'hit')
+            return Response(data, headers={'X-Cache': 'HIT'})
+
+        record(view_name, 'miss')
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data)
+        response['X-Cache'] = 'MISS'
+        return response
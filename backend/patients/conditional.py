@@ -0,0 +1,91 @@
+import hashlib
+from calendar import timegm
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from .cache import get_generations, response_cache_active
+
+
+class ConditionalGetMixin:
+    """
+    Answer list/retrieve requests with ETag and Last-Modified validators, and
+    with ``304 Not Modified`` when the client's copy is still current.
+
+    A detail is versioned by the row's ``version_field``, which every write
+    that changes a representation bumps (child rows do that through signals.py).
+
+    Lists must not cost more to validate than to answer. While the response
+    cache is in use, the ETag comes from the generations of ``cache_models``,
+    the same counters that key the cached body, so no query runs at all.
+    Otherwise it comes from the maximum ``version_field`` and the row count of
+    the filtered queryset, which scans what the page's exact COUNT(*) scans
+    anyway. Estimated-count and cursor pages skip that scan, so they go
+    without validators.
+    """
+    version_field = 'updated_at'
+    validator_vary_headers = ('X-Pagination', 'X-Count')
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(super().retrieve, request, *args, **kwargs)
+
+    def get_version(self):
+        """Return ``(last_modified, row_count)`` for the rows this request renders."""
+        queryset = self.filter_queryset(self.get_queryset()).order_by()
+        if self.detail:
+            lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+            queryset = queryset.filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+            versions = list(queryset.values_list(self.version_field, flat=True)[:1])
+            return (versions[0], 1) if versions else (None, 0)
+        version = queryset.aggregate(last_modified=Max(self.version_field), rows=Count('pk'))
+        return version['last_modified'], version['rows']
+
+    def get_validators(self, request):
+        """Return ``(etag, last_modified)``, or None when this request is not worth validating."""
+        if not self.detail:
+            cache_models = getattr(self, 'cache_models', ())
+            if cache_models and response_cache_active():
+                return self.get_etag(request, get_generations(cache_models)), None
+            counts_exactly = getattr(self.paginator, 'counts_exactly', None)
+            if counts_exactly is not None and not counts_exactly(request):
+                return None
+
+        last_modified, rows = self.get_version()
+        timestamp = timegm(last_modified.utctimetuple()) if last_modified else None
+        return self.get_etag(request, last_modified.isoformat() if last_modified else None, rows), timestamp
+
+    def get_etag(self, request, *version):
+        # Strong: the same validators always render the same bytes, so everything
+        # else the body depends on goes into the hash too
+        parts = [
+            type(self).__name__,
+            self.action,
+            request.get_host(),
+            request.accepted_renderer.format,
+            sorted(self.kwargs.items()),
+            sorted((name, request.query_params.getlist(name)) for name in request.query_params),
+            [request.headers.get(header, '') for header in self.validator_vary_headers],
+            *version,
+        ]
+        return quote_etag(hashlib.sha256(repr(parts).encode()).hexdigest()[:32])
+
+    def conditional_response(self, handler, request, *args, **kwargs):
+        validators = self.get_validators(request)
+        if validators is None:
+            return handler(request, *args, **kwargs)
+        etag, timestamp = validators
+
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if timestamp is not None:
+                response['Last-Modified'] = http_date(timestamp)
+            # Let browsers keep a copy but revalidate it on every use
+            patch_cache_control(response, private=True, no_cache=True)
+        return response
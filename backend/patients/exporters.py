@@ -0,0 +1,77 @@
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from rest_framework.renderers import BaseRenderer
+
+from .models import CustomField
+from .importers import PatientImporter
+from .serializers import PatientSerializer
+
+
+class NDJSONRenderer(BaseRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # Only used for error bodies; exports stream their own rows
+        return json.dumps(data, cls=DjangoJSONEncoder)
+
+
+class CSVRenderer(NDJSONRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+class Echo:
+    """File-like object whose write() returns the value, for streaming csv.writer output."""
+
+    def write(self, value):
+        return value
+
+
+class PatientExporter:
+    """
+    Stream patients as NDJSON or CSV without holding the result set in memory.
+
+    Rows come from ``QuerySet.iterator(chunk_size=...)``, which applies the
+    queryset's prefetches one chunk at a time. A single serializer instance
+    renders every row. The CSV layout matches what ``PatientImporter`` reads.
+    """
+    chunk_size = 1000
+
+    def __init__(self, queryset, chunk_size=None):
+        self.queryset = queryset
+        if chunk_size:
+            self.chunk_size = chunk_size
+        self.serializer = PatientSerializer()
+
+    def rows(self):
+        for patient in self.queryset.iterator(chunk_size=self.chunk_size):
+            yield self.serializer.to_representation(patient)
+
+    def ndjson(self):
+        for row in self.rows():
+            yield json.dumps(row, cls=DjangoJSONEncoder) + '\n'
+
+    def csv(self):
+        custom_fields = list(CustomField.objects.order_by('name'))
+        prefix = PatientImporter.custom_column_prefix
+        header = (
+            ['id'] + PatientImporter.flat_fields + PatientImporter.address_fields
+            + ['isi_scores'] + [prefix + field.name for field in custom_fields]
+        )
+        writer = csv.writer(Echo())
+        yield writer.writerow(header)
+
+        for row in self.rows():
+            address = row['addresses'][0] if row['addresses'] else {}
+            values = {val['field_definition']: val['value'] for val in row['custom_field_values']}
+            yield writer.writerow(
+                [row['id']]
+                + [row[name] if row[name] is not None else '' for name in PatientImporter.flat_fields]
+                + [address.get(name) or '' for name in PatientImporter.address_fields]
+                + [';'.join(f"{score['date']}:{score['score']}" for score in row['isi_scores'])]
+                + [values.get(field.pk, '') for field in custom_fields]
+            )
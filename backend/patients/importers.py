@@ -0,0 +1,215 @@
+import csv
+import json
+from itertools import islice
+
+from django.db import IntegrityError, transaction
+from rest_framework import serializers
+
+from . import stats
+from .cache import bump_generations
+from .models import Patient, Address, ISIScore, CustomField, CustomFieldValue
+from .serializers import CustomFieldValueSerializer, PatientSerializer
+
+
+class CustomFieldLookupField(serializers.Field):
+    """Resolve a custom field id from a preloaded map instead of one query per value."""
+
+    def to_internal_value(self, data):
+        custom_fields = self.context['custom_fields']
+        try:
+            return custom_fields[int(data)]
+        except (KeyError, TypeError, ValueError):
+            raise serializers.ValidationError(f'Invalid pk "{data}" - object does not exist.')
+
+    def to_representation(self, value):
+        return value.pk
+
+
+class ImportCustomFieldValueSerializer(CustomFieldValueSerializer):
+    field_definition = CustomFieldLookupField()
+
+
+class ImportPatientSerializer(PatientSerializer):
+    custom_field_values = ImportCustomFieldValueSerializer(many=True, required=False)
+
+
+class PatientImporter:
+    """
+    Validate and insert patients in chunks, collecting per-row errors.
+
+    Rows use the same shape as a POST to /api/patients/. Each chunk is validated,
+    then written with one bulk INSERT per table inside its own transaction, so a
+    bad row only costs that row and a failed chunk never rolls back earlier ones.
+    """
+    chunk_size = 500
+    max_reported_errors = 1000
+
+    flat_fields = [
+        'first_name', 'middle_name', 'last_name', 'date_of_birth',
+        'status', 'last_visit', 'ready_to_discharge',
+    ]
+    address_fields = ['address_line1', 'address_line2', 'city', 'state', 'postal_code']
+    custom_column_prefix = 'custom:'
+
+    def __init__(self, chunk_size=None):
+        if chunk_size:
+            self.chunk_size = chunk_size
+        self.custom_fields = {field.pk: field for field in CustomField.objects.all()}
+        self.custom_fields_by_name = {field.name: field for field in self.custom_fields.values()}
+        self.created = 0
+        self.failed = 0
+        self.errors = []
+
+    @property
+    def result(self):
+        # Decode errors are noted as lines are read, ahead of their chunk's validation errors
+        errors = sorted(self.errors, key=lambda error: error['row'])
+        return {'created': self.created, 'failed': self.failed, 'errors': errors}
+
+    def add_error(self, row_number, errors):
+        self.failed += 1
+        if len(self.errors) < self.max_reported_errors:
+            self.errors.append({'row': row_number, 'errors': errors})
+
+    def decode_lines(self, lines):
+        """
+        Decode UTF-8 byte lines, reporting a line that does not decode as that row's error.
+
+        The bad line is replaced by a blank one, which both readers skip, so row
+        numbers of the lines after it stay right.
+        """
+        for line_number, line in enumerate(lines, start=1):
+            try:
+                yield line.decode('utf-8')
+            except UnicodeDecodeError as exc:
+                self.add_error(line_number, {'non_field_errors': [f'Line is not valid UTF-8 ({exc.reason}).']})
+                yield '\n'
+
+    # Readers yield (row number, payload) pairs from a text stream
+
+    def read_ndjson(self, stream):
+        for row_number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                payload = json.loads(line)
+            except ValueError as exc:
+                payload = exc
+            yield row_number, payload
+
+    def read_csv(self, stream):
+        """
+        Read one patient per CSV row.
+
+        Address columns describe a single address, ``isi_scores`` holds
+        ``date:score`` pairs separated by ``;`` and ``custom:<name>`` columns hold
+        custom field values.
+        """
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, self.csv_to_payload(record)
+
+    def csv_to_payload(self, record):
+        record = {key.strip(): (value or '').strip() for key, value in record.items() if key}
+        payload = {name: record[name] for name in self.flat_fields if record.get(name)}
+
+        address = {name: record[name] for name in self.address_fields if record.get(name)}
+        if address:
+            payload['addresses'] = [address]
+
+        if record.get('isi_scores'):
+            payload['isi_scores'] = []
+            for pair in record['isi_scores'].split(';'):
+                score_date, _, score = pair.strip().partition(':')
+                payload['isi_scores'].append({'date': score_date, 'score': score})
+
+        custom_values = []
+        for column, value in record.items():
+            if not column.startswith(self.custom_column_prefix):
+                continue
+            name = column[len(self.custom_column_prefix):]
+            field = self.custom_fields_by_name.get(name)
+            if field is None:
+                return ValueError(f'Unknown custom field "{name}"')
+            if value:
+                custom_values.append({'field_definition': field.pk, 'value': value})
+        if custom_values:
+            payload['custom_field_values'] = custom_values
+        return payload
+
+    # Validation and writes
+
+    def run(self, rows):
+        rows = iter(rows)
+        while True:
+            chunk = list(islice(rows, self.chunk_size))
+            if not chunk:
+                break
+            self.import_chunk(chunk)
+        return self.result
+
+    def import_chunk(self, chunk):
+        valid = []
+        # One serializer validates every row, so its fields are only built once
+        serializer = ImportPatientSerializer(context={'custom_fields': self.custom_fields})
+        for row_number, payload in chunk:
+            if isinstance(payload, Exception):
+                self.add_error(row_number, {'non_field_errors': [str(payload)]})
+                continue
+            if not isinstance(payload, dict):
+                self.add_error(row_number, {'non_field_errors': ['Expected an object.']})
+                continue
+            try:
+                valid.append((row_number, serializer.run_validation(payload)))
+            except serializers.ValidationError as exc:
+                self.add_error(row_number, exc.detail)
+
+        if not valid:
+            return
+        try:
+            with transaction.atomic():
+                self.write([data for _, data in valid])
+            self.created += len(valid)
+        except IntegrityError:
+            # Isolate the offending rows so the rest of the chunk still lands
+            for row_number, data in valid:
+                try:
+                    with transaction.atomic():
+                        self.write([data])
+                    self.created += 1
+                except IntegrityError as exc:
+                    self.add_error(row_number, {'non_field_errors': [str(exc)]})
+
+    def write(self, rows):
+        patients = Patient.objects.bulk_create([
+            Patient(**{name: data[name] for name in self.flat_fields if name in data})
+            for data in rows
+        ])
+
+        addresses, scores, custom_values = [], [], []
+        for patient, data in zip(patients, rows):
+            addresses.extend(
+                Address(patient=patient, **{f: addr[f] for f in self.address_fields if f in addr})
+                for addr in data.get('addresses', [])
+            )
+            scores.extend(
+                ISIScore(patient=patient, score=score['score'], date=score['date'])
+                for score in data.get('isi_scores', [])
+            )
+            custom_values.extend(
+                CustomFieldValue(
+                    patient=patient,
+                    field_definition=val['field_definition'],
+                    value=val.get('value', '')
+                )
+                for val in data.get('custom_field_values', [])
+            )
+
+        Address.objects.bulk_create(addresses)
+        ISIScore.objects.bulk_create(scores)
+        CustomFieldValue.objects.bulk_create(custom_values)
+        bump_generations(Patient, Address, ISIScore, CustomFieldValue)
+        if scores:
+            Patient.objects.filter(pk__in=[patient.pk for patient in patients]).refresh_latest_isi()
+        stats.mark_changed([patient.pk for patient in patients])
+        return patients
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from patients import stats
+from patients.models import Patient
+
+
+class Command(BaseCommand):
+    help = "Recompute the cached latest_isi_score/latest_isi_date columns on every patient"
+
+    def handle(self, *args, **options):
+        updated = Patient.objects.all().refresh_latest_isi()
+        # Average latest ISI per state is derived from these columns
+        stats.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Backfilled latest ISI score for {updated} patients"))
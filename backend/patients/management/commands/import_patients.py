@@ -0,0 +1,51 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from patients.importers import PatientImporter
+
+
+class Command(BaseCommand):
+    help = "Import patients from an NDJSON or CSV file (use - for stdin)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="File to import, or - to read stdin")
+        parser.add_argument(
+            "--format", choices=["ndjson", "csv"],
+            help="Input format (defaults to the file extension)",
+        )
+        parser.add_argument("--chunk-size", type=int, default=PatientImporter.chunk_size)
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        input_format = options["format"]
+        if input_format is None:
+            if path.endswith(".csv"):
+                input_format = "csv"
+            elif path.endswith((".ndjson", ".jsonl")):
+                input_format = "ndjson"
+            else:
+                raise CommandError("Cannot infer the input format, pass --format")
+
+        importer = PatientImporter(chunk_size=options["chunk_size"])
+        read = importer.read_csv if input_format == "csv" else importer.read_ndjson
+
+        start = time.perf_counter()
+        if path == "-":
+            result = importer.run(read(importer.decode_lines(sys.stdin.buffer)))
+        else:
+            try:
+                with open(path, "rb") as stream:
+                    result = importer.run(read(importer.decode_lines(stream)))
+            except OSError as exc:
+                raise CommandError(str(exc))
+        elapsed = time.perf_counter() - start
+
+        for error in result["errors"]:
+            self.stderr.write(f"Row {error['row']}: {error['errors']}")
+        rate = result["created"] / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {result['created']} patients, {result['failed']} failed "
+            f"({elapsed:.1f}s, {rate:.0f} rows/s)"
+        ))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from patients.search import ensure_search_index, search_index_available
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text patient name search index"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        alias = options["database"]
+        if not search_index_available(alias):
+            self.stdout.write("No search index on this database, search falls back to LIKE scans")
+            return
+        ensure_search_index(connections[alias], rebuild=True)
+        self.stdout.write(self.style.SUCCESS("Rebuilt patient search index"))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from patients import stats
+
+
+class Command(BaseCommand):
+    help = "Recompute the clinic summary counters from every patient"
+
+    def handle(self, *args, **options):
+        patients = stats.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt clinic stats from {patients} patients"))
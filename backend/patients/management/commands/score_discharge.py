@@ -0,0 +1,18 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from patients.models import Patient
+
+
+class Command(BaseCommand):
+    help = "Recompute the ISI trend slope and suggested discharge flag of every patient"
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        changed = Patient.objects.all().score_discharge_readiness()
+        elapsed = time.perf_counter() - start
+        suggested = Patient.objects.filter(suggested_discharge=True).count()
+        self.stdout.write(self.style.SUCCESS(
+            f"Scored every patient in {elapsed:.1f}s: {changed} changed, {suggested} suggested for discharge"
+        ))
@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    help = "Copy the primary SQLite database into every local stand-in replica"
+
+    def handle(self, *args, **options):
+        if not settings.DATABASE_REPLICA_ALIASES:
+            raise CommandError("No replicas configured; set DATABASE_REPLICAS")
+        primary = connections[DEFAULT_DB_ALIAS]
+        primary.ensure_connection()
+        for alias in settings.DATABASE_REPLICA_ALIASES:
+            replica = connections[alias]
+            replica.ensure_connection()
+            # SQLite's online backup reads a consistent snapshot while writers carry on
+            primary.connection.backup(replica.connection)
+            self.stdout.write(self.style.SUCCESS(f"Copied the primary into {alias} ({replica.settings_dict['NAME']})"))
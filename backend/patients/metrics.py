@@ -0,0 +1,281 @@
+import os
+import random
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+SAMPLE_FIELDS = ['duration_ms', 'db_ms', 'serialize_ms', 'render_ms', 'queries', 'repeated_queries', 'response_bytes']
+
+
+class QueryRecorder:
+    """
+    ``execute_wrapper`` that counts a request's queries, their time and repeats.
+
+    Statements are compared by their parameterized SQL, so a query issued once
+    per row of a page (an N+1) shows up as one statement with a high count.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            self.statements[sql] += 1
+
+    @property
+    def repeated(self):
+        """Executions beyond the first of each statement."""
+        return self.count - len(self.statements)
+
+    def repeated_statements(self, threshold):
+        return [(sql, count) for sql, count in self.statements.items() if count >= threshold]
+
+
+# The recorder of the request being measured. Unlike a connection, a context
+# variable follows the request into the threads sync_to_async runs the ORM in.
+_recorder = ContextVar('query_recorder', default=None)
+
+
+def record_queries(execute, sql, params, many, context):
+    recorder = _recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    return recorder(execute, sql, params, many, context)
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    """``connection_created`` receiver that puts ``record_queries`` on every connection."""
+    # First in line, so wrappers pushed later by execute_wrapper() still pop off the end
+    if record_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, record_queries)
+
+
+class SerializationTimer:
+    """
+    Time a request spends building serializer representations.
+
+    Queries run while serializing (lazy relations) are left to ``db``, and
+    only the outermost block counts, so nested serializers are not added twice.
+    """
+
+    def __init__(self, recorder):
+        self.recorder = recorder
+        self.duration = 0.0
+        self.active = False
+
+    @contextmanager
+    def timing(self):
+        if self.active:
+            yield
+            return
+        self.active = True
+        start, db_start = time.perf_counter(), self.recorder.duration
+        try:
+            yield
+        finally:
+            self.active = False
+            self.duration += time.perf_counter() - start - (self.recorder.duration - db_start)
+
+
+_serialization = ContextVar('serialization_timer', default=None)
+
+
+@contextmanager
+def timed_serialization():
+    """Count the block towards the measured request's ``serialize`` time, if any."""
+    timer = _serialization.get()
+    if timer is None:
+        yield
+        return
+    with timer.timing():
+        yield
+
+
+def percentiles(samples, points=(50, 95, 99)):
+    """Nearest-rank percentiles of ``samples``, or None for each when empty."""
+    ordered = sorted(samples)
+    return {
+        f'p{point}': ordered[max(0, -(-point * len(ordered) // 100) - 1)] if ordered else None
+        for point in points
+    }
+
+
+class EndpointMetrics:
+    # Distinct repeated statements kept per endpoint, so an odd query cannot grow memory
+    max_statements = 20
+
+    def __init__(self, window):
+        self.requests = 0
+        self.errors = 0
+        self.samples = {name: deque(maxlen=window) for name in SAMPLE_FIELDS}
+        self.repeated_statements = Counter()
+
+    def add(self, sample, repeated_statements, error):
+        self.requests += 1
+        self.errors += error
+        for name, value in sample.items():
+            if value is not None:
+                self.samples[name].append(value)
+        for sql, count in repeated_statements:
+            if sql in self.repeated_statements or len(self.repeated_statements) < self.max_statements:
+                self.repeated_statements[sql] += count
+
+    def summary(self):
+        return {
+            'requests': self.requests,
+            'errors': self.errors,
+            **{name: percentiles(samples) for name, samples in self.samples.items()},
+            'repeated_statements': [
+                {'sql': sql, 'executions': count} for sql, count in self.repeated_statements.most_common(5)
+            ],
+        }
+
+
+class MetricsRegistry:
+    """
+    Rolling per-endpoint samples for this worker process.
+
+    Each endpoint keeps its last ``window`` sampled requests; percentiles are
+    computed when read, so recording a request is a few appends under a lock.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.endpoints = {}
+
+    def record(self, endpoint, sample, repeated_statements, error=False):
+        with self.lock:
+            metrics = self.endpoints.get(endpoint)
+            if metrics is None:
+                metrics = self.endpoints[endpoint] = EndpointMetrics(settings.REQUEST_METRICS_WINDOW)
+            metrics.add(sample, repeated_statements, error)
+
+    def summary(self):
+        with self.lock:
+            endpoints = {name: metrics.summary() for name, metrics in sorted(self.endpoints.items())}
+        return {
+            'pid': os.getpid(),
+            'sample_rate': settings.REQUEST_METRICS_SAMPLE_RATE,
+            'window': settings.REQUEST_METRICS_WINDOW,
+            'endpoints': endpoints,
+        }
+
+    def reset(self):
+        with self.lock:
+            self.endpoints.clear()
+
+
+registry = MetricsRegistry()
+
+
+class RequestMetricsMiddleware:
+    """
+    Record SQL, render time and response size for a sample of requests.
+
+    Sampled responses carry a ``Server-Timing`` header (``db``, ``serialize``,
+    ``app``, ``render`` and ``total``) and feed the rolling per-endpoint percentiles
+    served at ``/api/_metrics/``. Unsampled requests pay for one random().
+    Queries a streaming response runs after the view returns are not counted.
+    Works in both sync (WSGI) and async (ASGI) middleware chains.
+    """
+    # A statement run this many times in one request is reported as a likely N+1
+    repeat_threshold = 3
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.sampled():
+            return self.get_response(request)
+
+        recorder, timer, start = self.start(request)
+        with self.recording(recorder, timer):
+            response = self.get_response(request)
+        return self.finish(request, response, recorder, timer, start)
+
+    async def __acall__(self, request):
+        if not self.sampled():
+            return await self.get_response(request)
+
+        recorder, timer, start = self.start(request)
+        with self.recording(recorder, timer):
+            response = await self.get_response(request)
+        return self.finish(request, response, recorder, timer, start)
+
+    def sampled(self):
+        return settings.REQUEST_METRICS_ENABLED and random.random() < settings.REQUEST_METRICS_SAMPLE_RATE
+
+    def start(self, request):
+        request._metrics_render = None
+        recorder = QueryRecorder()
+        return recorder, SerializationTimer(recorder), time.perf_counter()
+
+    @contextmanager
+    def recording(self, recorder, timer):
+        token = _recorder.set(recorder)
+        timer_token = _serialization.set(timer)
+        try:
+            yield
+        finally:
+            _serialization.reset(timer_token)
+            _recorder.reset(token)
+
+    def finish(self, request, response, recorder, timer, start):
+        total = time.perf_counter() - start
+        render = request._metrics_render or 0.0
+        db = recorder.duration
+        serialize = timer.duration
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={db * 1000:.1f};desc="{recorder.count} queries ({recorder.repeated} repeated)"',
+            f'serialize;dur={serialize * 1000:.1f}',
+            f'app;dur={max(total - db - serialize - render, 0) * 1000:.1f}',
+            f'render;dur={render * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ])
+
+        match = request.resolver_match
+        registry.record(
+            f'{request.method} {match.view_name if match else "unresolved"}',
+            {
+                'duration_ms': total * 1000,
+                'db_ms': db * 1000,
+                'serialize_ms': serialize * 1000,
+                'render_ms': render * 1000,
+                'queries': recorder.count,
+                'repeated_queries': recorder.repeated,
+                'response_bytes': None if response.streaming else len(response.content),
+            },
+            recorder.repeated_statements(self.repeat_threshold),
+            error=response.status_code >= 500,
+        )
+        return response
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered after this hook; time it with a post-render callback
+        if hasattr(request, '_metrics_render'):
+            start = time.perf_counter()
+
+            def rendered(response):
+                request._metrics_render = time.perf_counter() - start
+
+            response.add_post_render_callback(rendered)
+        return response
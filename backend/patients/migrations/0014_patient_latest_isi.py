@@ -0,0 +1,35 @@
+# Generated by Django 5.2 on 2026-10-17 03:48
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_latest_isi(apps, schema_editor):
+    Patient = apps.get_model('patients', 'Patient')
+    ISIScore = apps.get_model('patients', 'ISIScore')
+    latest = ISIScore.objects.filter(patient=OuterRef('pk')).order_by('-date', '-id')
+    Patient.objects.update(
+        latest_isi_score=Subquery(latest.values('score')[:1]),
+        latest_isi_date=Subquery(latest.values('date')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0013_customfield_alter_patient_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='patient',
+            name='latest_isi_date',
+            field=models.DateField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='patient',
+            name='latest_isi_score',
+            field=models.IntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.RunPython(backfill_latest_isi, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2 on 2026-10-17 03:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0014_patient_latest_isi'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='isiscore',
+            index=models.Index(fields=['date', 'id'], name='patients_is_date_65fd2e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['first_name', 'last_name', 'id'], name='patients_pa_first_n_8a6bc8_idx'),
+        ),
+    ]
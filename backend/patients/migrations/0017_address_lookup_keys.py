@@ -0,0 +1,32 @@
+# Generated by Django 5.2 on 2026-10-17 03:57
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0016_patient_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='address',
+            name='city_key',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.functions.text.Lower(django.db.models.functions.text.Trim('city')), output_field=models.CharField(max_length=100)),
+        ),
+        migrations.AddField(
+            model_name='address',
+            name='state_key',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.functions.text.Lower(django.db.models.functions.text.Trim('state')), output_field=models.CharField(max_length=100)),
+        ),
+        migrations.AddIndex(
+            model_name='address',
+            index=models.Index(fields=['city_key', 'patient'], name='patients_ad_city_ke_ccc56b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='address',
+            index=models.Index(fields=['state_key', 'city_key', 'patient'], name='patients_ad_state_k_e2ea1c_idx'),
+        ),
+    ]
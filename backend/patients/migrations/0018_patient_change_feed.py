@@ -0,0 +1,30 @@
+# Generated by Django 5.2 on 2026-10-17 04:04
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0017_address_lookup_keys'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PatientTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('patient_id', models.IntegerField()),
+                ('deleted_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['updated_at', 'id'], name='patients_pa_updated_cbb866_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='patienttombstone',
+            index=models.Index(fields=['deleted_at', 'patient_id'], name='patients_pa_deleted_d2aa51_idx'),
+        ),
+    ]
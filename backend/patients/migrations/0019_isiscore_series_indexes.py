@@ -0,0 +1,25 @@
+# Generated by Django 5.2 on 2026-10-17 04:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0018_patient_change_feed'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='isiscore',
+            index=models.Index(fields=['patient', 'date', 'score'], name='patients_is_patient_1c05fd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='isiscore',
+            index=models.Index(fields=['date', 'score'], name='patients_is_date_d0ffd7_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='isiscore',
+            name='patients_is_patient_8194c5_idx',
+        ),
+    ]
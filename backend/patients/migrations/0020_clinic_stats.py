@@ -0,0 +1,44 @@
+# Generated by Django 5.2 on 2026-10-17 04:18
+
+from django.db import migrations, models
+
+from patients import stats
+
+
+def build_stats(apps, schema_editor):
+    stats.rebuild(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0019_isiscore_series_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PatientStatsSnapshot',
+            fields=[
+                ('patient_id', models.IntegerField(primary_key=True, serialize=False)),
+                ('status', models.CharField(max_length=10)),
+                ('ready_to_discharge', models.BooleanField(default=False)),
+                ('state_key', models.CharField(blank=True, max_length=100)),
+                ('latest_isi_score', models.IntegerField(null=True)),
+                ('visit_month', models.CharField(blank=True, max_length=7)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ClinicStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('metric', models.CharField(max_length=50)),
+                ('key', models.CharField(blank=True, max_length=100)),
+                ('count', models.BigIntegerField(default=0)),
+                ('total', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('metric', 'key'), name='unique_clinic_stat')],
+            },
+        ),
+        migrations.RunPython(build_stats, migrations.RunPython.noop),
+    ]
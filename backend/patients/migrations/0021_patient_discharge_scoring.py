@@ -0,0 +1,31 @@
+# Generated by Django 5.2 on 2026-10-17 04:20
+
+from django.db import migrations, models
+
+from patients.models import PatientQuerySet
+
+
+def score_patients(apps, schema_editor):
+    Patient = apps.get_model('patients', 'Patient')
+    PatientQuerySet(Patient).score_discharge_readiness()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0020_clinic_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='patient',
+            name='isi_trend_slope',
+            field=models.FloatField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='patient',
+            name='suggested_discharge',
+            field=models.BooleanField(db_index=True, default=False),
+        ),
+        migrations.RunPython(score_patients, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2 on 2026-10-17 04:22
+
+import django.db.models.functions.text
+import patients.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0021_patient_discharge_scoring'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customfieldvalue',
+            name='number_value',
+            field=models.GeneratedField(db_persist=True, expression=patients.models.NumericValue('value'), output_field=models.FloatField()),
+        ),
+        migrations.AddField(
+            model_name='customfieldvalue',
+            name='value_key',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.functions.text.Lower(django.db.models.functions.text.Trim('value')), output_field=models.TextField()),
+        ),
+        migrations.AddIndex(
+            model_name='customfieldvalue',
+            index=models.Index(fields=['field_definition', 'value_key', 'patient'], name='patients_cu_field_d_a5f540_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customfieldvalue',
+            index=models.Index(fields=['field_definition', 'number_value', 'patient'], name='patients_cu_field_d_8c735a_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2 on 2026-10-17 09:40
+
+import patients.models
+from django.db import migrations, models
+
+
+# The expression's SQL changed but not its deconstruction, so recreate the
+# column to recompute stored values like "555-1234" (now NULL, was 555)
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0022_custom_field_value_lookups'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='customfieldvalue',
+            name='patients_cu_field_d_8c735a_idx',
+        ),
+        migrations.RemoveField(
+            model_name='customfieldvalue',
+            name='number_value',
+        ),
+        migrations.AddField(
+            model_name='customfieldvalue',
+            name='number_value',
+            field=models.GeneratedField(db_persist=True, expression=patients.models.NumericValue('value'), output_field=models.FloatField()),
+        ),
+        migrations.AddIndex(
+            model_name='customfieldvalue',
+            index=models.Index(fields=['field_definition', 'number_value', 'patient'], name='patients_cu_field_d_8c735a_idx'),
+        ),
+    ]
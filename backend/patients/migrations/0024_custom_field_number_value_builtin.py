@@ -0,0 +1,34 @@
+# Generated by Django 5.2 on 2026-10-17 14:05
+
+import patients.models
+from django.db import migrations, models
+
+
+# The SQLite expression no longer calls REGEXP, which only Django's connections
+# define, so writes from any other client failed. Recreate the column to store
+# the new definition; the computed values are unchanged.
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0023_custom_field_number_value_strict'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='customfieldvalue',
+            name='patients_cu_field_d_8c735a_idx',
+        ),
+        migrations.RemoveField(
+            model_name='customfieldvalue',
+            name='number_value',
+        ),
+        migrations.AddField(
+            model_name='customfieldvalue',
+            name='number_value',
+            field=models.GeneratedField(db_persist=True, expression=patients.models.NumericValue('value'), output_field=models.FloatField()),
+        ),
+        migrations.AddIndex(
+            model_name='customfieldvalue',
+            index=models.Index(fields=['field_definition', 'number_value', 'patient'], name='patients_cu_field_d_8c735a_idx'),
+        ),
+    ]
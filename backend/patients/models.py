@@ -1,4 +1,146 @@
 from django.db import models
+from django.db.models import BooleanField, Case, Count, F, FloatField, Func, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Cast, Lower, NullIf, Trim
+from django.db.models.lookups import LessThan
+from django.utils import timezone
+
+from .cache import bump_generations
+
+
+class DayNumber(Func):
+    """A date as days since the Unix epoch, so dates can be used in arithmetic."""
+    output_field = FloatField()
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, template='(julianday(%(expressions)s) - 2440587.5)', **extra_context)
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, template='(EXTRACT(EPOCH FROM %(expressions)s) / 86400)', **extra_context)
+
+
+class IsDistinctFrom(Func):
+    """``a IS DISTINCT FROM b``: unequal, counting NULL as a value of its own."""
+    arg_joiner = ' IS DISTINCT FROM '
+    template = '(%(expressions)s)'
+    output_field = BooleanField()
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, arg_joiner=' IS NOT ', **extra_context)
+
+
+# A whole decimal number, optionally signed and with an exponent: "12", "-0.5", ".5", "1e3"
+NUMBER_PATTERN = r'^[+-]?([0-9]+[.]?[0-9]*|[.][0-9]+)([eE][+-]?[0-9]+)?$'
+
+
+class NumericValue(Func):
+    """A text column as a number when all of it is one, else NULL."""
+    output_field = FloatField()
+    template = (
+        f"(CASE WHEN TRIM(%(expressions)s) ~ '{NUMBER_PATTERN}' "
+        "THEN CAST(TRIM(%(expressions)s) AS double precision) END)"
+    )
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        # CAST keeps the leading number of any text ("555-1234" -> 555), so check
+        # the whole value is NUMBER_PATTERN first. The stored column is computed
+        # by every client that writes a row (the sqlite3 shell, backups, replica
+        # syncs), so only SQLite's built-in functions may be used, not REGEXP.
+        value = "UPPER(TRIM(%(expressions)s))"
+        # An exponent's sign becomes part of the marker F, so any sign left must lead the value
+        marked = f"REPLACE(REPLACE({value}, 'E+', 'F'), 'E-', 'F')"
+        checks = [
+            f"{value} NOT GLOB '*[^0-9.E+-]*'",
+            f"{value} NOT GLOB '*E*E*'",
+            f"{value} NOT GLOB '*.*.*'",
+            f"{value} NOT GLOB '*E*.*'",
+            f"{marked} NOT GLOB '?*[+-]*'",
+            # Digits before the exponent, and right after it when there is one
+            f"({marked} GLOB '*[0-9]*[EF]*' OR ({marked} NOT GLOB '*[EF]*' AND {marked} GLOB '*[0-9]*'))",
+            f"({marked} NOT GLOB '*[EF]*' OR {marked} GLOB '*[EF][0-9]*')",
+        ]
+        template = f"(CASE WHEN {' AND '.join(checks)} THEN CAST(TRIM(%(expressions)s) AS REAL) END)"
+        return self.as_sql(compiler, connection, template=template, **extra_context)
+
+
+class PatientQuerySet(models.QuerySet):
+    # ISI 0-7 is "no clinically significant insomnia"
+    discharge_isi_threshold = 8
+
+    def refresh_latest_isi(self):
+        """Recompute the cached latest ISI columns for these patients, then rescore them."""
+        latest = ISIScore.objects.filter(patient=OuterRef('pk')).order_by('-date', '-id')
+        updated = self.update(
+            latest_isi_score=Subquery(latest.values('score')[:1]),
+            latest_isi_date=Subquery(latest.values('date')[:1]),
+            **self.discharge_readiness(),
+        )
+        bump_generations(Patient)
+        return updated
+
+    def score_discharge_readiness(self):
+        """
+        Recompute isi_trend_slope and suggested_discharge in a single UPDATE.
+
+        Only rows whose values change are written, and they get a new
+        updated_at so ETags and the change feed report them. refresh_latest_isi()
+        leaves that to the score writes that call it, which touch the patient.
+        """
+        readiness = self.discharge_readiness()
+        changed = IsDistinctFrom(F('isi_trend_slope'), readiness['isi_trend_slope']) | IsDistinctFrom(
+            F('suggested_discharge'), readiness['suggested_discharge']
+        )
+        updated = self.filter(changed).update(**readiness, updated_at=timezone.now())
+        bump_generations(self.model)
+        return updated
+
+    def discharge_readiness(self):
+        """
+        UPDATE expressions for isi_trend_slope and suggested_discharge.
+
+        The slope is the least-squares fit of score against date in ISI points
+        per week, built from per-patient sums on the (patient, date, score)
+        index. A patient is suggested for discharge when the trend is falling
+        and the two most recent scores are both under the threshold.
+        """
+        # Through the model's registry, so migrations can score historical models too
+        ISIScore = self.model._meta.apps.get_model('patients', 'ISIScore')
+        scores = ISIScore.objects.filter(patient=OuterRef('pk')).order_by()
+        x, y = DayNumber('date'), Cast('score', FloatField())
+        n, sx, sy = Count('*'), Sum(x), Sum(y)
+        slope = Subquery(
+            scores.values('patient').annotate(
+                slope=(n * Sum(x * y) - sx * sy) / NullIf(n * Sum(x * x) - sx * sx, Value(0.0)) * 7
+            ).values('slope')
+        )
+        latest_two = ISIScore.objects.filter(patient=OuterRef('pk')).order_by('-date', '-id').values('score')
+        threshold = self.discharge_isi_threshold
+        return {
+            'isi_trend_slope': slope,
+            'suggested_discharge': Case(
+                When(
+                    LessThan(slope, 0)
+                    & LessThan(Subquery(latest_two[:1]), threshold)
+                    & LessThan(Subquery(latest_two[1:2]), threshold),
+                    then=Value(True),
+                ),
+                default=Value(False),
+            ),
+        }
+
+    def touch(self):
+        """Bump updated_at so validators and change feeds see a child-row write."""
+        updated = self.update(updated_at=timezone.now())
+        bump_generations(Patient)
+        return updated
+
+    def with_primary_address(self):
+        """Annotate primary_city/primary_state from each patient's first address."""
+        primary = Address.objects.filter(patient=OuterRef('pk')).order_by('id')
+        return self.annotate(
+            primary_city=Subquery(primary.values('city')[:1]),
+            primary_state=Subquery(primary.values('state')[:1]),
+        )
+
 
 class Patient(models.Model):
     first_name   = models.CharField(max_length=50)
@@ -22,15 +164,50 @@ class Patient(models.Model):
 
     ready_to_discharge = models.BooleanField(default=False)
 
+    # Denormalized from the most recent ISIScore so the table can sort on it
+    latest_isi_score = models.IntegerField(null=True, blank=True, db_index=True)
+    latest_isi_date  = models.DateField(null=True, blank=True, db_index=True)
+
+    # Suggested discharge from the ISI trajectory; ready_to_discharge stays the clinician's call
+    isi_trend_slope     = models.FloatField(null=True, blank=True, db_index=True)
+    suggested_discharge = models.BooleanField(default=False, db_index=True)
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = PatientQuerySet.as_manager()
+
     class Meta:
         ordering = ['first_name', 'last_name']
+        indexes = [
+            # Serves the default ordering and keyset pagination over it
+            models.Index(fields=['first_name', 'last_name', 'id']),
+            # Serves the change feed, which pages through (updated_at, id)
+            models.Index(fields=['updated_at', 'id']),
+        ]
 
     def __str__(self):
         return f"{self.first_name} {self.last_name}"
 
+    def refresh_latest_isi(self):
+        """Sync latest_isi_score/latest_isi_date with this patient's ISI history."""
+        Patient.objects.filter(pk=self.pk).refresh_latest_isi()
+        self.refresh_from_db(fields=['latest_isi_score', 'latest_isi_date', 'isi_trend_slope', 'suggested_discharge'])
+
+
+class PatientTombstone(models.Model):
+    """Record of a deleted patient, so the change feed can report the delete."""
+    patient_id = models.IntegerField()
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['deleted_at', 'patient_id']),
+        ]
+
+    def __str__(self):
+        return f"Patient {self.patient_id} deleted at {self.deleted_at}"
+
 
 class Address(models.Model):
     patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name='addresses')
@@ -40,6 +217,27 @@ class Address(models.Model):
     state   = models.CharField(max_length=100)
     postal_code = models.CharField(max_length=20)
 
+    # Case-folded lookup keys computed by the database, so every write path
+    # (save, bulk_create, queryset.update) keeps them in sync
+    city_key  = models.GeneratedField(
+                    expression=Lower(Trim('city')),
+                    output_field=models.CharField(max_length=100),
+                    db_persist=True,
+                )
+    state_key = models.GeneratedField(
+                    expression=Lower(Trim('state')),
+                    output_field=models.CharField(max_length=100),
+                    db_persist=True,
+                )
+
+    class Meta:
+        indexes = [
+            # Lead with the filter column and end with patient so the
+            # city/state -> patient lookups are answered from the index alone
+            models.Index(fields=['city_key', 'patient']),
+            models.Index(fields=['state_key', 'city_key', 'patient']),
+        ]
+
     def __str__(self):
         return f"{self.address_line1}, {self.city}"
 
@@ -52,7 +250,10 @@ class ISIScore(models.Model):
     class Meta:
         ordering = ['-date']  # Most recent scores first
         indexes = [
-            models.Index(fields=['patient', 'date']),
+            # Cover per-patient and cohort series aggregation without reading the table
+            models.Index(fields=['patient', 'date', 'score']),
+            models.Index(fields=['date', 'score']),
+            models.Index(fields=['date', 'id']),
         ]
 
     def __str__(self):
@@ -77,6 +278,19 @@ class CustomFieldValue(models.Model):
                        )
     value = models.TextField(blank=True)
 
+    # Typed views of ``value`` for filtering and sorting, computed by the database
+    # so bulk writes keep them in sync
+    value_key    = models.GeneratedField(
+                      expression=Lower(Trim('value')),
+                      output_field=models.TextField(),
+                      db_persist=True,
+                   )
+    number_value = models.GeneratedField(
+                      expression=NumericValue('value'),
+                      output_field=models.FloatField(),
+                      db_persist=True,
+                   )
+
     class Meta:
         constraints = [
             models.UniqueConstraint(
@@ -84,6 +298,46 @@ class CustomFieldValue(models.Model):
                 name='unique_patient_custom_field'
             )
         ]
+        indexes = [
+            # Custom field filters resolve matching patients from these alone
+            models.Index(fields=['field_definition', 'value_key', 'patient']),
+            models.Index(fields=['field_definition', 'number_value', 'patient']),
+        ]
 
     def __str__(self):
         return f"{self.patient}: {self.field_definition.name} = {self.value}"
+
+
+class ClinicStat(models.Model):
+    """
+    One precomputed counter of the clinic summary, e.g. patients per status.
+
+    ``total`` carries a sum alongside ``count`` where a metric is an average.
+    Maintained incrementally by patients.stats; ``manage.py rebuild_stats``
+    recomputes it from scratch.
+    """
+    metric = models.CharField(max_length=50)
+    key    = models.CharField(max_length=100, blank=True)
+    count  = models.BigIntegerField(default=0)
+    total  = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['metric', 'key'], name='unique_clinic_stat'),
+        ]
+
+    def __str__(self):
+        return f"{self.metric}[{self.key}] = {self.count}"
+
+
+class PatientStatsSnapshot(models.Model):
+    """What each patient currently contributes to ClinicStat, so a change can be undone exactly."""
+    patient_id  = models.IntegerField(primary_key=True)
+    status      = models.CharField(max_length=10)
+    ready_to_discharge = models.BooleanField(default=False)
+    state_key   = models.CharField(max_length=100, blank=True)
+    latest_isi_score = models.IntegerField(null=True)
+    visit_month = models.CharField(max_length=7, blank=True)
+
+    def __str__(self):
+        return f"Stats snapshot for patient {self.patient_id}"
@@ -0,0 +1,247 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+
+from django.core.exceptions import FieldDoesNotExist
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class EstimatedPage(Page):
+    def __init__(self, object_list, number, paginator, has_next):
+        super().__init__(object_list, number, paginator)
+        self._has_next = has_next
+
+    def has_next(self):
+        return self._has_next
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator whose count stops at ``count_limit`` rows.
+
+    The count runs over a LIMITed subquery, so its cost is bounded no matter how
+    large the table grows. ``is_estimate`` is True when the real count is higher.
+    Pages do not depend on the count: each one fetches a row past its end to
+    tell whether another page follows, so pages beyond the estimate still work.
+    """
+    count_limit = 10_000
+    is_estimate = False
+
+    @cached_property
+    def count(self):
+        counted = self.object_list[:self.count_limit + 1].count()
+        self.is_estimate = counted > self.count_limit
+        return min(counted, self.count_limit)
+
+    def validate_number(self, number):
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger('That page number is not an integer')
+        if number < 1:
+            raise EmptyPage('That page number is less than 1')
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        rows = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not rows and number > 1:
+            raise EmptyPage('That page contains no results')
+        return EstimatedPage(rows[:self.per_page], number, self, has_next=len(rows) > self.per_page)
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset (seek) pagination over the queryset's own ordering.
+
+    The ordering is made unique by appending the primary key, and each page is
+    fetched with a ``WHERE (a, b, id) > (...)`` style predicate instead of an
+    OFFSET, so deep pages cost the same as the first one. Only non-null
+    concrete columns can be used as keys.
+    """
+    page_size = api_settings.PAGE_SIZE
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def __init__(self, page_size=None, paginator_class=None, strip_params=()):
+        if page_size:
+            self.page_size = page_size
+        # When set, an estimated count is included in the response
+        self.paginator_class = paginator_class
+        self.strip_params = strip_params
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.ordering = self.get_ordering(queryset)
+        self.paginator = None
+        if self.paginator_class is not None:
+            self.paginator = self.paginator_class(queryset, self.page_size)
+
+        cursor = self.decode_cursor(request)
+        reverse = False
+        if cursor is not None:
+            values, reverse = cursor
+            queryset = queryset.filter(self.keyset_filter(values, reverse))
+
+        order_by = [
+            ('-' if descending != reverse else '') + name
+            for name, descending in self.ordering
+        ]
+        rows = list(queryset.order_by(*order_by)[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+
+        # Walking backwards means there is always a later page to return to
+        self.has_next = has_more if not reverse else cursor is not None
+        self.has_previous = has_more if reverse else cursor is not None
+        self.page = rows
+        return rows
+
+    def get_paginated_response(self, data):
+        payload = {
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        }
+        if self.paginator is not None:
+            payload = {
+                'count': self.paginator.count,
+                'count_estimated': self.paginator.is_estimate,
+                **payload,
+            }
+        return Response(payload)
+
+    def get_ordering(self, queryset):
+        query = queryset.query
+        terms = list(query.order_by) or list(query.get_meta().ordering)
+        meta = queryset.model._meta
+        pk_name = meta.pk.name
+
+        ordering = []
+        for term in terms:
+            if not isinstance(term, str):
+                raise ValidationError({'cursor': 'Cursor pagination needs a plain field ordering.'})
+            name = term.lstrip('-')
+            name = pk_name if name == 'pk' else name
+            try:
+                field = meta.get_field(name)
+            except FieldDoesNotExist:
+                field = None
+            if field is None or not field.concrete or field.null:
+                raise ValidationError({'cursor': f'Cursor pagination is not supported when ordering by "{name}".'})
+            ordering.append((field.attname, term.startswith('-')))
+
+        # The primary key makes every key unique, so no row is skipped or repeated
+        if pk_name not in (name for name, _ in ordering):
+            descending = ordering[-1][1] if ordering else False
+            ordering.append((pk_name, descending))
+        return ordering
+
+    def keyset_filter(self, values, reverse):
+        if len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+
+        # (a > x) OR (a = x AND b > y) OR (a = x AND b = y AND id > z)
+        keyset = Q()
+        equal = {}
+        for (name, descending), value in zip(self.ordering, values):
+            lookup = 'lt' if descending != reverse else 'gt'
+            keyset |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+
+        # Redundant bound on the leading column lets SQLite range-scan its index
+        name, descending = self.ordering[0]
+        bound = 'lte' if descending != reverse else 'gte'
+        return Q(**{f'{name}__{bound}': values[0]}) & keyset
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            token = json.loads(urlsafe_b64decode(encoded.encode('ascii')))
+            return list(token['v']), bool(token.get('r'))
+        except (BinasciiError, KeyError, TypeError, ValueError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, row, reverse):
+        values = [getattr(row, name) for name, _ in self.ordering]
+        token = json.dumps({'v': values, 'r': int(reverse)}, cls=DjangoJSONEncoder)
+        url = self.request.build_absolute_uri()
+        for param in self.strip_params:
+            url = remove_query_param(url, param)
+        return replace_query_param(url, self.cursor_query_param, urlsafe_b64encode(token.encode()).decode('ascii'))
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+
+class DashboardPagination(PageNumberPagination):
+    """
+    Page-number pagination with two opt-in modes for large tables.
+
+    - ``?pagination=cursor`` (or ``X-Pagination: cursor``) switches to keyset pages.
+    - ``?count=estimated`` (or ``X-Count: estimated``) caps the COUNT(*) query.
+    """
+    mode_query_param = 'pagination'
+    mode_header = 'X-Pagination'
+    count_query_param = 'count'
+    count_header = 'X-Count'
+
+    keyset = None
+
+    def option(self, request, param, header):
+        return (request.query_params.get(param) or request.headers.get(header) or '').lower()
+
+    def estimated(self, request):
+        return self.option(request, self.count_query_param, self.count_header) == 'estimated'
+
+    def cursor_mode(self, request):
+        return (
+            self.option(request, self.mode_query_param, self.mode_header) == 'cursor'
+            or KeysetPagination.cursor_query_param in request.query_params
+        )
+
+    def counts_exactly(self, request):
+        """Whether the response reports an exact COUNT(*) of the filtered rows."""
+        return not (self.estimated(request) or self.cursor_mode(request))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        paginator_class = EstimatedCountPaginator if self.estimated(request) else None
+        if self.cursor_mode(request):
+            self.keyset = KeysetPagination(
+                page_size=self.get_page_size(request),
+                paginator_class=paginator_class,
+                strip_params=[self.page_query_param],
+            )
+            return self.keyset.paginate_queryset(queryset, request, view)
+
+        if paginator_class is not None:
+            self.django_paginator_class = paginator_class
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        response = super().get_paginated_response(data)
+        if isinstance(self.page.paginator, EstimatedCountPaginator):
+            response.data['count_estimated'] = self.page.paginator.is_estimate
+        return response
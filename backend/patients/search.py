@@ -0,0 +1,126 @@
+from django.db import OperationalError, connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from rest_framework import filters
+
+SEARCH_TABLE = 'patients_patient_search'
+
+# Trigram tokens are three characters long, shorter terms fall back to prefix matching
+MIN_TRIGRAM_LENGTH = 3
+
+TRIGGERS = {
+    f'{SEARCH_TABLE}_ai': f"""
+        CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_ai AFTER INSERT ON patients_patient BEGIN
+            INSERT INTO {SEARCH_TABLE}(rowid, first_name, last_name)
+            VALUES (new.id, new.first_name, new.last_name);
+        END""",
+    f'{SEARCH_TABLE}_ad': f"""
+        CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_ad AFTER DELETE ON patients_patient BEGIN
+            INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, first_name, last_name)
+            VALUES ('delete', old.id, old.first_name, old.last_name);
+        END""",
+    f'{SEARCH_TABLE}_au': f"""
+        CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_au AFTER UPDATE OF first_name, last_name
+        ON patients_patient BEGIN
+            INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, first_name, last_name)
+            VALUES ('delete', old.id, old.first_name, old.last_name);
+            INSERT INTO {SEARCH_TABLE}(rowid, first_name, last_name)
+            VALUES (new.id, new.first_name, new.last_name);
+        END""",
+}
+
+_available = {}
+
+
+def create_search_index(connection):
+    """
+    Create the FTS5 trigram index over patient names, kept in sync by triggers.
+
+    The table uses the patient table as external content, so it only stores the
+    index. Does nothing on databases without FTS5 trigram support.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        try:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5("
+                "first_name, last_name, content='patients_patient', content_rowid='id', "
+                "tokenize='trigram')"
+            )
+        except OperationalError:
+            # SQLite built without FTS5 or older than 3.34 (no trigram tokenizer)
+            return
+    ensure_search_index(connection, rebuild=True)
+
+
+def ensure_search_index(connection, rebuild=False):
+    """
+    Recreate any missing sync triggers and rebuild the index if they were gone.
+
+    SQLite migrations that remake patients_patient drop its triggers, so this
+    runs after every migrate.
+    """
+    if connection.vendor != 'sqlite' or SEARCH_TABLE not in connection.introspection.table_names():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'patients_patient'"
+        )
+        existing = {row[0] for row in cursor.fetchall()}
+        for name, sql in TRIGGERS.items():
+            if name not in existing:
+                cursor.execute(sql)
+                rebuild = True
+        if rebuild:
+            rebuild_search_index(connection)
+
+
+def drop_search_index(connection):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name in TRIGGERS:
+            cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+        cursor.execute(f"DROP TABLE IF EXISTS {SEARCH_TABLE}")
+
+
+def rebuild_search_index(connection):
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('rebuild')")
+
+
+def search_index_available(alias):
+    if alias not in _available:
+        connection = connections[alias]
+        _available[alias] = (
+            connection.vendor == 'sqlite'
+            and SEARCH_TABLE in connection.introspection.table_names()
+        )
+    return _available[alias]
+
+
+class PatientSearchFilter(filters.SearchFilter):
+    """
+    Name search served by the FTS5 trigram index instead of LIKE '%term%' scans.
+
+    Every term must match a first or last name, like SearchFilter. Terms of three
+    or more characters are substring matches against the trigram index; shorter
+    ones match name prefixes. Databases without the index use SearchFilter as is.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms or not search_index_available(queryset.db):
+            return super().filter_queryset(request, queryset, view)
+
+        trigram_terms = [term for term in terms if len(term) >= MIN_TRIGRAM_LENGTH]
+        if trigram_terms:
+            match = ' AND '.join('"{}"'.format(term.replace('"', '""')) for term in trigram_terms)
+            matches = RawSQL(f"SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s", [match])
+            queryset = queryset.filter(pk__in=matches)
+
+        for term in terms:
+            if len(term) < MIN_TRIGRAM_LENGTH:
+                queryset = queryset.filter(Q(first_name__istartswith=term) | Q(last_name__istartswith=term))
+        return queryset
@@ -1,11 +1,26 @@
 # serializers.py
 
 from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
 from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+from . import stats
+from .cache import bump_generations
+from .metrics import timed_serialization
 from .models import Patient, Address, ISIScore, CustomField, CustomFieldValue
+from .signals import touching_parents_once
 
 
-class AddressSerializer(serializers.ModelSerializer):
+class TimedRepresentationMixin:
+    """Count ``to_representation`` towards the request metrics' ``serialize`` time."""
+
+    def to_representation(self, instance):
+        with timed_serialization():
+            return super().to_representation(instance)
+
+
+class AddressSerializer(TimedRepresentationMixin, serializers.ModelSerializer):
     class Meta:
         model = Address
         fields = [
@@ -18,19 +33,19 @@ class AddressSerializer(serializers.ModelSerializer):
         ]
 
 
-class ISIScoreSerializer(serializers.ModelSerializer):
+class ISIScoreSerializer(TimedRepresentationMixin, serializers.ModelSerializer):
     class Meta:
         model = ISIScore
         fields = ["id", "score", "date"]
 
 
-class CustomFieldSerializer(serializers.ModelSerializer):
+class CustomFieldSerializer(TimedRepresentationMixin, serializers.ModelSerializer):
     class Meta:
         model = CustomField
         fields = ["id", "name"]
 
 
-class CustomFieldValueSerializer(serializers.ModelSerializer):
+class CustomFieldValueSerializer(TimedRepresentationMixin, serializers.ModelSerializer):
     # Use primary key for writes; nested read via CustomFieldSerializer
     field_definition = serializers.PrimaryKeyRelatedField(
         queryset=CustomField.objects.all()
@@ -41,11 +56,180 @@ class CustomFieldValueSerializer(serializers.ModelSerializer):
         fields = ["id", "field_definition", "value"]
 
 
-class PatientSerializer(serializers.ModelSerializer):
-    addresses           = AddressSerializer(many=True, required=False)
-    isi_scores          = ISIScoreSerializer(many=True, required=False)
+class CustomFieldValueUpsertSerializer(serializers.Serializer):
+    """
+    Validate a batch of ``(patient, field_definition, value)`` triples for an upsert.
+
+    Ids are plain integers checked with one query per table for the whole batch,
+    rather than one related-field lookup per row.
+    """
+    max_rows = 10_000
+
+    values = serializers.ListField(
+        child=serializers.DictField(),
+        allow_empty=False,
+        max_length=max_rows,
+    )
+
+    row_fields = {
+        "patient": serializers.IntegerField(),
+        "field_definition": serializers.IntegerField(),
+        "value": serializers.CharField(allow_blank=True, trim_whitespace=False),
+    }
+
+    def validate_values(self, rows):
+        validated, errors = [], {}
+        for index, row in enumerate(rows):
+            row_errors, data = {}, {}
+            for name, field in self.row_fields.items():
+                try:
+                    data[name] = field.run_validation(row.get(name, serializers.empty))
+                except serializers.ValidationError as exc:
+                    row_errors[name] = exc.detail
+            if row_errors:
+                errors[index] = row_errors
+            validated.append(data)
+
+        if not errors:
+            patients = set(Patient.objects.filter(pk__in={row["patient"] for row in validated}).values_list("pk", flat=True))
+            fields = set(CustomField.objects.filter(pk__in={row["field_definition"] for row in validated}).values_list("pk", flat=True))
+            for index, row in enumerate(validated):
+                if row["patient"] not in patients:
+                    errors.setdefault(index, {})["patient"] = [f'Invalid pk "{row["patient"]}" - object does not exist.']
+                if row["field_definition"] not in fields:
+                    errors.setdefault(index, {})["field_definition"] = [
+                        f'Invalid pk "{row["field_definition"]}" - object does not exist.'
+                    ]
+        if errors:
+            raise serializers.ValidationError(errors)
+        return validated
+
+    @transaction.atomic
+    def save(self):
+        """Insert or update every value with batched INSERT ... ON CONFLICT DO UPDATE statements."""
+        # The last value for a (patient, field) pair wins, as it would with one request per row
+        rows = {(row["patient"], row["field_definition"]): row["value"] for row in self.validated_data["values"]}
+        CustomFieldValue.objects.bulk_create(
+            [
+                CustomFieldValue(patient_id=patient, field_definition_id=field, value=value)
+                for (patient, field), value in rows.items()
+            ],
+            update_conflicts=True,
+            unique_fields=["patient", "field_definition"],
+            update_fields=["value"],
+        )
+        patients = {patient for patient, _ in rows}
+        # Bulk upserts skip signals, so bump the response cache and parent versions here
+        Patient.objects.filter(pk__in=patients).touch()
+        bump_generations(CustomFieldValue)
+        return {"upserted": len(rows), "patients": len(patients)}
+
+
+def sync_related(manager, model, rows, key, row_key, fields, alternate_key=None, alternate_row_key=None,
+                 delete_missing=True):
+    """
+    Make ``manager``'s rows match ``rows`` with a constant number of statements.
+
+    Existing objects are matched to incoming rows by ``key`` (an attribute on the
+    model) and ``row_key`` (a callable on the validated row), then, for rows left
+    unmatched, by ``alternate_key``/``alternate_row_key``. Matches that changed
+    are written with one bulk_update, unmatched rows with one bulk_create, and
+    leftovers with one DELETE.
+
+    With ``delete_missing=False`` (PATCH of ISI scores) leftovers are kept, and
+    only the existing rows the incoming ones could match are read, so writing
+    one row costs the same however many the parent already has.
+    """
+    if delete_missing:
+        candidates = manager.all()
+    else:
+        match = Q(**{f"{key}__in": {row_key(row) for row in rows} - {None}})
+        if alternate_key:
+            match |= Q(**{f"{alternate_key}__in": {alternate_row_key(row) for row in rows} - {None}})
+        candidates = manager.filter(match)
+    existing = {getattr(obj, key): obj for obj in candidates}
+    alternates = {getattr(obj, alternate_key): obj for obj in existing.values()} if alternate_key else {}
+    to_create, to_update = [], []
+
+    for row in rows:
+        obj = existing.pop(row_key(row), None)
+        if obj is None and alternate_key:
+            obj = alternates.get(alternate_row_key(row))
+            # Only claim an alternate match that no other row has taken by key
+            obj = existing.pop(getattr(obj, key), None) if obj is not None else None
+        row = {name: value for name, value in row.items() if name != "id"}
+        if obj is None:
+            to_create.append(model(**{manager.field.name: manager.instance}, **row))
+            continue
+        changed = {name: row[name] for name in fields if name in row and getattr(obj, name) != row[name]}
+        if changed:
+            for name, value in changed.items():
+                setattr(obj, name, value)
+            to_update.append(obj)
+
+    if existing and delete_missing:
+        # Per-row delete signals would each touch the parent; touch it once instead
+        with touching_parents_once([manager.instance.pk]):
+            model.objects.filter(pk__in=[obj.pk for obj in existing.values()]).delete()
+    if to_update:
+        model.objects.bulk_update(to_update, fields)
+    if to_create:
+        model.objects.bulk_create(to_create)
+    if to_update or to_create:
+        bump_generations(model)
+    return bool(to_update or to_create or (existing and delete_missing))
+
+
+class SparseFieldsMixin:
+    """
+    Let ``?fields=a,b`` trim the top-level representation and ``?expand=x``
+    opt into relations listed in ``expandable_fields``.
+    """
+    expandable_fields = []
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        top_level = self.parent is None or (
+            isinstance(self.parent, serializers.ListSerializer) and self.parent.parent is None
+        )
+        # Writes always validate against the full field set
+        if request is None or request.method not in SAFE_METHODS or not top_level:
+            return fields
+
+        expand = set(self.split_param(request, 'expand'))
+        for name in self.expandable_fields:
+            if name not in expand:
+                fields.pop(name, None)
+
+        requested = self.split_param(request, 'fields')
+        if requested:
+            fields = {name: field for name, field in fields.items() if name in requested or name in expand}
+        return fields
+
+    @staticmethod
+    def split_param(request, name):
+        value = request.query_params.get(name, '')
+        return [part.strip() for part in value.split(',') if part.strip()]
+
+
+class NestedAddressSerializer(AddressSerializer):
+    # Writable id so nested updates can match incoming rows to existing ones
+    id = serializers.IntegerField(required=False, allow_null=True)
+
+
+class NestedISIScoreSerializer(ISIScoreSerializer):
+    id = serializers.IntegerField(required=False, allow_null=True)
+
+
+class PatientSerializer(TimedRepresentationMixin, SparseFieldsMixin, serializers.ModelSerializer):
+    addresses           = NestedAddressSerializer(many=True, required=False)
+    isi_scores          = NestedISIScoreSerializer(many=True, required=False)
     custom_field_values = CustomFieldValueSerializer(many=True, required=False)
 
+    address_fields      = ["address_line1", "address_line2", "city", "state", "postal_code"]
+    isi_score_fields    = ["score", "date"]
+
     class Meta:
         model = Patient
         fields = [
@@ -60,10 +244,17 @@ class PatientSerializer(serializers.ModelSerializer):
             "addresses",
             "isi_scores",
             "custom_field_values",
+            "latest_isi_score",
+            "latest_isi_date",
+            "isi_trend_slope",
+            "suggested_discharge",
             "created_at",
             "updated_at",
         ]
-        read_only_fields = ["created_at", "updated_at"]
+        read_only_fields = [
+            "latest_isi_score", "latest_isi_date", "isi_trend_slope", "suggested_discharge",
+            "created_at", "updated_at",
+        ]
 
     @transaction.atomic
     def create(self, validated_data):
@@ -74,17 +265,27 @@ class PatientSerializer(serializers.ModelSerializer):
         # Create patient
         patient = Patient.objects.create(**validated_data)
 
-        # Create related entries individually
-        for addr in addresses:
-            Address.objects.create(patient=patient, **addr)
-        for score in isi_scores:
-            ISIScore.objects.create(patient=patient, **score)
-        for val in custom_values:
-            CustomFieldValue.objects.create(
+        # Create related entries with one INSERT per table
+        Address.objects.bulk_create([
+            Address(patient=patient, **{f: addr[f] for f in self.address_fields if f in addr})
+            for addr in addresses
+        ])
+        ISIScore.objects.bulk_create([
+            ISIScore(patient=patient, score=score['score'], date=score['date'])
+            for score in isi_scores
+        ])
+        CustomFieldValue.objects.bulk_create([
+            CustomFieldValue(
                 patient=patient,
                 field_definition=val['field_definition'],
                 value=val.get('value', '')
             )
+            for val in custom_values
+        ])
+        bump_generations(Address, ISIScore, CustomFieldValue)
+
+        if isi_scores:
+            patient.refresh_latest_isi()
 
         return patient
 
@@ -99,53 +300,135 @@ class PatientSerializer(serializers.ModelSerializer):
             setattr(instance, attr, value)
         instance.save()
 
-        # Replace related entries if provided
+        # Diff related entries against what is stored if provided. A list sent
+        # replaces the stored one, except that PATCH merges ISI scores: a score
+        # is identified by its id or date, so unmentioned ones are left alone,
+        # while an address sent without an id can't say which row it replaces
         if addresses is not None:
-            instance.addresses.all().delete()
-            for addr in addresses:
-                Address.objects.create(patient=instance, **addr)
+            sync_related(
+                instance.addresses, Address, addresses,
+                key="id", row_key=lambda row: row.get("id"),
+                fields=self.address_fields,
+            )
 
         if isi_scores is not None:
-            instance.isi_scores.all().delete()
-            for score in isi_scores:
-                ISIScore.objects.create(patient=instance, **score)
+            # A score sent without its id still updates the row recorded for that date
+            changed = sync_related(
+                instance.isi_scores, ISIScore, isi_scores,
+                key="id", row_key=lambda row: row.get("id"),
+                alternate_key="date", alternate_row_key=lambda row: row.get("date"),
+                fields=self.isi_score_fields, delete_missing=not self.partial,
+            )
+            if changed:
+                instance.refresh_latest_isi()
 
         if custom_values is not None:
-            try:
-                # Get existing custom field values
-                existing_values = {
-                    val.field_definition_id: val
-                    for val in instance.custom_field_values.all()
-                }
-
-                # Process each new value
-                for val in custom_values:
-                    field_def = val.get('field_definition')
-                    if not field_def:
-                        continue
-
-                    # If the value exists, update it
-                    if field_def.id in existing_values:
-                        existing_val = existing_values[field_def.id]
-                        existing_val.value = val.get('value', '')
-                        existing_val.save()
-                    else:
-                        # If it's new, create it
-                        CustomFieldValue.objects.create(
-                            patient=instance,
-                            field_definition=field_def,
-                            value=val.get('value', '')
-                        )
-
-                # Delete any values that weren't in the new data
-                new_field_ids = {val.get('field_definition').id for val in custom_values if val.get('field_definition')}
-                for field_id, existing_val in existing_values.items():
-                    if field_id not in new_field_ids:
-                        existing_val.delete()
-
-            except Exception as e:
-                print(f"Error processing custom fields: {e}")
-                print(f"Custom values data: {custom_values}")
-                raise
+            # Custom values are unique per field, so match on the field definition
+            custom_values = [
+                {"field_definition": val["field_definition"], "value": val.get("value", "")}
+                for val in custom_values if val.get("field_definition")
+            ]
+            sync_related(
+                instance.custom_field_values, CustomFieldValue, custom_values,
+                key="field_definition_id", row_key=lambda row: row["field_definition"].id,
+                fields=["value"],
+            )
 
         return instance
+
+
+class PatientListSerializer(TimedRepresentationMixin, SparseFieldsMixin, serializers.ModelSerializer):
+    """Compact row for the patient table; nested relations only via ``?expand=``."""
+    primary_city        = serializers.CharField(read_only=True, allow_null=True)
+    primary_state       = serializers.CharField(read_only=True, allow_null=True)
+    addresses           = AddressSerializer(many=True, read_only=True)
+    isi_scores          = ISIScoreSerializer(many=True, read_only=True)
+    custom_field_values = CustomFieldValueSerializer(many=True, read_only=True)
+
+    expandable_fields = ["addresses", "isi_scores", "custom_field_values"]
+
+    class Meta:
+        model = Patient
+        fields = [
+            "id",
+            "first_name",
+            "middle_name",
+            "last_name",
+            "date_of_birth",
+            "status",
+            "last_visit",
+            "ready_to_discharge",
+            "primary_city",
+            "primary_state",
+            "latest_isi_score",
+            "latest_isi_date",
+            "isi_trend_slope",
+            "suggested_discharge",
+            "addresses",
+            "isi_scores",
+            "custom_field_values",
+        ]
+
+
+class PatientBulkUpdateSerializer(serializers.Serializer):
+    """
+    Validate a patch of flat patient fields and the patients it applies to.
+
+    Patients are named by ``ids`` or matched by ``filter``, a dict of the list
+    endpoint's filter parameters; the view resolves the filter and hands the
+    queryset to ``save()``.
+    """
+    max_ids = 10_000
+
+    ids = serializers.ListField(
+        child=serializers.IntegerField(), required=False, allow_empty=False, max_length=max_ids,
+    )
+    filter = serializers.DictField(child=serializers.CharField(allow_blank=True), required=False, allow_empty=False)
+    patch = serializers.DictField(allow_empty=False)
+
+    def patch_fields(self):
+        # The writable scalar fields of the full serializer, validated the same way
+        return {
+            name: field for name, field in PatientSerializer().fields.items()
+            if not field.read_only and not isinstance(field, serializers.BaseSerializer)
+        }
+
+    def validate_patch(self, patch):
+        fields = self.patch_fields()
+        validated, errors = {}, {}
+        for name, value in patch.items():
+            field = fields.get(name)
+            if field is None:
+                errors[name] = ["Not a field that can be bulk updated."]
+                continue
+            try:
+                validated[field.source] = field.run_validation(value)
+            except serializers.ValidationError as exc:
+                errors[name] = exc.detail
+        if errors:
+            raise serializers.ValidationError(errors)
+        return validated
+
+    def validate(self, attrs):
+        if ("ids" in attrs) == ("filter" in attrs):
+            raise serializers.ValidationError('Pass exactly one of "ids" or "filter".')
+        return attrs
+
+    @transaction.atomic
+    def save(self, queryset):
+        """Apply the patch to ``queryset`` (narrowed to ``ids`` if given) with one UPDATE."""
+        patch = self.validated_data["patch"]
+        if "ids" in self.validated_data:
+            queryset = queryset.filter(pk__in=self.validated_data["ids"])
+        matched = queryset.count()
+
+        # Patients already holding the patched values keep their updated_at,
+        # so change feeds and ETags only move for rows that really changed
+        changing = queryset.exclude(**patch)
+        patient_ids = list(changing.select_for_update().values_list("pk", flat=True))
+        updated = changing.update(**patch, updated_at=timezone.now())
+
+        # update() sends no signals, so invalidate and queue the stats diff here
+        bump_generations(Patient)
+        stats.mark_changed(patient_ids)
+        return {"matched": matched, "updated": updated}
@@ -0,0 +1,153 @@
+from datetime import timedelta
+
+from django.db.models import Count, Max, Min, Sum
+from rest_framework import serializers
+
+from .models import ISIScore
+
+
+# Buckets are rolled up from per-day groups in Python: SQL only groups on the
+# raw date column, which the covering indexes return already in order, so no
+# per-row date function or temporary sort is needed
+BUCKETS = {
+    'day': lambda day: day,
+    'week': lambda day: day - timedelta(days=day.weekday()),
+    'month': lambda day: day.replace(day=1),
+}
+
+
+def lttb(points, threshold, x, y):
+    """
+    Downsample ``points`` to ``threshold`` points with Largest-Triangle-Three-Buckets.
+
+    The first and last points are kept; from each bucket in between, the point
+    forming the largest triangle with the previously kept point and the next
+    bucket's average is kept, which preserves peaks and troughs.
+    """
+    if threshold >= len(points) or threshold < 3:
+        return list(points)
+
+    sampled = [points[0]]
+    every = (len(points) - 2) / (threshold - 2)
+    previous = 0
+    for i in range(threshold - 2):
+        next_start = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, len(points))
+        next_points = points[next_start:next_end]
+        avg_x = sum(x(point) for point in next_points) / len(next_points)
+        avg_y = sum(y(point) for point in next_points) / len(next_points)
+
+        prev_x, prev_y = x(points[previous]), y(points[previous])
+        start, end = int(i * every) + 1, int((i + 1) * every) + 1
+        previous = max(
+            range(start, end),
+            key=lambda j: abs(
+                (prev_x - avg_x) * (y(points[j]) - prev_y)
+                - (prev_x - x(points[j])) * (avg_y - prev_y)
+            ),
+        )
+        sampled.append(points[previous])
+    sampled.append(points[-1])
+    return sampled
+
+
+class SeriesQuerySerializer(serializers.Serializer):
+    """Query parameters of ``GET /api/isi-scores/series/``."""
+    max_patients = 100
+
+    patient = serializers.CharField(required=False)
+    group = serializers.ChoiceField(choices=['patient', 'cohort'], required=False)
+    bucket = serializers.ChoiceField(choices=list(BUCKETS), default='month')
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+    points = serializers.IntegerField(required=False, min_value=3, max_value=10_000)
+
+    def validate_patient(self, value):
+        try:
+            patients = sorted({int(part) for part in value.split(',') if part.strip()})
+        except ValueError:
+            raise serializers.ValidationError('Expected a comma-separated list of patient ids.')
+        if len(patients) > self.max_patients:
+            raise serializers.ValidationError(f'At most {self.max_patients} patients per request.')
+        return patients
+
+    def validate(self, attrs):
+        # Per-patient series by default when patients are named, otherwise one cohort series
+        attrs.setdefault('group', 'patient' if attrs.get('patient') else 'cohort')
+        if attrs['group'] == 'patient' and not attrs.get('patient'):
+            raise serializers.ValidationError({'patient': 'Required when grouping by patient.'})
+        return attrs
+
+
+class ISIScoreSeries:
+    """
+    Bucketed ISI statistics (mean, min, max, count).
+
+    One GROUP BY per request sums scores per day (and patient), reading only
+    the ``(date, score)`` index for cohorts and the ``(patient, date, score)``
+    index for patients. The few hundred daily rows per series are then
+    merged into week or month buckets.
+    """
+
+    def __init__(self, patient=None, group='cohort', bucket='month', start=None, end=None, points=None):
+        self.patients = patient
+        self.group = group
+        self.bucket = bucket
+        self.start = start
+        self.end = end
+        self.points = points
+
+    def queryset(self):
+        queryset = ISIScore.objects.order_by()
+        if self.patients:
+            queryset = queryset.filter(patient__in=self.patients)
+        if self.start:
+            queryset = queryset.filter(date__gte=self.start)
+        if self.end:
+            queryset = queryset.filter(date__lte=self.end)
+
+        group_by = ['patient', 'date'] if self.group == 'patient' else ['date']
+        return (
+            queryset
+            .values(*group_by)
+            .annotate(total=Sum('score'), min=Min('score'), max=Max('score'), count=Count('*'))
+            .order_by(*group_by)
+        )
+
+    def series(self):
+        bucket_of = BUCKETS[self.bucket]
+        buckets = {}
+        for row in self.queryset():
+            points = buckets.setdefault(row.get('patient'), {})
+            point = points.get(bucket_of(row['date']))
+            if point is None:
+                points[bucket_of(row['date'])] = dict(row)
+                continue
+            point['total'] += row['total']
+            point['count'] += row['count']
+            point['min'] = min(point['min'], row['min'])
+            point['max'] = max(point['max'], row['max'])
+
+        if self.group == 'cohort':
+            buckets.setdefault(None, {})
+        series = {
+            key: [
+                {
+                    'date': day,
+                    'mean': round(point['total'] / point['count'], 2),
+                    'min': point['min'],
+                    'max': point['max'],
+                    'count': point['count'],
+                }
+                for day, point in points.items()
+            ]
+            for key, points in buckets.items()
+        }
+        if self.points:
+            for key, points in series.items():
+                series[key] = lttb(points, self.points, x=lambda p: p['date'].toordinal(), y=lambda p: p['mean'])
+
+        return {
+            'bucket': self.bucket,
+            'series': [{'patient': patient, 'points': points} for patient, points in series.items()],
+        }
@@ -0,0 +1,99 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import connections
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_migrate, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import stats
+from .cache import bump_generations
+from .models import Patient, PatientTombstone, Address, ISIScore, CustomField, CustomFieldValue
+from .search import ensure_search_index
+
+
+@receiver(post_migrate)
+def restore_search_triggers(sender, using, **kwargs):
+    if sender.name == 'patients':
+        ensure_search_index(connections[using])
+
+
+# Bulk writes (bulk_create, bulk_update, queryset.update) skip these signals,
+# so the code doing them calls bump_generations itself
+@receiver(post_save, sender=Patient)
+@receiver(post_save, sender=Address)
+@receiver(post_save, sender=ISIScore)
+@receiver(post_save, sender=CustomField)
+@receiver(post_save, sender=CustomFieldValue)
+@receiver(post_delete, sender=Patient)
+@receiver(post_delete, sender=Address)
+@receiver(post_delete, sender=ISIScore)
+@receiver(post_delete, sender=CustomField)
+@receiver(post_delete, sender=CustomFieldValue)
+def invalidate_cached_responses(sender, **kwargs):
+    bump_generations(sender)
+
+
+def deletion_model(origin):
+    return origin.model if isinstance(origin, QuerySet) else type(origin)
+
+
+# Set inside touching_parents_once(), which touches the parents itself
+_parents_touched_once = ContextVar('parents_touched_once', default=False)
+
+
+@contextmanager
+def touching_parents_once(patient_ids):
+    """
+    Write child rows of ``patient_ids`` inside the block, then touch each parent once.
+
+    Deleting many rows otherwise sends one UPDATE of the parent per row.
+    """
+    token = _parents_touched_once.set(True)
+    try:
+        yield
+    finally:
+        _parents_touched_once.reset(token)
+    Patient.objects.filter(pk__in=patient_ids).touch()
+
+
+# A patient's ETag and updated_at cover its nested rows, so writing a child
+# row touches the parent
+@receiver(post_save, sender=Address)
+@receiver(post_save, sender=ISIScore)
+@receiver(post_save, sender=CustomFieldValue)
+@receiver(post_delete, sender=Address)
+@receiver(post_delete, sender=ISIScore)
+@receiver(post_delete, sender=CustomFieldValue)
+def touch_parent_patient(sender, instance, origin=None, **kwargs):
+    # Cascades from a patient or custom field delete are handled once, below
+    if origin is not None and deletion_model(origin) in (Patient, CustomField):
+        return
+    if _parents_touched_once.get():
+        return
+    Patient.objects.filter(pk=instance.patient_id).touch()
+
+
+@receiver(pre_delete, sender=CustomField)
+def touch_patients_with_values(sender, instance, **kwargs):
+    Patient.objects.filter(custom_field_values__field_definition=instance).touch()
+
+
+@receiver(post_delete, sender=Patient)
+def record_patient_tombstone(sender, instance, **kwargs):
+    PatientTombstone.objects.create(patient_id=instance.pk)
+
+
+# Clinic stats are updated after commit, once latest ISI columns are refreshed
+@receiver(post_save, sender=Patient)
+@receiver(post_delete, sender=Patient)
+def queue_patient_stats(sender, instance, **kwargs):
+    stats.mark_changed([instance.pk])
+
+
+@receiver(post_save, sender=Address)
+@receiver(post_save, sender=ISIScore)
+@receiver(post_delete, sender=Address)
+@receiver(post_delete, sender=ISIScore)
+def queue_parent_stats(sender, instance, **kwargs):
+    stats.mark_changed([instance.patient_id])
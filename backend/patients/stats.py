@@ -0,0 +1,164 @@
+import threading
+from collections import Counter
+
+from django.apps import apps as global_apps
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery
+
+# Metric names stored in ClinicStat.metric
+STATUS = 'status'
+READY_TO_DISCHARGE = 'ready_to_discharge'
+ISI_BY_STATE = 'isi_by_state'
+VISITS_BY_MONTH = 'visits_by_month'
+
+SNAPSHOT_FIELDS = ['status', 'ready_to_discharge', 'state_key', 'latest_isi_score', 'visit_month']
+
+_pending = threading.local()
+
+
+def contributions(snapshot):
+    """Yield the ``(metric, key, total)`` counters a patient snapshot adds one to."""
+    yield STATUS, snapshot['status'], 0
+    if snapshot['ready_to_discharge']:
+        yield READY_TO_DISCHARGE, '', 0
+    if snapshot['latest_isi_score'] is not None:
+        yield ISI_BY_STATE, snapshot['state_key'], snapshot['latest_isi_score']
+    if snapshot['visit_month']:
+        yield VISITS_BY_MONTH, snapshot['visit_month'], 0
+
+
+def current_snapshots(patients, apps=global_apps):
+    """Read the stats-relevant state of ``patients`` (a Patient queryset) in one query."""
+    Address = apps.get_model('patients', 'Address')
+    primary = Address.objects.filter(patient=OuterRef('pk')).order_by('id')
+    rows = patients.order_by().annotate(
+        primary_state_key=Subquery(primary.values('state_key')[:1]),
+    ).values_list('pk', 'status', 'ready_to_discharge', 'primary_state_key', 'latest_isi_score', 'last_visit')
+    for pk, status, ready, state_key, isi, last_visit in rows.iterator(chunk_size=5000):
+        yield pk, {
+            'status': status,
+            'ready_to_discharge': ready,
+            'state_key': state_key or '',
+            'latest_isi_score': isi,
+            'visit_month': last_visit.strftime('%Y-%m') if last_visit else '',
+        }
+
+
+def apply_deltas(deltas, apps=global_apps):
+    ClinicStat = apps.get_model('patients', 'ClinicStat')
+    for (metric, key), (count, total) in deltas.items():
+        if not count and not total:
+            continue
+        updated = ClinicStat.objects.filter(metric=metric, key=key).update(
+            count=F('count') + count, total=F('total') + total,
+        )
+        if not updated:
+            ClinicStat.objects.create(metric=metric, key=key, count=count, total=total)
+
+
+def mark_changed(patient_ids):
+    """
+    Queue patients for a stats update once the current transaction commits.
+
+    The update diffs each patient against its snapshot, so queueing a patient
+    twice, or one whose change was rolled back, costs a read and nothing more.
+    """
+    pending = getattr(_pending, 'ids', None)
+    if pending is None:
+        pending = _pending.ids = set()
+    pending.update(patient_ids)
+    transaction.on_commit(flush)
+
+
+def flush(batch_size=5000):
+    pending = getattr(_pending, 'ids', None)
+    if not pending:
+        return
+    patient_ids, _pending.ids = sorted(pending), set()
+    # Bulk writes can queue a whole cohort; keep each IN list well under SQLite's variable limit
+    for start in range(0, len(patient_ids), batch_size):
+        update(patient_ids[start:start + batch_size])
+
+
+@transaction.atomic
+def update(patient_ids, apps=global_apps):
+    """Move ``patient_ids`` from their snapshot counters to their current ones."""
+    Patient = apps.get_model('patients', 'Patient')
+    PatientStatsSnapshot = apps.get_model('patients', 'PatientStatsSnapshot')
+
+    patient_ids = list(patient_ids)
+    before = {
+        row.pop('patient_id'): row
+        for row in PatientStatsSnapshot.objects.filter(patient_id__in=patient_ids).values('patient_id', *SNAPSHOT_FIELDS)
+    }
+    after = dict(current_snapshots(Patient.objects.filter(pk__in=patient_ids), apps))
+
+    changed = [pk for pk in patient_ids if before.get(pk) != after.get(pk)]
+    if not changed:
+        return
+
+    deltas = {}
+    for pk in changed:
+        for sign, snapshot in ((-1, before.get(pk)), (1, after.get(pk))):
+            if snapshot is None:
+                continue
+            for metric, key, total in contributions(snapshot):
+                count_delta, total_delta = deltas.get((metric, key), (0, 0))
+                deltas[metric, key] = (count_delta + sign, total_delta + sign * total)
+
+    apply_deltas(deltas, apps)
+    PatientStatsSnapshot.objects.filter(patient_id__in=changed).delete()
+    PatientStatsSnapshot.objects.bulk_create([
+        PatientStatsSnapshot(patient_id=pk, **after[pk]) for pk in changed if pk in after
+    ])
+
+
+@transaction.atomic
+def rebuild(apps=global_apps, batch_size=5000):
+    """Recompute every counter and snapshot from the patient table."""
+    Patient = apps.get_model('patients', 'Patient')
+    ClinicStat = apps.get_model('patients', 'ClinicStat')
+    PatientStatsSnapshot = apps.get_model('patients', 'PatientStatsSnapshot')
+
+    ClinicStat.objects.all().delete()
+    PatientStatsSnapshot.objects.all().delete()
+
+    counts, totals = Counter(), Counter()
+    batch = []
+    for pk, snapshot in current_snapshots(Patient.objects.all(), apps):
+        for metric, key, total in contributions(snapshot):
+            counts[metric, key] += 1
+            totals[metric, key] += total
+        batch.append(PatientStatsSnapshot(patient_id=pk, **snapshot))
+        if len(batch) >= batch_size:
+            PatientStatsSnapshot.objects.bulk_create(batch)
+            batch = []
+    PatientStatsSnapshot.objects.bulk_create(batch)
+    ClinicStat.objects.bulk_create([
+        ClinicStat(metric=metric, key=key, count=count, total=totals[metric, key])
+        for (metric, key), count in counts.items()
+    ])
+    return sum(count for (metric, _), count in counts.items() if metric == STATUS)
+
+
+def summary():
+    """Render the clinic summary from the precomputed counters."""
+    ClinicStat = global_apps.get_model('patients', 'ClinicStat')
+    stats = {}
+    for stat in ClinicStat.objects.filter(count__gt=0).order_by('metric', 'key'):
+        stats.setdefault(stat.metric, []).append(stat)
+
+    by_status = {stat.key: stat.count for stat in stats.get(STATUS, [])}
+    return {
+        'patients': sum(by_status.values()),
+        'by_status': by_status,
+        'ready_to_discharge': sum(stat.count for stat in stats.get(READY_TO_DISCHARGE, [])),
+        'isi_by_state': [
+            {'state': stat.key, 'patients': stat.count, 'average_latest_isi': round(stat.total / stat.count, 2)}
+            for stat in stats.get(ISI_BY_STATE, [])
+        ],
+        'visits_by_month': [
+            {'month': stat.key, 'visits': stat.count}
+            for stat in stats.get(VISITS_BY_MONTH, [])
+        ],
+    }
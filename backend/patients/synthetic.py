@@ -0,0 +1,155 @@
+import random
+from datetime import date, timedelta
+
+from django.db import transaction
+
+from . import stats
+from .cache import bump_generations
+from .models import Address, CustomField, CustomFieldValue, ISIScore, Patient
+
+# Seed and anchor for data that must be identical on every run and machine (the benchmarks)
+SEED = 0
+ANCHOR = date(2025, 6, 30)
+
+# (city, state, weight): weights follow metro population, so city and state
+# filters see the skew of a real patient list rather than a uniform spread
+CITIES = [
+    ("New York", "NY", 190), ("Los Angeles", "CA", 130), ("Chicago", "IL", 95),
+    ("Dallas", "TX", 76), ("Houston", "TX", 71), ("Washington", "DC", 63),
+    ("Philadelphia", "PA", 62), ("Miami", "FL", 61), ("Atlanta", "GA", 60),
+    ("Boston", "MA", 49), ("Phoenix", "AZ", 48), ("San Francisco", "CA", 47),
+    ("Seattle", "WA", 40), ("Minneapolis", "MN", 37), ("San Diego", "CA", 33),
+    ("Denver", "CO", 30), ("Portland", "OR", 25), ("Austin", "TX", 23),
+    ("San Antonio", "TX", 26), ("Springfield", "IL", 2), ("Burlington", "VT", 1),
+]
+STREETS = [
+    "Main St", "Oak Ave", "Maple Dr", "Cedar Ln", "Park Blvd", "Washington St",
+    "Lake Rd", "Hill St", "Elm St", "Pine St", "Sunset Blvd", "Broadway",
+]
+FIRST_NAMES = [
+    "James", "Mary", "John", "Patricia", "Robert", "Jennifer", "Michael", "Linda",
+    "David", "Elizabeth", "William", "Barbara", "Richard", "Susan", "Joseph", "Jessica",
+    "Thomas", "Sarah", "Carlos", "Karen", "Daniel", "Lisa", "Matthew", "Nancy",
+    "Anthony", "Priya", "Wei", "Fatima", "Hiroshi", "Olga", "Kwame", "Sofia",
+]
+LAST_NAMES = [
+    "Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis",
+    "Rodriguez", "Martinez", "Hernandez", "Lopez", "Gonzalez", "Wilson", "Anderson", "Thomas",
+    "Taylor", "Moore", "Jackson", "Martin", "Lee", "Perez", "Thompson", "White",
+    "Nguyen", "Patel", "Kim", "Chen", "Okafor", "Ivanova", "Tanaka", "O'Brien",
+]
+STATUS_WEIGHTS = {
+    Patient.Status.INQUIRY: 15,
+    Patient.Status.ONBOARDING: 15,
+    Patient.Status.ACTIVE: 50,
+    Patient.Status.CHURNED: 20,
+}
+CUSTOM_FIELDS = {
+    "Referral Source": lambda rng: rng.choice(["Primary care", "Self", "Sleep clinic", "Employer", "Insurer"]),
+    "Sleep Medication": lambda rng: rng.choice(["None", "None", "Melatonin", "Zolpidem", "Trazodone"]),
+    "Apnea-Hypopnea Index": lambda rng: f"{rng.lognormvariate(1.8, 0.7):.1f}",
+    "Shift Worker": lambda rng: rng.choice(["Yes", "No", "No", "No"]),
+}
+
+
+class SyntheticPatients:
+    """
+    Reproducible synthetic patients for load testing.
+
+    The same ``seed`` and ``anchor`` (the date histories end on) always yield
+    the same rows. Patients get one or two addresses weighted by city size,
+    a weekly ISI course whose length and trend depend on their status, and
+    values for most of ``CUSTOM_FIELDS``. Rows are written with one bulk
+    insert per table and batch.
+    """
+
+    def __init__(self, seed=0, anchor=None, max_weeks=26):
+        self.rng = random.Random(seed)
+        self.anchor = anchor or date.today()
+        self.max_weeks = max_weeks
+        self.cities = [(city, state) for city, state, _ in CITIES]
+        self.city_weights = [weight for _, _, weight in CITIES]
+
+    def weeks_of_history(self, status):
+        if status == Patient.Status.INQUIRY:
+            return 0
+        if status == Patient.Status.ONBOARDING:
+            return self.rng.randint(0, 2)
+        if status == Patient.Status.CHURNED:
+            return self.rng.randint(1, min(8, self.max_weeks))
+        return self.rng.randint(2, self.max_weeks)
+
+    def patient(self):
+        rng = self.rng
+        status = rng.choices(list(STATUS_WEIGHTS), weights=list(STATUS_WEIGHTS.values()))[0]
+        # Churned patients stopped coming a while ago, inquiries have not been seen yet
+        days_since_visit = rng.randint(60, 720) if status == Patient.Status.CHURNED else rng.randint(0, 60)
+        return Patient(
+            first_name=rng.choice(FIRST_NAMES),
+            middle_name=rng.choice(["", "", "", "A.", "J.", "M."]),
+            last_name=rng.choice(LAST_NAMES),
+            date_of_birth=self.anchor - timedelta(days=rng.randint(18 * 365, 85 * 365)),
+            status=status,
+            last_visit=None if status == Patient.Status.INQUIRY else self.anchor - timedelta(days=days_since_visit),
+        ), self.weeks_of_history(status)
+
+    def scores(self, patient, weeks):
+        # Insomnia starts moderate to severe and usually improves under treatment
+        if not weeks:
+            return
+        rng = self.rng
+        score = rng.gauss(18, 4)
+        trend = rng.uniform(-1.2, 0.3)
+        first_day = patient.last_visit - timedelta(weeks=weeks - 1)
+        for week in range(weeks):
+            yield ISIScore(
+                patient=patient,
+                score=min(28, max(0, round(score + rng.gauss(0, 1.5)))),
+                date=first_day + timedelta(weeks=week),
+            )
+            score += trend
+
+    def addresses(self, patient):
+        rng = self.rng
+        for city, state in rng.choices(self.cities, weights=self.city_weights, k=rng.choice([1, 1, 1, 2])):
+            yield Address(
+                patient=patient,
+                address_line1=f"{rng.randint(1, 9999)} {rng.choice(STREETS)}",
+                address_line2=rng.choice([None, None, None, f"Apt {rng.randint(1, 40)}"]),
+                city=city,
+                state=state,
+                postal_code=f"{rng.randint(1000, 99999):05d}",
+            )
+
+    def custom_values(self, patient, fields):
+        for field in fields:
+            if self.rng.random() < 0.8:
+                yield CustomFieldValue(patient=patient, field_definition=field, value=CUSTOM_FIELDS[field.name](self.rng))
+
+    def generate(self, count, batch_size=5000):
+        """Create ``count`` patients and return the number of rows written per table."""
+        fields = [CustomField.objects.get_or_create(name=name)[0] for name in CUSTOM_FIELDS]
+        totals = {"patients": 0, "addresses": 0, "isi_scores": 0, "custom_field_values": 0}
+        for start in range(0, count, batch_size):
+            with transaction.atomic():
+                batch = [self.patient() for _ in range(min(batch_size, count - start))]
+                patients = Patient.objects.bulk_create([patient for patient, _ in batch])
+                addresses = Address.objects.bulk_create(
+                    address for patient in patients for address in self.addresses(patient)
+                )
+                scores = ISIScore.objects.bulk_create(
+                    score for patient, weeks in batch for score in self.scores(patient, weeks)
+                )
+                values = CustomFieldValue.objects.bulk_create(
+                    value for patient in patients for value in self.custom_values(patient, fields)
+                )
+                Patient.objects.filter(pk__gte=patients[0].pk, pk__lte=patients[-1].pk).refresh_latest_isi()
+            totals["patients"] += len(patients)
+            totals["addresses"] += len(addresses)
+            totals["isi_scores"] += len(scores)
+            totals["custom_field_values"] += len(values)
+
+        # Bulk inserts send no signals: rebuild the clinic counters once and drop cached responses
+        stats.rebuild()
+        bump_generations(Patient, Address, ISIScore, CustomFieldValue)
+        return totals
@@ -1,10 +1,32 @@
-from django.test import TestCase
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import OperationalError, connection, connections, transaction
+from django.db.models import Sum
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework.test import APITestCase, APIClient
-from rest_framework import status
-from .models import Patient, Address, ISIScore, CustomField, CustomFieldValue
+from rest_framework import serializers, status
+from core.replicas import (
+    ReadReplicaRouter, ReplicaRoutingMiddleware, primary_reads, read_alias, reads_from_replicas, replica_reads,
+)
+from core.sqlite.base import DatabaseWrapper as ConcurrentDatabaseWrapper
+from .changes import PatientChangeFeed
+from .metrics import QueryRecorder, percentiles, registry as request_metrics
+from .models import Patient, Address, ISIScore, CustomField, CustomFieldValue, ClinicStat
+from .series import lttb
 from datetime import date, timedelta
+from io import StringIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
 import json
+import sqlite3
+import threading
+import time
 
 class PatientModelTest(TestCase):
     def setUp(self):
@@ -203,3 +225,1498 @@ class IntegrationTest(APITestCase):
         )
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data['results']), 1)
+
+class PatientQueryCountTest(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.custom_field = CustomField.objects.create(name="Allergies")
+
+    def create_patients(self, count):
+        for i in range(count):
+            patient = Patient.objects.create(
+                first_name=f"Patient{i:03d}",
+                last_name="Query",
+                date_of_birth=date(1990, 1, 1),
+                status=Patient.Status.ACTIVE
+            )
+            Address.objects.create(
+                patient=patient,
+                address_line1="1 Test St",
+                city="Boston",
+                state="MA",
+                postal_code="02101"
+            )
+            ISIScore.objects.create(patient=patient, score=12, date=date(2024, 1, 1))
+            ISIScore.objects.create(patient=patient, score=10, date=date(2024, 2, 1))
+            CustomFieldValue.objects.create(
+                patient=patient,
+                field_definition=self.custom_field,
+                value="None"
+            )
+
+    def test_list_query_count_is_constant(self):
+        """Test that a list page costs the same number of queries regardless of page size"""
+        expanded = reverse('patient-list') + '?expand=addresses,isi_scores,custom_field_values'
+        # validators + count + patients, plus addresses + isi_scores + custom_field_values when expanded
+        self.create_patients(2)
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('patient-list'))
+        self.assertEqual(len(response.data['results']), 2)
+        with self.assertNumQueries(6):
+            response = self.client.get(expanded)
+        self.assertEqual(len(response.data['results']), 2)
+
+        self.create_patients(20)
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('patient-list'))
+        self.assertEqual(len(response.data['results']), 20)
+        with self.assertNumQueries(6):
+            response = self.client.get(expanded)
+        self.assertEqual(len(response.data['results']), 20)
+
+    def test_detail_query_count(self):
+        """Test that a patient detail is fetched with one query per nested relation"""
+        self.create_patients(1)
+        patient = Patient.objects.get()
+        # validators + patient + addresses + isi_scores + custom_field_values
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse('patient-detail', args=[patient.id]))
+        self.assertEqual(len(response.data['isi_scores']), 2)
+        self.assertEqual(response.data['isi_scores'][0]['score'], 10)
+
+class LatestISIScoreTest(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.mild = Patient.objects.create(
+            first_name="Mild", last_name="Case", date_of_birth=date(1990, 1, 1)
+        )
+        self.severe = Patient.objects.create(
+            first_name="Severe", last_name="Case", date_of_birth=date(1990, 1, 1)
+        )
+        # An old high score must not count once a newer, lower one exists
+        ISIScore.objects.create(patient=self.mild, score=27, date=date(2024, 1, 1))
+        ISIScore.objects.create(patient=self.mild, score=5, date=date(2024, 3, 1))
+        ISIScore.objects.create(patient=self.severe, score=20, date=date(2024, 2, 1))
+        Patient.objects.refresh_latest_isi()
+
+    def test_refresh_latest_isi(self):
+        """Test that the cached columns reflect the most recent score"""
+        self.mild.refresh_from_db()
+        self.assertEqual(self.mild.latest_isi_score, 5)
+        self.assertEqual(self.mild.latest_isi_date, date(2024, 3, 1))
+
+    def test_ordering_by_latest_isi_score(self):
+        """Test that ISI ordering sorts on the latest score, including the legacy key"""
+        for ordering in ['-latest_isi_score', '-isi_scores__score']:
+            response = self.client.get(reverse('patient-list') + f'?ordering={ordering}')
+            names = [p['first_name'] for p in response.data['results']]
+            self.assertEqual(names, ["Severe", "Mild"])
+
+    def test_serializer_update_refreshes_latest_isi(self):
+        """Test that replacing ISI scores through the patient API updates the cache"""
+        response = self.client.patch(
+            reverse('patient-detail', args=[self.severe.id]),
+            {"isi_scores": [{"score": 3, "date": "2024-04-01"}]},
+            format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['latest_isi_score'], 3)
+
+    def test_isi_score_delete_refreshes_latest_isi(self):
+        """Test that deleting the latest ISI score falls back to the previous one"""
+        latest = self.mild.isi_scores.first()
+        response = self.client.delete(reverse('isi-score-detail', args=[latest.id]))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.mild.refresh_from_db()
+        self.assertEqual(self.mild.latest_isi_score, 27)
+
+class PatientAddressFilterTest(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.patient = Patient.objects.create(
+            first_name="Two", last_name="Homes", date_of_birth=date(1990, 1, 1)
+        )
+        for line in ["1 First St", "2 Second St"]:
+            Address.objects.create(
+                patient=self.patient, address_line1=line,
+                city="Boston", state="MA", postal_code="02101"
+            )
+        other = Patient.objects.create(
+            first_name="Albany", last_name="Resident", date_of_birth=date(1990, 1, 1)
+        )
+        Address.objects.create(
+            patient=other, address_line1="3 Third St",
+            city="Albany", state="NY", postal_code="12201"
+        )
+
+    def test_city_filter_returns_each_patient_once(self):
+        """Test that several matching addresses don't duplicate a patient"""
+        response = self.client.get(reverse('patient-list') + '?city=bost&state=ma')
+        self.assertEqual(response.data['count'], 1)
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(response.data['results'][0]['id'], self.patient.id)
+
+    def test_ordering_by_city(self):
+        """Test ordering by the primary address city, including the legacy key"""
+        for ordering in ['primary_city', 'addresses__city']:
+            response = self.client.get(reverse('patient-list') + f'?ordering={ordering}')
+            self.assertEqual(response.data['count'], 2)
+            names = [p['first_name'] for p in response.data['results']]
+            self.assertEqual(names, ["Albany", "Two"])
+
+class PaginationModeTest(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        # Duplicate names make the primary key tie-breaker matter
+        for i in range(25):
+            patient = Patient.objects.create(
+                first_name="Same" if i % 2 else f"Name{i:02d}",
+                last_name="Patient",
+                date_of_birth=date(1990, 1, 1)
+            )
+            ISIScore.objects.create(patient=patient, score=i, date=date(2024, 1, 1) + timedelta(days=i // 3))
+
+    def walk(self, url):
+        seen, pages = [], 0
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn('count', response.data)
+            seen.extend(item['id'] for item in response.data['results'])
+            url = response.data['next']
+            pages += 1
+        return seen, pages
+
+    def test_cursor_pagination_matches_page_order(self):
+        """Test that keyset pages visit every patient once, in default order"""
+        expected = list(Patient.objects.values_list('id', flat=True).order_by('first_name', 'last_name', 'id'))
+        seen, pages = self.walk(reverse('patient-list') + '?pagination=cursor')
+        self.assertEqual(seen, expected)
+        self.assertEqual(pages, 2)
+
+    def test_cursor_pagination_isi_scores(self):
+        """Test keyset pages over ISI scores ordered by -date, -id"""
+        expected = list(ISIScore.objects.values_list('id', flat=True).order_by('-date', '-id'))
+        seen, _ = self.walk(reverse('isi-score-list') + '?pagination=cursor')
+        self.assertEqual(seen, expected)
+
+    def test_cursor_previous_link(self):
+        """Test that the previous link returns to the first page"""
+        first = self.client.get(reverse('patient-list'), HTTP_X_PAGINATION='cursor')
+        second = self.client.get(first.data['next'])
+        back = self.client.get(second.data['previous'])
+        self.assertEqual(
+            [p['id'] for p in back.data['results']],
+            [p['id'] for p in first.data['results']]
+        )
+        self.assertIsNone(back.data['previous'])
+
+    def test_cursor_rejects_nullable_ordering(self):
+        """Test that orderings on nullable columns can't be used as keys"""
+        response = self.client.get(reverse('patient-list') + '?pagination=cursor&ordering=last_visit')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_estimated_count(self):
+        """Test that an estimated count is capped and flagged"""
+        from .pagination import EstimatedCountPaginator
+
+        response = self.client.get(reverse('patient-list') + '?count=estimated')
+        self.assertEqual(response.data['count'], 25)
+        self.assertFalse(response.data['count_estimated'])
+
+        EstimatedCountPaginator.count_limit, limit = 10, EstimatedCountPaginator.count_limit
+        try:
+            response = self.client.get(reverse('patient-list') + '?count=estimated')
+        finally:
+            EstimatedCountPaginator.count_limit = limit
+        self.assertEqual(response.data['count'], 10)
+        self.assertTrue(response.data['count_estimated'])
+
+    def test_estimated_count_pages_past_estimate(self):
+        """Test that pages beyond a capped count are still served and linked"""
+        from .pagination import EstimatedCountPaginator
+
+        EstimatedCountPaginator.count_limit, limit = 10, EstimatedCountPaginator.count_limit
+        self.addCleanup(setattr, EstimatedCountPaginator, 'count_limit', limit)
+
+        first = self.client.get(reverse('patient-list') + '?count=estimated')
+        self.assertEqual(len(first.data['results']), 20)
+        self.assertIsNotNone(first.data['next'])
+        second = self.client.get(first.data['next'])
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(second.data['results']), 5)
+        self.assertEqual(second.data['count'], 10)
+        self.assertIsNone(second.data['next'])
+        self.assertIsNotNone(second.data['previous'])
+        response = self.client.get(reverse('patient-list') + '?count=estimated&page=3')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+class PatientNestedWriteTest(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.custom_field = CustomField.objects.create(name="Allergies")
+        self.other_field = CustomField.objects.create(name="Medication")
+
+    def create_patient(self, weeks):
+        data = {
+            "first_name": "Bulk",
+            "last_name": "Patient",
+            "date_of_birth": "1990-01-01",
+            "addresses": [
+                {"address_line1": "1 Test St", "city": "Boston", "state": "MA", "postal_code": "02101"}
+            ],
+            "isi_scores": [
+                {"score": week % 28, "date": str(date(2022, 1, 3) + timedelta(weeks=week))}
+                for week in range(weeks)
+            ],
+            "custom_field_values": [
+                {"field_definition": self.custom_field.id, "value": "Peanuts"}
+            ],
+        }
+        return self.client.post(reverse('patient-list'), data, format='json')
+
+    def test_create_statement_count_is_constant(self):
+        """Test that creating a patient costs the same with 2 or 100 ISI scores"""
+        # custom field lookup, savepoint, patient, 3 bulk inserts, latest ISI
+        # update + refresh, release, then 3 reads to render the response
+        with self.assertNumQueries(12):
+            self.create_patient(2)
+        with self.assertNumQueries(12):
+            response = self.create_patient(100)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.data['isi_scores']), 100)
+
+    def test_update_diffs_nested_rows(self):
+        """Test that updates keep unchanged rows, edit changed ones and delete missing ones"""
+        patient = self.create_patient(100).data
+        scores = patient['isi_scores']
+        kept_ids = {score['id'] for score in scores[1:]}
+        payload = {
+            "first_name": "Bulk", "last_name": "Patient", "date_of_birth": "1990-01-01",
+            "isi_scores": [{**scores[1], "score": 1}] + scores[2:] + [{"id": None, "score": 4, "date": "2030-01-01"}],
+            "addresses": [{**patient['addresses'][0], "city": "Cambridge"}],
+            "custom_field_values": [
+                {"field_definition": self.custom_field.id, "value": "Shellfish"},
+                {"field_definition": self.other_field.id, "value": "None"},
+            ],
+        }
+
+        response = self.client.put(reverse('patient-detail', args=[patient['id']]), payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        ids = {score['id'] for score in response.data['isi_scores']}
+        self.assertTrue(kept_ids < ids)
+        self.assertNotIn(scores[0]['id'], ids)
+        self.assertEqual(ISIScore.objects.get(id=scores[1]['id']).score, 1)
+        self.assertEqual(response.data['latest_isi_score'], 4)
+        self.assertEqual(response.data['addresses'][0]['id'], patient['addresses'][0]['id'])
+        self.assertEqual(response.data['addresses'][0]['city'], "Cambridge")
+        values = dict(CustomFieldValue.objects.values_list('field_definition__name', 'value'))
+        self.assertEqual(values, {"Allergies": "Shellfish", "Medication": "None"})
+
+    def test_patch_merges_scores_by_id_and_date(self):
+        """Test that PATCH upserts the scores it names, matching id-less ones by date, and keeps the rest"""
+        patient = self.create_patient(100).data
+        scores = patient['isi_scores']
+        url = reverse('patient-detail', args=[patient['id']])
+        # patient, savepoint, patient update, matching scores, bulk update, bulk
+        # insert, latest ISI refresh + reload, release, then 3 reads to render
+        with self.assertNumQueries(12):
+            response = self.client.patch(url, {"isi_scores": [
+                {"score": 3, "date": scores[0]['date']},
+                {"score": 2, "date": "2030-01-01"},
+            ]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(ISIScore.objects.filter(patient=patient['id']).count(), 101)
+        self.assertEqual(ISIScore.objects.get(id=scores[0]['id']).score, 3)
+        self.assertEqual(Patient.objects.get(pk=patient['id']).latest_isi_score, 2)
+        self.assertEqual(Address.objects.filter(patient=patient['id']).count(), 1)
+
+    def test_dropping_nested_rows_touches_the_patient_once(self):
+        """Test that a PUT dropping 5 or 50 addresses and scores costs the same statements"""
+        counts = []
+        for rows in (5, 50):
+            patient = self.create_patient(rows).data
+            Address.objects.bulk_create(
+                Address(patient_id=patient['id'], address_line1=f"{i} Side St", city="Boston", state="MA", postal_code="02101")
+                for i in range(rows - 1)
+            )
+            payload = {"first_name": "Bulk", "last_name": "Patient", "date_of_birth": "1990-01-01",
+                       "addresses": [], "isi_scores": []}
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.put(reverse('patient-detail', args=[patient['id']]), payload, format='json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertFalse(Address.objects.filter(patient=patient['id']).exists())
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_patch_replaces_addresses_and_custom_values(self):
+        """Test that PATCH merges only ISI scores, and still replaces the address and custom value lists"""
+        patient = self.create_patient(3).data
+        url = reverse('patient-detail', args=[patient['id']])
+        response = self.client.patch(url, {
+            "addresses": [{"address_line1": "9 New St", "city": "Austin", "state": "TX", "postal_code": "73301"}],
+            "custom_field_values": [{"field_definition": self.other_field.id, "value": "None"}],
+            "isi_scores": [{"score": 7, "date": "2030-01-01"}],
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(Address.objects.filter(patient=patient['id']).values_list('city', flat=True)), ["Austin"])
+        values = dict(CustomFieldValue.objects.values_list('field_definition__name', 'value'))
+        self.assertEqual(values, {"Medication": "None"})
+        self.assertEqual(ISIScore.objects.filter(patient=patient['id']).count(), 4)
+
+    def test_append_isi_score(self):
+        """Test that the nested append endpoint costs the same statements however long the history is"""
+        for weeks in (2, 100):
+            patient = self.create_patient(weeks).data
+            url = reverse('patient-record-isi-score', args=[patient['id']])
+            # patient, savepoint, insert, touch, latest ISI refresh, release
+            with self.assertNumQueries(6):
+                response = self.client.post(url, {"score": 5, "date": "2030-01-01"}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            self.assertEqual(set(response.data), {"id", "score", "date"})
+            self.assertEqual(ISIScore.objects.filter(patient=patient['id']).count(), weeks + 1)
+            self.assertEqual(Patient.objects.get(pk=patient['id']).latest_isi_score, 5)
+
+        response = self.client.post(url, {"score": 5, "date": "not a date"}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(reverse('patient-record-isi-score', args=[0]), {"score": 5, "date": "2030-01-02"}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+class PatientBulkImportTest(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.custom_field = CustomField.objects.create(name="Allergies")
+
+    def test_ndjson_import_reports_row_errors(self):
+        """Test that invalid NDJSON rows are reported without aborting the import"""
+        rows = [
+            {"first_name": "Ann", "last_name": "One", "date_of_birth": "1990-01-01",
+             "isi_scores": [{"score": 12, "date": "2024-01-01"}, {"score": 9, "date": "2024-02-01"}],
+             "custom_field_values": [{"field_definition": self.custom_field.id, "value": "Dust"}]},
+            {"first_name": "No", "last_name": "Birthday"},
+            {"first_name": "Bob", "last_name": "Two", "date_of_birth": "1985-05-05",
+             "addresses": [{"address_line1": "1 Main St", "city": "Austin", "state": "TX", "postal_code": "73301"}]},
+        ]
+        body = "\n".join(json.dumps(row) for row in rows) + "\n{not json\n"
+        response = self.client.post(
+            reverse('patient-bulk'), body, content_type='application/x-ndjson'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(response.data['failed'], 2)
+        self.assertEqual([error['row'] for error in response.data['errors']], [2, 4])
+        self.assertIn('date_of_birth', response.data['errors'][0]['errors'])
+
+        ann = Patient.objects.get(first_name="Ann")
+        self.assertEqual(ann.latest_isi_score, 9)
+        self.assertEqual(ann.custom_field_values.get().value, "Dust")
+        self.assertEqual(Address.objects.get().city, "Austin")
+
+    def test_csv_import(self):
+        """Test importing patients from CSV with ISI scores and custom field columns"""
+        body = (
+            "first_name,last_name,date_of_birth,status,city,state,address_line1,postal_code,isi_scores,custom:Allergies\n"
+            "Cara,Three,1970-03-03,active,Denver,CO,5 Elm St,80201,2024-01-01:20;2024-03-01:14,Pollen\n"
+            "Dan,Four,not-a-date,active,,,,,,\n"
+        )
+        response = self.client.post(reverse('patient-bulk'), body, content_type='text/csv')
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual(response.data['errors'][0]['row'], 3)
+
+        cara = Patient.objects.get()
+        self.assertEqual(cara.latest_isi_score, 14)
+        self.assertEqual(cara.addresses.get().city, "Denver")
+        self.assertEqual(cara.custom_field_values.get().value, "Pollen")
+
+    def test_invalid_utf8_only_fails_its_row(self):
+        """Test that a line that is not valid UTF-8 is reported as a row error, in either format"""
+        bodies = {
+            'application/x-ndjson': (
+                b'{"first_name": "Ann", "last_name": "One", "date_of_birth": "1980-01-01"}\n'
+                b'{"first_name": "Bad \xff", "last_name": "Bytes", "date_of_birth": "1980-01-01"}\n'
+                b'{"first_name": "Bob", "last_name": "Two", "date_of_birth": "1985-05-05"}\n'
+            ),
+            'text/csv': (
+                b'first_name,last_name,date_of_birth\n'
+                b'Cara,Three,1970-03-03\n'
+                b'Bad \xc3\x28,Bytes,1970-03-03\n'
+                b'Dan,Four,1971-04-04\n'
+            ),
+        }
+        for content_type, body in bodies.items():
+            response = self.client.post(reverse('patient-bulk'), body, content_type=content_type)
+            self.assertEqual(response.status_code, status.HTTP_200_OK, content_type)
+            self.assertEqual((response.data['created'], response.data['failed']), (2, 1), content_type)
+            error = response.data['errors'][0]
+            self.assertEqual(error['row'], 2 if content_type == 'application/x-ndjson' else 3)
+            self.assertIn('not valid UTF-8', error['errors']['non_field_errors'][0])
+        self.assertFalse(Patient.objects.filter(last_name="Bytes").exists())
+
+    def test_unsupported_content_type(self):
+        """Test that only NDJSON and CSV bodies are accepted"""
+        response = self.client.post(reverse('patient-bulk'), [], format='json')
+        self.assertEqual(response.status_code, status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+
+    def test_integrity_error_only_fails_its_row(self):
+        """Test that a row violating a constraint doesn't roll back the rest of its chunk"""
+        duplicate = [{"field_definition": self.custom_field.id, "value": v} for v in ("A", "B")]
+        rows = [
+            {"first_name": "Good", "last_name": "Row", "date_of_birth": "1990-01-01"},
+            {"first_name": "Bad", "last_name": "Row", "date_of_birth": "1990-01-01",
+             "custom_field_values": duplicate},
+        ]
+        body = "\n".join(json.dumps(row) for row in rows)
+        response = self.client.post(reverse('patient-bulk'), body, content_type='application/x-ndjson')
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual(response.data['errors'][0]['row'], 2)
+        self.assertEqual(list(Patient.objects.values_list('first_name', flat=True)), ["Good"])
+
+class PatientExportTest(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.custom_field = CustomField.objects.create(name="Allergies")
+        for i, (city, status_value) in enumerate([("Boston", "active"), ("Austin", "active"), ("Boston", "churned")]):
+            patient = Patient.objects.create(
+                first_name=f"Export{i}", last_name="Patient",
+                date_of_birth=date(1990, 1, 1), status=status_value
+            )
+            Address.objects.create(
+                patient=patient, address_line1=f"{i} Main St",
+                city=city, state="MA", postal_code="02101"
+            )
+            ISIScore.objects.create(patient=patient, score=10 + i, date=date(2024, 1, 1))
+            CustomFieldValue.objects.create(patient=patient, field_definition=self.custom_field, value="Dust")
+
+    def read(self, response):
+        return b"".join(response.streaming_content).decode()
+
+    def test_ndjson_export_respects_filters_and_ordering(self):
+        """Test that the export applies the same filters and ordering as the list"""
+        response = self.client.get(reverse('patient-export') + '?format=ndjson&status=active&ordering=-first_name')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson; charset=utf-8')
+        rows = [json.loads(line) for line in self.read(response).splitlines()]
+        self.assertEqual([row['first_name'] for row in rows], ["Export1", "Export0"])
+        self.assertEqual(rows[0]['isi_scores'][0]['score'], 11)
+
+    def test_csv_export_round_trips_through_import(self):
+        """Test that exported CSV can be imported back"""
+        response = self.client.get(reverse('patient-export') + '?format=csv&city=boston')
+        body = self.read(response)
+        lines = body.splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertIn("custom:Allergies", lines[0])
+
+        response = self.client.post(reverse('patient-bulk'), body, content_type='text/csv')
+        self.assertEqual(response.data, {'created': 2, 'failed': 0, 'errors': []})
+        self.assertEqual(Patient.objects.filter(addresses__city="Boston").count(), 4)
+
+    def test_export_query_count_is_constant(self):
+        """Test that exporting runs one query per relation rather than per patient"""
+        response = self.client.get(reverse('patient-export') + '?format=ndjson')
+        with self.assertNumQueries(4):
+            self.read(response)
+
+class PatientSearchTest(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        for first, last in [("Jonathan", "Smith"), ("Anna", "Smithers"), ("Bob", "Jones")]:
+            Patient.objects.create(first_name=first, last_name=last, date_of_birth=date(1990, 1, 1))
+
+    def search(self, term):
+        response = self.client.get(reverse('patient-list'), {'search': term})
+        return sorted(p['first_name'] for p in response.data['results'])
+
+    def test_substring_and_prefix_search(self):
+        """Test trigram substring matches, short prefix terms and multi-term search"""
+        self.assertEqual(self.search("mith"), ["Anna", "Jonathan"])
+        self.assertEqual(self.search("NATH"), ["Jonathan"])
+        self.assertEqual(self.search("jo"), ["Bob", "Jonathan"])
+        self.assertEqual(self.search("smith an"), ["Anna"])
+
+    def test_search_index_follows_writes(self):
+        """Test that renames, bulk inserts and deletes are reflected in search"""
+        patient = Patient.objects.get(first_name="Bob")
+        patient.last_name = "Robertson"
+        patient.save()
+        Patient.objects.bulk_create([
+            Patient(first_name="Bulk", last_name="Roberts", date_of_birth=date(1990, 1, 1))
+        ])
+        self.assertEqual(self.search("robert"), ["Bob", "Bulk"])
+        self.assertEqual(self.search("jones"), [])
+
+        patient.delete()
+        self.assertEqual(self.search("robert"), ["Bulk"])
+
+    def test_falls_back_without_search_index(self):
+        """Test that search still works through LIKE scans when there is no FTS index"""
+        from . import search
+
+        search._available['default'], available = False, search._available.get('default')
+        try:
+            self.assertEqual(self.search("mith"), ["Anna", "Jonathan"])
+        finally:
+            search._available.pop('default')
+            if available is not None:
+                search._available['default'] = available
+
+class PatientAddressLookupTest(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        for first, city, state in [("Ann", " San Jose ", "CA"), ("Ben", "SAN DIEGO", "ca"), ("Cy", "Jose Town", "TX")]:
+            patient = Patient.objects.create(first_name=first, last_name="Lookup", date_of_birth=date(1990, 1, 1))
+            Address.objects.create(
+                patient=patient, address_line1="1 Main St",
+                city=city, state=state, postal_code="00000"
+            )
+
+    def names(self, query):
+        response = self.client.get(reverse('patient-list') + query)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return sorted(p['first_name'] for p in response.data['results'])
+
+    def test_lookup_keys_are_normalized(self):
+        """Test that city/state keys are trimmed and case-folded by the database"""
+        address = Address.objects.get(patient__first_name="Ann")
+        self.assertEqual((address.city_key, address.state_key), ("san jose", "ca"))
+        Address.objects.filter(pk=address.pk).update(city="BOSTON")
+        address.refresh_from_db()
+        self.assertEqual(address.city_key, "boston")
+
+    def test_filter_modes(self):
+        """Test contains, prefix and exact city/state filters"""
+        self.assertEqual(self.names('?city=jose'), ["Ann", "Cy"])
+        self.assertEqual(self.names('?city_prefix=san'), ["Ann", "Ben"])
+        self.assertEqual(self.names('?city_prefix=San%20J'), ["Ann"])
+        self.assertEqual(self.names('?city_exact=san%20diego'), ["Ben"])
+        self.assertEqual(self.names('?state_exact=CA&city_prefix=san%20d'), ["Ben"])
+        self.assertEqual(self.names('?state_exact=c'), [])
+        # U+10FFFF has no next code point to bound a key range with
+        self.assertEqual(self.names('?city_prefix=san%F4%8F%BF%BF'), [])
+
+
+class PatientListRepresentationTest(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.patient = Patient.objects.create(
+            first_name="Compact", last_name="Row", date_of_birth=date(1990, 1, 1)
+        )
+        for city in ["Boston", "Denver"]:
+            Address.objects.create(
+                patient=self.patient, address_line1="1 Main St",
+                city=city, state="MA", postal_code="02101"
+            )
+        ISIScore.objects.create(patient=self.patient, score=18, date=date(2024, 1, 1))
+        self.patient.refresh_latest_isi()
+
+    def test_list_is_compact(self):
+        """Test that list rows carry summary columns instead of nested relations"""
+        row = self.client.get(reverse('patient-list')).data['results'][0]
+        self.assertNotIn('isi_scores', row)
+        self.assertNotIn('addresses', row)
+        self.assertEqual(row['primary_city'], "Boston")
+        self.assertEqual(row['primary_state'], "MA")
+        self.assertEqual(row['latest_isi_score'], 18)
+
+    def test_sparse_fields_and_expand(self):
+        """Test that ?fields= trims and ?expand= adds nested relations"""
+        response = self.client.get(reverse('patient-list') + '?fields=id,last_name&expand=isi_scores')
+        row = response.data['results'][0]
+        self.assertEqual(set(row), {'id', 'last_name', 'isi_scores'})
+        self.assertEqual(row['isi_scores'][0]['score'], 18)
+
+    def test_detail_stays_nested(self):
+        """Test that retrieve keeps the full representation and honours ?fields="""
+        response = self.client.get(reverse('patient-detail', args=[self.patient.id]))
+        self.assertEqual(len(response.data['addresses']), 2)
+        response = self.client.get(reverse('patient-detail', args=[self.patient.id]) + '?fields=id,addresses')
+        self.assertEqual(set(response.data), {'id', 'addresses'})
+
+
+@override_settings(RESPONSE_CACHE_ENABLED=True)
+class ResponseCacheTest(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        caches['responses'].clear()
+        self.patient = Patient.objects.create(
+            first_name="Cached", last_name="Patient", date_of_birth=date(1990, 1, 1)
+        )
+
+    def get(self, url, **headers):
+        response = self.client.get(url, **headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response
+
+    def test_repeated_list_is_served_from_cache(self):
+        """Test that identical requests hit, and param order doesn't matter"""
+        self.assertEqual(self.get(reverse('patient-list') + '?status=inquiry&ordering=last_name')['X-Cache'], 'MISS')
+        self.assertEqual(self.get(reverse('patient-list') + '?ordering=last_name&status=inquiry')['X-Cache'], 'HIT')
+        self.assertEqual(self.get(reverse('patient-list'), HTTP_X_PAGINATION='cursor')['X-Cache'], 'MISS')
+
+    def test_writes_invalidate_cached_responses(self):
+        """Test that API writes, nested writes and bulk imports invalidate the cache"""
+        detail = reverse('patient-detail', args=[self.patient.id])
+        self.get(detail)
+        self.client.patch(detail, {"isi_scores": [{"score": 9, "date": "2024-01-01"}]}, format='json')
+        response = self.get(detail)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['latest_isi_score'], 9)
+
+        self.get(reverse('isi-score-list'))
+        ISIScore.objects.create(patient=self.patient, score=3, date=date(2024, 2, 1))
+        response = self.get(reverse('isi-score-list'))
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['results'][0]['score'], 3)
+
+        self.get(reverse('patient-list'))
+        self.client.post(
+            reverse('patient-bulk'),
+            json.dumps({"first_name": "Bulk", "last_name": "Row", "date_of_birth": "1990-01-01"}),
+            content_type='application/x-ndjson'
+        )
+        self.assertEqual(self.get(reverse('patient-list')).data['count'], 2)
+
+    def test_custom_field_cache_and_stats(self):
+        """Test custom field list invalidation and the admin-only hit-rate counters"""
+        self.get(reverse('custom-field-list'))
+        self.assertEqual(self.get(reverse('custom-field-list'))['X-Cache'], 'HIT')
+        CustomField.objects.create(name="Allergies")
+        self.assertEqual(len(self.get(reverse('custom-field-list')).data), 1)
+
+        self.assertEqual(self.client.get(reverse('cache-stats')).status_code, status.HTTP_403_FORBIDDEN)
+        self.client.force_authenticate(User.objects.create_superuser("admin", "admin@example.com", "pw"))
+        stats = self.get(reverse('cache-stats')).data['CustomFieldViewSet']
+        self.assertEqual((stats['hits'], stats['misses']), (1, 2))
+
+
+class ConditionalGetTest(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.patient = Patient.objects.create(
+            first_name="Etag", last_name="Patient", date_of_birth=date(1990, 1, 1)
+        )
+        self.detail = reverse('patient-detail', args=[self.patient.id])
+
+    def test_unchanged_detail_returns_not_modified(self):
+        """Test that a detail GET with a current ETag or Last-Modified gets a 304"""
+        response = self.client.get(self.detail)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('no-cache', response['Cache-Control'])
+
+        response = self.client.get(self.detail, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b'')
+
+        last_modified = self.client.get(self.detail)['Last-Modified']
+        response = self.client.get(self.detail, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_child_writes_change_the_patient_etag(self):
+        """Test that address, ISI score and custom field value writes invalidate the parent's ETag"""
+        field = CustomField.objects.create(name="Allergies")
+        writes = [
+            lambda: Address.objects.create(
+                patient=self.patient, address_line1="1 Main", city="Boston", state="MA", postal_code="02101"
+            ),
+            lambda: ISIScore.objects.create(patient=self.patient, score=12, date=date(2024, 1, 1)),
+            lambda: CustomFieldValue.objects.create(patient=self.patient, field_definition=field, value="None"),
+            lambda: self.patient.isi_scores.get().delete(),
+            lambda: field.delete(),
+        ]
+        for write in writes:
+            etag = self.client.get(self.detail)['ETag']
+            write()
+            response = self.client.get(self.detail, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotEqual(response['ETag'], etag)
+
+    def test_list_etag_tracks_filtered_rows(self):
+        """Test that list ETags depend on the query and change when rows are added or removed"""
+        url = reverse('patient-list') + '?status=inquiry'
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertNotEqual(self.client.get(url + '&ordering=last_name')['ETag'], etag)
+
+        other = Patient.objects.create(first_name="Other", last_name="Patient", date_of_birth=date(1990, 1, 1))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+        etag = self.client.get(url)['ETag']
+        other.delete()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+
+    @override_settings(RESPONSE_CACHE_ENABLED=True)
+    def test_renaming_a_custom_field_invalidates_cached_lists(self):
+        """Test that a renamed custom field no longer filters from the cache and changes the list ETag"""
+        caches['responses'].clear()
+        field = CustomField.objects.create(name="Allergies")
+        url = reverse('patient-list') + '?cf_Allergies=Dust'
+        self.client.get(url)
+        self.assertEqual(self.client.get(url)['X-Cache'], 'HIT')
+
+        field.name = "Allergy"
+        field.save()
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_400_BAD_REQUEST)
+        list_etag = self.client.get(reverse('patient-list'))['ETag']
+        CustomField.objects.create(name="Medication")
+        self.assertNotEqual(self.client.get(reverse('patient-list'))['ETag'], list_etag)
+
+    def test_estimated_and_cursor_lists_skip_validators(self):
+        """Test that lists without an exact count do not scan the filtered rows for validators"""
+        # The capped count and the page; the cursor page alone, fetching one row extra
+        for url, queries in [('?count=estimated', 2), ('?pagination=cursor', 1)]:
+            with self.assertNumQueries(queries):
+                response = self.client.get(reverse('patient-list') + url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn('ETag', response)
+
+    @override_settings(RESPONSE_CACHE_ENABLED=True)
+    def test_cached_list_etag_comes_from_generations(self):
+        """Test that list validators need no query while the response cache is in use"""
+        caches['responses'].clear()
+        url = reverse('patient-list')
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_304_NOT_MODIFIED)
+            response = self.client.get(url)
+        self.assertEqual((response['X-Cache'], response['ETag']), ('HIT', etag))
+
+        ISIScore.objects.create(patient=self.patient, score=12, date=date(2024, 1, 1))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+@patch.object(PatientChangeFeed, 'settle_window', timedelta(0))
+class PatientChangeFeedTest(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.first = Patient.objects.create(first_name="First", last_name="Synced", date_of_birth=date(1990, 1, 1))
+        self.second = Patient.objects.create(first_name="Second", last_name="Synced", date_of_birth=date(1990, 1, 1))
+
+    def poll(self, **params):
+        response = self.client.get(reverse('patient-changes'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_feed_reports_updates_child_writes_and_deletes(self):
+        """Test that a poll returns only what changed after the token, including deletes"""
+        initial = self.poll()
+        self.assertEqual([row['id'] for row in initial['changed']], [self.first.id, self.second.id])
+        self.assertEqual(self.poll(since=initial['next'])['changed'], [])
+
+        ISIScore.objects.create(patient=self.second, score=14, date=date(2024, 1, 1))
+        changes = self.poll(since=initial['next'])
+        self.assertEqual([row['id'] for row in changes['changed']], [self.second.id])
+
+        deleted_id = self.first.id
+        self.first.delete()
+        changes = self.poll(since=changes['next'])
+        self.assertEqual((changes['changed'], changes['deleted']), ([], [deleted_id]))
+
+    def test_feed_pages_with_limit(self):
+        """Test that a limited poll sets has_more and the next token continues where it stopped"""
+        deleted_id = self.second.id
+        self.second.delete()
+        page = self.poll(limit=1)
+        self.assertTrue(page['has_more'])
+        self.assertEqual([row['id'] for row in page['changed']], [self.first.id])
+        page = self.poll(limit=1, since=page['next'])
+        self.assertEqual((page['changed'], page['deleted'], page['has_more']), ([], [deleted_id], False))
+
+    def test_invalid_token_is_rejected(self):
+        """Test that a malformed token is a 400, not a full resync"""
+        response = self.client.get(reverse('patient-changes'), {'since': 'not-a-token'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ISIScoreSeriesTest(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.first = Patient.objects.create(first_name="First", last_name="Series", date_of_birth=date(1990, 1, 1))
+        self.second = Patient.objects.create(first_name="Second", last_name="Series", date_of_birth=date(1990, 1, 1))
+        # 2024-01-01 is a Monday and 2024-01-07 the Sunday of the same week
+        for patient, score, day in [
+            (self.first, 20, date(2024, 1, 1)),
+            (self.first, 10, date(2024, 1, 7)),
+            (self.first, 8, date(2024, 2, 15)),
+            (self.second, 14, date(2024, 1, 8)),
+        ]:
+            ISIScore.objects.create(patient=patient, score=score, date=day)
+
+    def get_series(self, **params):
+        response = self.client.get(reverse('isi-score-series'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data['series']
+
+    def test_cohort_series_by_month(self):
+        """Test that the cohort series aggregates every patient per month"""
+        [series] = self.get_series()
+        self.assertIsNone(series['patient'])
+        self.assertEqual(series['points'], [
+            {'date': date(2024, 1, 1), 'mean': 14.67, 'min': 10, 'max': 20, 'count': 3},
+            {'date': date(2024, 2, 1), 'mean': 8.0, 'min': 8, 'max': 8, 'count': 1},
+        ])
+
+    def test_patient_series_by_week(self):
+        """Test that weekly buckets start on Monday and series are split per patient"""
+        first, second = self.get_series(patient=f'{self.first.id},{self.second.id}', bucket='week')
+        self.assertEqual(first['patient'], self.first.id)
+        self.assertEqual([(p['date'], p['count']) for p in first['points']], [
+            (date(2024, 1, 1), 2), (date(2024, 2, 12), 1),
+        ])
+        self.assertEqual([p['date'] for p in second['points']], [date(2024, 1, 8)])
+
+    def test_invalid_params_are_rejected(self):
+        """Test that unknown buckets and grouping by patient without patients are 400s"""
+        for params in [{'bucket': 'year'}, {'group': 'patient'}, {'points': 1}, {'patient': 'a,b'}]:
+            response = self.client.get(reverse('isi-score-series'), params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class LTTBTest(TestCase):
+    def test_keeps_endpoints_and_extremes(self):
+        """Test that downsampling keeps the first and last points and the spike between them"""
+        points = [(x, 100 if x == 37 else 0) for x in range(100)]
+        sampled = lttb(points, 5, x=lambda p: p[0], y=lambda p: p[1])
+        self.assertEqual(len(sampled), 5)
+        self.assertEqual((sampled[0], sampled[-1]), (points[0], points[-1]))
+        self.assertIn((37, 100), sampled)
+        self.assertEqual(lttb(points[:4], 5, x=lambda p: p[0], y=lambda p: p[1]), points[:4])
+
+
+class ClinicStatsTest(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def create_patient(self, state, score=None, **fields):
+        data = {
+            "first_name": "Stat", "last_name": state, "date_of_birth": "1990-01-01",
+            "addresses": [{"address_line1": "1 Main", "city": "Town", "state": state, "postal_code": "00001"}],
+            "isi_scores": [{"score": score, "date": "2024-01-01"}] if score is not None else [],
+            **fields,
+        }
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('patient-list'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return response.data['id']
+
+    def summary(self):
+        return self.client.get(reverse('clinic-stats')).data
+
+    def test_stats_follow_writes(self):
+        """Test that counters move with patient, address and ISI score writes"""
+        first = self.create_patient("MA", 10, status="active", last_visit="2024-03-05")
+        self.create_patient("ma", 20, ready_to_discharge=True)
+        summary = self.summary()
+        self.assertEqual(summary['patients'], 2)
+        self.assertEqual(summary['by_status'], {'active': 1, 'inquiry': 1})
+        self.assertEqual(summary['ready_to_discharge'], 1)
+        self.assertEqual(summary['isi_by_state'], [{'state': 'ma', 'patients': 2, 'average_latest_isi': 15.0}])
+        self.assertEqual(summary['visits_by_month'], [{'month': '2024-03', 'visits': 1}])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ISIScore.objects.create(patient_id=first, score=4, date=date(2024, 2, 1))
+            Patient.objects.get(pk=first).refresh_latest_isi()
+        with self.captureOnCommitCallbacks(execute=True):
+            Address.objects.filter(patient=first).update(state="NY")
+            Address.objects.get(patient=first).save()
+        summary = self.summary()
+        self.assertEqual(summary['isi_by_state'], [
+            {'state': 'ma', 'patients': 1, 'average_latest_isi': 20.0},
+            {'state': 'ny', 'patients': 1, 'average_latest_isi': 4.0},
+        ])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Patient.objects.get(pk=first).delete()
+        summary = self.summary()
+        self.assertEqual((summary['patients'], summary['by_status']), (1, {'inquiry': 1}))
+        self.assertEqual(summary['visits_by_month'], [])
+
+    def test_rebuild_matches_incremental_counters(self):
+        """Test that rebuild_stats recomputes the same summary, and reads cost one query"""
+        self.create_patient("CA", 7, status="churned", last_visit="2024-01-31")
+        self.create_patient("TX")
+        incremental = self.summary()
+        call_command('rebuild_stats', stdout=StringIO())
+        with self.assertNumQueries(1):
+            self.assertEqual(self.summary(), incremental)
+
+
+class DischargeScoringTest(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def create_patient(self, name, scores):
+        patient = Patient.objects.create(first_name=name, last_name="Scored", date_of_birth=date(1990, 1, 1))
+        ISIScore.objects.bulk_create([
+            ISIScore(patient=patient, score=score, date=date(2024, 1, 1) + timedelta(weeks=week))
+            for week, score in enumerate(scores)
+        ])
+        return patient
+
+    def test_scoring_uses_trend_and_recent_scores(self):
+        """Test slope in points per week and the suggested discharge rules"""
+        improved = self.create_patient("Improved", [20, 12, 6, 4])
+        relapsed = self.create_patient("Relapsed", [20, 6, 9, 5])
+        flat = self.create_patient("Flat", [5, 5])
+        single = self.create_patient("Single", [3])
+        Patient.objects.refresh_latest_isi()
+
+        improved.refresh_from_db()
+        self.assertAlmostEqual(improved.isi_trend_slope, -5.4)
+        self.assertTrue(improved.suggested_discharge)
+        # Falling overall, but the score before the last one is over the threshold
+        self.assertFalse(Patient.objects.get(pk=relapsed.pk).suggested_discharge)
+        self.assertEqual(Patient.objects.get(pk=flat.pk).isi_trend_slope, 0)
+        self.assertFalse(Patient.objects.get(pk=flat.pk).suggested_discharge)
+        self.assertIsNone(Patient.objects.get(pk=single.pk).isi_trend_slope)
+
+    def test_rescoring_bumps_updated_at_of_changed_rows_only(self):
+        """Test that score_discharge gives rows whose scores change a new updated_at, and leaves the rest"""
+        improved = self.create_patient("Improved", [20, 12, 6, 4])
+        single = self.create_patient("Single", [3])
+        before = dict(Patient.objects.values_list('pk', 'updated_at'))
+
+        self.assertEqual(Patient.objects.all().score_discharge_readiness(), 1)
+        after = dict(Patient.objects.values_list('pk', 'updated_at'))
+        self.assertGreater(after[improved.pk], before[improved.pk])
+        self.assertEqual(after[single.pk], before[single.pk])
+        self.assertEqual(Patient.objects.all().score_discharge_readiness(), 0)
+
+    def test_filter_sort_and_rescore_on_write(self):
+        """Test that the list filters and sorts on the scores and that nested writes rescore"""
+        improved = self.create_patient("Improved", [20, 12, 6, 4])
+        steep = self.create_patient("Steep", [28, 4, 2])
+        self.create_patient("Worse", [4, 12])
+        call_command('score_discharge', stdout=StringIO())
+
+        response = self.client.get(reverse('patient-list'), {'suggested_discharge': 'true', 'ordering': 'isi_trend_slope'})
+        self.assertEqual([row['id'] for row in response.data['results']], [steep.id, improved.id])
+
+        response = self.client.patch(
+            reverse('patient-detail', args=[improved.id]),
+            {"isi_scores": [{"score": 20, "date": "2024-01-01"}, {"score": 10, "date": "2024-02-01"}]},
+            format='json',
+        )
+        self.assertFalse(response.data['suggested_discharge'])
+
+
+class CustomFieldFilterTest(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.weight = CustomField.objects.create(name="weight")
+        self.diet = CustomField.objects.create(name="diet")
+        self.patients = {}
+        for name, weight, diet in [("Light", "61.5", "Vegan"), ("Heavy", "95", "vegan "), ("Mid", "80", "Omnivore"), ("None", None, "")]:
+            patient = Patient.objects.create(first_name=name, last_name="Custom", date_of_birth=date(1990, 1, 1))
+            if weight is not None:
+                CustomFieldValue.objects.create(patient=patient, field_definition=self.weight, value=weight)
+            CustomFieldValue.objects.create(patient=patient, field_definition=self.diet, value=diet)
+            self.patients[name] = patient
+
+    def names(self, **params):
+        response = self.client.get(reverse('patient-list'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        return [row['first_name'] for row in response.data['results']]
+
+    def test_typed_columns(self):
+        """Test that numeric-looking values get a number and every value a case-folded key"""
+        value = CustomFieldValue.objects.get(patient=self.patients["Heavy"], field_definition=self.diet)
+        self.assertEqual((value.value_key, value.number_value), ("vegan", None))
+        value = CustomFieldValue.objects.get(patient=self.patients["Light"], field_definition=self.weight)
+        self.assertEqual(value.number_value, 61.5)
+
+    def test_only_whole_numbers_are_numeric(self):
+        """Test that hyphenated, date-like and malformed values get no number instead of their leading digits"""
+        patient = self.patients["None"]
+        expected = {
+            "555-1234": None, "2024-01-05": None, "1e": None, "1.2.3": None, "12 kg": None, "-": None,
+            " 42 ": 42.0, "-.5": -0.5, "+1e3": 1000.0, "5.": 5.0, "2.5E-1": 0.25,
+        }
+        for text, number in expected.items():
+            with self.subTest(value=text):
+                field = CustomField.objects.create(name=f"field {text}")
+                value = CustomFieldValue.objects.create(patient=patient, field_definition=field, value=text)
+                value.refresh_from_db()
+                self.assertEqual(value.number_value, number)
+
+        phone = CustomField.objects.create(name="phone")
+        CustomFieldValue.objects.create(patient=patient, field_definition=phone, value="555-1234")
+        self.assertEqual(self.names(cf_phone="555"), [])
+        self.assertEqual(self.names(cf_phone="555-1234"), ["None"])
+        self.assertEqual(self.names(cf_phone__gte="100"), [])
+
+    def test_number_value_needs_only_sqlite_builtins(self):
+        """Test that clients other than Django (no REGEXP function) can write rows and get the same numbers"""
+        table = CustomFieldValue._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = %s", [table])
+            create_table = cursor.fetchone()[0]
+        expected = {
+            "555-1234": None, "2024-01-05": None, "1e": None, "1.2.3": None, "12 kg": None, "-": None,
+            "e5": None, "1e5.0": None, "1E+-5": None, "--1": None, "1-": None, ".": None, "": None, "12f": None,
+            " 42 ": 42.0, "-.5": -0.5, "+1e3": 1000.0, "5.": 5.0, "2.5E-1": 0.25, "7": 7.0,
+        }
+        plain = sqlite3.connect(':memory:')
+        try:
+            plain.execute(create_table)
+            for field_id, text in enumerate(expected, start=1):
+                plain.execute(
+                    f'INSERT INTO {table} (patient_id, field_definition_id, value) VALUES (1, ?, ?)', [field_id, text]
+                )
+            rows = plain.execute(f'SELECT value, number_value FROM {table} ORDER BY field_definition_id')
+            self.assertEqual(dict(rows), expected)
+        finally:
+            plain.close()
+
+    def test_filters_combine(self):
+        """Test equality, numeric range, substring and missing-value filters and their combination"""
+        self.assertEqual(self.names(cf_diet="VEGAN", ordering="first_name"), ["Heavy", "Light"])
+        self.assertEqual(self.names(cf_weight__gte="80", ordering="first_name"), ["Heavy", "Mid"])
+        self.assertEqual(self.names(cf_weight__lt="100", cf_diet="vegan", ordering="first_name"), ["Heavy", "Light"])
+        self.assertEqual(self.names(cf_diet__contains="vor"), ["Mid"])
+        self.assertEqual(self.names(cf_weight__isnull="true"), ["None"])
+        self.assertEqual(self.names(cf_diet__isnull="true"), ["None"])
+
+    def test_ordering_by_custom_field(self):
+        """Test that custom fields sort numerically with missing values last"""
+        self.assertEqual(self.names(ordering="cf_weight"), ["Light", "Mid", "Heavy", "None"])
+        self.assertEqual(self.names(ordering="-cf_weight"), ["Heavy", "Mid", "Light", "None"])
+        self.assertEqual(self.names(ordering="cf_diet,-first_name"), ["Mid", "Light", "Heavy", "None"])
+
+    def test_unknown_custom_field_is_rejected(self):
+        """Test that filtering or sorting on an unknown custom field is a 400"""
+        for params in [{'cf_height': '1'}, {'ordering': 'cf_height'}]:
+            response = self.client.get(reverse('patient-list'), params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class CustomFieldValueBulkUpsertTest(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.allergies = CustomField.objects.create(name="Allergies")
+        self.diet = CustomField.objects.create(name="Diet")
+        self.first = Patient.objects.create(first_name="First", last_name="Upsert", date_of_birth=date(1990, 1, 1))
+        self.second = Patient.objects.create(first_name="Second", last_name="Upsert", date_of_birth=date(1990, 1, 1))
+        CustomFieldValue.objects.create(patient=self.first, field_definition=self.allergies, value="None")
+
+    def upsert(self, values):
+        return self.client.post(reverse('custom-field-value-bulk-upsert'), {"values": values}, format='json')
+
+    def test_upsert_inserts_and_updates_in_one_batch(self):
+        """Test that existing pairs are updated, new ones inserted, with a constant statement count"""
+        values = [
+            {"patient": self.first.id, "field_definition": self.allergies.id, "value": "Peanuts"},
+            {"patient": self.first.id, "field_definition": self.diet.id, "value": "Vegan"},
+            {"patient": self.second.id, "field_definition": self.diet.id, "value": "Keto"},
+        ]
+        updated_at = Patient.objects.get(pk=self.first.id).updated_at
+        # patients + fields lookups, savepoint, upsert, touch, release
+        with self.assertNumQueries(6):
+            response = self.upsert(values)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {"upserted": 3, "patients": 2})
+        self.assertEqual(
+            sorted(CustomFieldValue.objects.values_list('patient', 'field_definition', 'value')),
+            sorted((v["patient"], v["field_definition"], v["value"]) for v in values),
+        )
+        self.assertGreater(Patient.objects.get(pk=self.first.id).updated_at, updated_at)
+
+    def test_invalid_rows_are_reported_by_index(self):
+        """Test that unknown ids and missing values are rejected without writing anything"""
+        response = self.upsert([
+            {"patient": self.first.id, "field_definition": self.diet.id, "value": "Vegan"},
+            {"patient": 999, "field_definition": self.diet.id, "value": "Keto"},
+            {"patient": self.second.id, "field_definition": self.diet.id},
+        ])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(set(response.data['values']), {2})
+        response = self.upsert([{"patient": 999, "field_definition": self.diet.id, "value": "Keto"}])
+        self.assertIn('patient', response.data['values'][0])
+        self.assertEqual(CustomFieldValue.objects.count(), 1)
+
+
+class PatientBulkUpdateTest(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.onboarding = [
+            Patient.objects.create(first_name=f"Cohort{i}", last_name="Bulk", date_of_birth=date(1990, 1, 1), status="onboarding")
+            for i in range(3)
+        ]
+        self.active = Patient.objects.create(first_name="Already", last_name="Bulk", date_of_birth=date(1990, 1, 1), status="active")
+        self.other = Patient.objects.create(first_name="Other", last_name="Bulk", date_of_birth=date(1990, 1, 1), status="inquiry")
+        self.address = Address.objects.create(patient=self.onboarding[0], address_line1="1 Main", city="Town", state="MA", postal_code="00001")
+        self.score = ISIScore.objects.create(patient=self.onboarding[0], score=12, date=date(2024, 1, 1))
+
+    def bulk_update(self, body):
+        return self.client.post(reverse('patient-bulk-update'), body, format='json')
+
+    def test_ids_patch_is_one_update(self):
+        """Test that an id list is patched with a single UPDATE, leaving nested rows and unchanged patients alone"""
+        ids = [patient.id for patient in self.onboarding] + [self.active.id]
+        before = dict(Patient.objects.values_list('id', 'updated_at'))
+        # savepoint, count, select ids, update, release
+        with self.assertNumQueries(5):
+            response = self.bulk_update({"ids": ids, "patch": {"status": "active", "ready_to_discharge": True}})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {"matched": 4, "updated": 4})
+
+        response = self.bulk_update({"ids": ids, "patch": {"status": "active"}})
+        self.assertEqual(response.data, {"matched": 4, "updated": 0})
+        after = dict(Patient.objects.values_list('id', 'updated_at'))
+        for pk in ids:
+            self.assertGreater(after[pk], before[pk])
+        self.assertEqual(after[self.other.id], before[self.other.id])
+        self.assertEqual(Patient.objects.filter(status="active", ready_to_discharge=True).count(), 4)
+        self.assertEqual(list(Address.objects.values_list('id', 'city')), [(self.address.id, "Town")])
+        self.assertEqual(list(ISIScore.objects.values_list('id', 'score')), [(self.score.id, 12)])
+
+    def test_filter_patch_and_stats(self):
+        """Test that a filter expression selects the patients and clinic stats follow on commit"""
+        call_command('rebuild_stats', stdout=StringIO())
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.bulk_update({"filter": {"status": "onboarding", "state_exact": "ma"}, "patch": {"status": "active"}})
+        self.assertEqual(response.data, {"matched": 1, "updated": 1})
+        self.assertEqual(Patient.objects.get(pk=self.onboarding[0].id).status, "active")
+        self.assertEqual(self.client.get(reverse('clinic-stats')).data['by_status'], {'active': 2, 'inquiry': 1, 'onboarding': 2})
+
+    def test_invalid_requests_write_nothing(self):
+        """Test that bad targets, read-only or nested fields and bad values are rejected"""
+        ids = [self.other.id]
+        for body, key in [
+            ({"patch": {"status": "active"}}, 'non_field_errors'),
+            ({"ids": ids, "filter": {"status": "inquiry"}, "patch": {"status": "active"}}, 'non_field_errors'),
+            ({"filter": {"statuz": "inquiry"}, "patch": {"status": "active"}}, 'filter'),
+            ({"filter": {"status": "nope"}, "patch": {"status": "active"}}, 'filter'),
+            ({"ids": ids, "patch": {"latest_isi_score": 3}}, 'patch'),
+            ({"ids": ids, "patch": {"addresses": []}}, 'patch'),
+            ({"ids": ids, "patch": {"status": "nope"}}, 'patch'),
+            ({"ids": ids, "patch": {}}, 'patch'),
+        ]:
+            response = self.bulk_update(body)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, body)
+            self.assertIn(key, response.data, body)
+        self.assertEqual(Patient.objects.get(pk=self.other.id).status, "inquiry")
+
+
+class RequestMetricsTest(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        request_metrics.reset()
+        Patient.objects.create(first_name="Timed", last_name="Patient", date_of_birth=date(1990, 1, 1))
+
+    def test_server_timing_and_metrics_endpoint(self):
+        """Test that sampled requests carry Server-Timing and feed the admin-only per-endpoint percentiles"""
+        for _ in range(3):
+            response = self.client.get(reverse('patient-list'))
+        timing = dict(part.strip().split(';', 1) for part in response['Server-Timing'].split(','))
+        self.assertEqual(set(timing), {'db', 'serialize', 'app', 'render', 'total'})
+        self.assertIn('3 queries', timing['db'])
+
+        url = reverse('request-metrics')
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+        self.client.force_authenticate(User.objects.create_superuser("admin", "admin@example.com", "pw"))
+        endpoint = self.client.get(url).data['endpoints']['GET patient-list']
+        self.assertEqual(endpoint['requests'], 3)
+        self.assertEqual(endpoint['queries'], {'p50': 3, 'p95': 3, 'p99': 3})
+        self.assertEqual(endpoint['response_bytes']['p50'], len(response.content))
+        self.assertIsNotNone(endpoint['render_ms']['p99'])
+        self.assertIsNotNone(endpoint['serialize_ms']['p99'])
+
+        # The reset request is itself the first sample of the new window
+        self.assertEqual(self.client.delete(url).status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(list(request_metrics.summary()['endpoints']), ['DELETE request-metrics'])
+
+    def test_serialization_is_timed_apart_from_the_view(self):
+        """Test that time spent in serializers is reported as serialize, not app"""
+        represent = serializers.Serializer.to_representation
+
+        def slow_representation(serializer, instance):
+            time.sleep(0.05)
+            return represent(serializer, instance)
+
+        with patch.object(serializers.Serializer, 'to_representation', slow_representation):
+            response = self.client.get(reverse('patient-list'))
+        timing = {
+            name: float(params.split('dur=')[1].split(';')[0])
+            for name, params in (part.strip().split(';', 1) for part in response['Server-Timing'].split(','))
+        }
+        self.assertGreaterEqual(timing['serialize'], 50)
+        self.assertLess(timing['app'], 50)
+
+    # The ASGI middleware stack: with WhiteNoise in it, everything runs in one sync thread
+    @override_settings(MIDDLEWARE=[name for name in settings.MIDDLEWARE if not name.startswith('whitenoise.')])
+    async def test_async_requests_count_queries_run_in_threads(self):
+        """Test that queries sync_to_async runs outside the event loop thread are counted"""
+        patient = await Patient.objects.aget()
+        loop_thread = threading.get_ident()
+        query_threads = set()
+
+        record = QueryRecorder.__call__
+
+        def note_thread(recorder, *args):
+            query_threads.add(threading.get_ident())
+            return record(recorder, *args)
+
+        # Connections belong to the thread that opened them, so this must not be
+        # wrapped from here: the recorder has to follow the request instead
+        with patch.object(QueryRecorder, '__call__', note_thread):
+            response = await self.async_client.get(reverse('async-patient-detail', args=[patient.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(query_threads)
+        self.assertNotIn(loop_thread, query_threads)
+        # patient + addresses + isi_scores + custom_field_values
+        self.assertIn('"4 queries', response['Server-Timing'])
+
+    @override_settings(REQUEST_METRICS_SAMPLE_RATE=0)
+    def test_unsampled_requests_are_not_recorded(self):
+        """Test that requests outside the sample get no header and no samples"""
+        response = self.client.get(reverse('patient-list'))
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(request_metrics.summary()['endpoints'], {})
+
+    def test_repeated_statements_are_flagged(self):
+        """Test that a statement run once per row is reported as repeated"""
+        recorder = QueryRecorder()
+        execute = lambda sql, params, many, context: None
+        for pk in range(4):
+            recorder(execute, 'SELECT * FROM address WHERE patient_id = %s', [pk], False, {})
+        recorder(execute, 'SELECT * FROM patient', [], False, {})
+        self.assertEqual((recorder.count, recorder.repeated), (5, 3))
+        self.assertEqual(recorder.repeated_statements(3), [('SELECT * FROM address WHERE patient_id = %s', 4)])
+        self.assertEqual(percentiles([5, 1, 4, 2, 3]), {'p50': 3, 'p95': 5, 'p99': 5})
+
+
+class GenerateSyntheticTest(TestCase):
+    def generate(self, count, seed):
+        call_command('generate_synthetic', count, seed=seed, anchor=date(2025, 6, 30), batch_size=7, stdout=StringIO())
+        return [
+            (patient.first_name, patient.last_name, patient.status, patient.latest_isi_score,
+             [(a.city, a.postal_code) for a in patient.addresses.all()],
+             [(s.date, s.score) for s in patient.isi_scores.order_by('date')],
+             sorted((v.field_definition.name, v.value) for v in patient.custom_field_values.all()))
+            for patient in Patient.objects.order_by('id').prefetch_related('addresses', 'custom_field_values__field_definition')
+        ]
+
+    def test_seeded_generation_is_reproducible(self):
+        """Test that the same seed yields the same patients, histories and derived columns"""
+        first = self.generate(30, seed=1)
+        self.assertEqual(len(first), 30)
+        self.assertTrue(all(addresses for _, _, _, _, addresses, _, _ in first))
+        self.assertEqual(
+            [latest for *_, latest, _, scores, _ in first],
+            [scores[-1][1] if scores else None for *_, scores, _ in first],
+        )
+        self.assertEqual(ClinicStat.objects.filter(metric='status').aggregate(total=Sum('count'))['total'], 30)
+
+        Patient.objects.all().delete()
+        self.assertEqual(self.generate(30, seed=1), first)
+        Patient.objects.all().delete()
+        self.assertNotEqual(self.generate(30, seed=2), first)
+
+
+class SQLiteProfileTest(TestCase):
+    def open(self, path, **options):
+        profile = settings.DATABASE_PROFILES['concurrent']
+        settings_dict = {
+            **connections['default'].settings_dict, **profile,
+            'NAME': path, 'OPTIONS': {**profile['OPTIONS'], **options},
+        }
+        wrapper = ConcurrentDatabaseWrapper(settings_dict, alias='profile-test')
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def pragma(self, wrapper, name):
+        with wrapper.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_concurrent_profile_pragmas_and_write_queue(self):
+        """Test that the concurrent profile runs in WAL mode and queues write transactions per database file"""
+        with TemporaryDirectory() as directory:
+            path = Path(directory) / 'profile.sqlite3'
+            first, second = self.open(path), self.open(path, write_queue_timeout=0.05)
+            self.assertEqual(self.pragma(first, 'journal_mode'), 'wal')
+            self.assertEqual(self.pragma(first, 'synchronous'), 1)
+            self.assertEqual(self.pragma(first, 'busy_timeout'), 5000)
+            second.ensure_connection()
+
+            first._start_transaction_under_autocommit()
+            with self.assertRaises(OperationalError):
+                second._start_transaction_under_autocommit()
+            first._rollback()
+            second._start_transaction_under_autocommit()
+            self.assertTrue(second.holds_write_lock)
+            second._commit()
+            self.assertFalse(second.write_lock().locked())
+
+
+class AsyncReadEndpointTest(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        field = CustomField.objects.create(name="Allergies")
+        for i in range(25):
+            patient = Patient.objects.create(
+                first_name=f"Async{i:02d}", last_name="Reader", date_of_birth=date(1990, 1, 1),
+                status=Patient.Status.ACTIVE if i % 2 else Patient.Status.INQUIRY,
+            )
+            Address.objects.create(
+                patient=patient, address_line1="1 Main St", city="Boston" if i % 3 else "Denver",
+                state="MA", postal_code="02101",
+            )
+            ISIScore.objects.create(patient=patient, score=i, date=date(2024, 1, 1) + timedelta(days=i))
+            CustomFieldValue.objects.create(patient=patient, field_definition=field, value=str(i))
+        self.patient = Patient.objects.order_by('id').first()
+
+    def assertSameResponse(self, sync_url, async_url):
+        expected = self.client.get(sync_url)
+        response = self.client.get(async_url)
+        self.assertEqual(response.status_code, expected.status_code)
+        self.assertEqual(
+            json.loads(response.content.replace(b'/api/async/', b'/api/')), expected.json()
+        )
+        return response.json()
+
+    def test_patient_list_matches_sync_endpoint(self):
+        """Test that the async patient list pages, filters, sorts and expands like the sync one"""
+        for query in ['', '?page=2', '?page=last', '?status=active&ordering=-latest_isi_score',
+                      '?city_exact=denver&expand=isi_scores,custom_field_values', '?search=Async1',
+                      '?cf_Allergies__gte=20&fields=id,first_name']:
+            with self.subTest(query=query):
+                data = self.assertSameResponse(reverse('patient-list') + query, reverse('async-patient-list') + query)
+                self.assertTrue(data['results'])
+
+    def test_patient_detail_matches_sync_endpoint(self):
+        """Test that the async patient detail renders the nested patient in one query per relation"""
+        # patient + addresses + isi_scores + custom_field_values
+        with self.assertNumQueries(4):
+            self.client.get(reverse('async-patient-detail', args=[self.patient.id]))
+        data = self.assertSameResponse(
+            reverse('patient-detail', args=[self.patient.id]), reverse('async-patient-detail', args=[self.patient.id])
+        )
+        self.assertEqual(len(data['isi_scores']), 1)
+
+    def test_isi_scores_match_sync_endpoint(self):
+        """Test that the async ISI score list and detail match the sync endpoints"""
+        score = ISIScore.objects.first()
+        for query in ['', f'?patient={self.patient.id}', '?ordering=score&page=2']:
+            with self.subTest(query=query):
+                self.assertSameResponse(reverse('isi-score-list') + query, reverse('async-isi-score-list') + query)
+        self.assertSameResponse(
+            reverse('isi-score-detail', args=[score.id]), reverse('async-isi-score-detail', args=[score.id])
+        )
+
+    def test_list_query_count_is_constant(self):
+        """Test that an expanded async page costs count + patients + one query per relation"""
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse('async-patient-list') + '?expand=addresses,isi_scores,custom_field_values')
+        self.assertEqual(len(response.json()['results']), 20)
+
+    def test_errors(self):
+        """Test that unknown rows, pages and filters are reported as JSON errors"""
+        response = self.client.get(reverse('async-patient-detail', args=[999999]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertIn('detail', response.json())
+        response = self.client.get(reverse('async-patient-list') + '?page=9')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get(reverse('async-patient-list') + '?cf_Unknown=1')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('custom_fields', response.json())
+
+
+@override_settings(DATABASE_REPLICA_ALIASES=['replica1'], DATABASE_REPLICA_PIN_SECONDS=10)
+class ReadReplicaRoutingTest(TransactionTestCase):
+    # Test cases wrap each test in a transaction, which keeps every read on the primary
+
+    def setUp(self):
+        caches['responses'].clear()
+        self.factory = RequestFactory()
+        self.seen = []
+
+        def view(request):
+            self.seen.append(read_alias())
+            return HttpResponse(status=500 if request.path == '/fail/' else 200)
+
+        self.middleware = ReplicaRoutingMiddleware(view)
+
+    def request(self, method, path='/api/patients/', address='10.0.0.1'):
+        request = getattr(self.factory, method)(path, REMOTE_ADDR=address)
+        request.user = AnonymousUser()
+        self.middleware(request)
+        return self.seen[-1]
+
+    def test_router_reads_from_replica_only_when_allowed(self):
+        """Test that reads go to a replica inside replica_reads and to the primary otherwise."""
+        router = ReadReplicaRouter()
+        self.assertEqual(router.db_for_read(Patient), 'default')
+        with replica_reads():
+            self.assertEqual(router.db_for_read(Patient), 'replica1')
+            self.assertEqual(router.db_for_write(Patient), 'default')
+            with primary_reads():
+                self.assertEqual(router.db_for_read(Patient), 'default')
+            with transaction.atomic():
+                self.assertEqual(router.db_for_read(Patient), 'default')
+            patient = Patient(first_name='A', last_name='B', date_of_birth=date(1990, 1, 1))
+            patient._state.db = 'default'
+            self.assertEqual(router.db_for_read(Address, instance=patient), 'default')
+        self.assertFalse(router.allow_migrate('replica1', 'patients'))
+        self.assertTrue(router.allow_migrate('default', 'patients'))
+
+    def test_safe_requests_read_from_replica(self):
+        """Test that safe-method requests read from a replica and writes from the primary."""
+        self.assertEqual(self.request('get'), 'replica1')
+        self.assertEqual(self.request('head'), 'replica1')
+        self.assertEqual(self.request('patch', '/fail/'), 'default')
+        self.assertEqual(read_alias(), 'default')
+
+    def test_write_pins_client_to_primary(self):
+        """Test that a successful write pins only that client's reads to the primary for the window."""
+        self.assertEqual(self.request('post', '/fail/'), 'default')
+        self.assertEqual(self.request('get'), 'replica1')
+
+        self.request('post')
+        self.assertEqual(self.request('get'), 'default')
+        self.assertEqual(self.request('get', address='10.0.0.2'), 'replica1')
+
+        with override_settings(DATABASE_REPLICA_PIN_SECONDS=0):
+            self.request('post')
+        self.assertEqual(self.request('get'), 'replica1')
+
+    @override_settings(DATABASE_REPLICA_ALIASES=[])
+    def test_without_replicas_reads_use_primary(self):
+        """Test that every request reads from the primary when no replicas are configured."""
+        self.assertEqual(self.request('get'), 'default')
+
+
+@override_settings(RESPONSE_CACHE_ENABLED=True, DATABASE_REPLICA_ALIASES=['default'])
+class ReplicaResponseCacheTest(APITestCase):
+    # The primary stands in for the replica; what matters is which requests may read one
+
+    def setUp(self):
+        caches['responses'].clear()
+        self.writer = APIClient(REMOTE_ADDR='10.0.0.1')
+        self.reader = APIClient(REMOTE_ADDR='10.0.0.2')
+
+    def test_replica_reads_bypass_response_cache(self):
+        """Test that another client's replica read is not cached and served to a writer pinned to the primary"""
+        response = self.writer.post(
+            reverse('patient-list'),
+            {'first_name': 'Pinned', 'last_name': 'Writer', 'date_of_birth': '1990-01-01'},
+            format='json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        response = self.reader.get(reverse('patient-list'))
+        self.assertNotIn('X-Cache', response)
+
+        response = self.writer.get(reverse('patient-list'))
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['count'], 1)
+        response = self.writer.get(reverse('patient-list'))
+        self.assertEqual(response['X-Cache'], 'HIT')
+
+        # The reader is still not pinned, so it keeps bypassing the cache
+        response = self.reader.get(reverse('patient-list'))
+        self.assertNotIn('X-Cache', response)
+        with replica_reads():
+            self.assertTrue(reads_from_replicas())
+        self.assertFalse(reads_from_replicas())
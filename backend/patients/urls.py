@@ -1,11 +1,15 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
+from .async_views import AsyncISIScoreView, AsyncPatientView
 from .views import (
     PatientViewSet,
     AddressViewSet,
     ISIScoreViewSet,
     CustomFieldViewSet,
-    CustomFieldValueViewSet
+    CustomFieldValueViewSet,
+    ResponseCacheStatsView,
+    ClinicStatsView,
+    RequestMetricsView,
 )
 
 router = DefaultRouter()
@@ -16,5 +20,12 @@ router.register(r"custom-fields", CustomFieldViewSet, basename="custom-field")
 router.register(r"custom-field-values", CustomFieldValueViewSet, basename="custom-field-value")
 
 urlpatterns = [
+    path("stats/", ClinicStatsView.as_view(), name="clinic-stats"),
+    path("cache-stats/", ResponseCacheStatsView.as_view(), name="cache-stats"),
+    path("_metrics/", RequestMetricsView.as_view(), name="request-metrics"),
+    path("async/patients/", AsyncPatientView.as_view(), name="async-patient-list"),
+    path("async/patients/<int:pk>/", AsyncPatientView.as_view(), name="async-patient-detail"),
+    path("async/isi-scores/", AsyncISIScoreView.as_view(), name="async-isi-score-list"),
+    path("async/isi-scores/<int:pk>/", AsyncISIScoreView.as_view(), name="async-isi-score-detail"),
     path("", include(router.urls)),
 ]
@@ -1,65 +1,384 @@
-from rest_framework import viewsets, filters
+import sys
+
+from rest_framework import viewsets, filters, serializers, status
+from rest_framework.decorators import action
+from rest_framework.exceptions import UnsupportedMediaType
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
 from django_filters.rest_framework import DjangoFilterBackend, FilterSet, CharFilter
-from django.db.models import Max, Subquery, OuterRef
+from django.db import transaction
+from django.db.models import F, Max, Subquery, OuterRef, Prefetch, Exists, Value
+from django.db.models.functions import NullIf
+from django.http import StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from core.replicas import primary_reads, read_alias
+from .cache import CachedResponseMixin, cache_stats
+from .changes import PatientChangeFeed
+from .conditional import ConditionalGetMixin
+from .metrics import registry as request_metrics
 from .models import Patient, Address, ISIScore, CustomField, CustomFieldValue
+from .importers import PatientImporter
+from .exporters import CSVRenderer, NDJSONRenderer, PatientExporter
+from .pagination import DashboardPagination
+from .search import PatientSearchFilter
+from .series import ISIScoreSeries, SeriesQuerySerializer
+from .stats import summary as clinic_summary
 from .serializers import (
     PatientSerializer,
+    PatientListSerializer,
+    PatientBulkUpdateSerializer,
     AddressSerializer,
     ISIScoreSerializer,
     CustomFieldSerializer,
-    CustomFieldValueSerializer
+    CustomFieldValueSerializer,
+    CustomFieldValueUpsertSerializer,
 )
 
+def resolve_custom_fields(names):
+    """Map custom field names to ids with one query, rejecting unknown names."""
+    fields = dict(CustomField.objects.filter(name__in=names).values_list('name', 'id'))
+    unknown = sorted(set(names) - set(fields))
+    if unknown:
+        raise serializers.ValidationError({'custom_fields': [f'Unknown custom field "{name}".' for name in unknown]})
+    return fields
+
+
+def plan_prefetches(serializer):
+    """
+    Build the Prefetch objects needed to render ``serializer`` without N+1 queries.
+
+    Every readable nested many=True ModelSerializer becomes one Prefetch, and any
+    nested single-object serializers inside it are pulled in with select_related.
+    Primary key related fields are skipped since they only read the ``<fk>_id`` column.
+    """
+    prefetches = []
+    for field in serializer.fields.values():
+        if field.write_only or not isinstance(field, serializers.ListSerializer):
+            continue
+        child = field.child
+        if not isinstance(child, serializers.ModelSerializer):
+            continue
+
+        queryset = child.Meta.model.objects.all()
+        related = [
+            nested.source for nested in child.fields.values()
+            if isinstance(nested, serializers.ModelSerializer) and not nested.write_only
+        ]
+        if related:
+            queryset = queryset.select_related(*related)
+        prefetches.append(Prefetch(field.source, queryset=queryset))
+    return prefetches
+
 class PatientFilter(FilterSet):
-    city = CharFilter(field_name='addresses__city', lookup_expr='icontains')
-    state = CharFilter(field_name='addresses__state', lookup_expr='icontains')
+    # ``city``/``state`` keep the original substring match; the prefix and exact
+    # modes compare against the indexed, case-folded ``*_key`` columns
+    city = CharFilter(field_name='city', method='filter_address')
+    city_prefix = CharFilter(field_name='city', method='filter_address_prefix')
+    city_exact = CharFilter(field_name='city', method='filter_address_exact')
+    state = CharFilter(field_name='state', method='filter_address')
+    state_prefix = CharFilter(field_name='state', method='filter_address_prefix')
+    state_exact = CharFilter(field_name='state', method='filter_address_exact')
 
     class Meta:
         model = Patient
-        fields = ['status', 'city', 'state', 'last_visit']
+        fields = ['status', 'city', 'state', 'last_visit', 'suggested_discharge']
+
+    @staticmethod
+    def normalize(value):
+        return value.strip().lower()
+
+    def filter_address(self, queryset, name, value):
+        # EXISTS instead of a join so a patient with several matching addresses is returned once
+        addresses = Address.objects.filter(patient=OuterRef('pk'), **{f'{name}_key__contains': self.normalize(value)})
+        return queryset.filter(Exists(addresses))
+
+    def filter_address_prefix(self, queryset, name, value):
+        prefix = self.normalize(value)
+        if not prefix:
+            return queryset
+        # A key range instead of LIKE 'x%' so SQLite can seek the (key, patient) index,
+        # unless the last character is the highest code point and has no successor
+        if ord(prefix[-1]) == sys.maxunicode:
+            return self.filter_patients_in(queryset, **{f'{name}_key__startswith': prefix})
+        upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        return self.filter_patients_in(queryset, **{f'{name}_key__gte': prefix, f'{name}_key__lt': upper})
+
+    def filter_address_exact(self, queryset, name, value):
+        return self.filter_patients_in(queryset, **{f'{name}_key': self.normalize(value)})
+
+    def filter_patients_in(self, queryset, **lookups):
+        # IN (subquery) is evaluated once from the covering index, then probes patients by pk
+        return queryset.filter(pk__in=Address.objects.filter(**lookups).values('patient_id'))
+
+    # Custom field predicates: ?cf_<name>=x, ?cf_<name>__gte=x, ...
+    custom_field_prefix = 'cf_'
+    custom_field_operators = ['exact', 'gt', 'gte', 'lt', 'lte', 'contains', 'isnull']
 
-class PatientViewSet(viewsets.ModelViewSet):
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        predicates = []
+        for param in self.data:
+            if not param.startswith(self.custom_field_prefix):
+                continue
+            name, _, operator = param[len(self.custom_field_prefix):].partition('__')
+            if operator and operator not in self.custom_field_operators:
+                name = f'{name}__{operator}'
+                operator = ''
+            predicates.append((name, operator or 'exact', self.data[param]))
+        if not predicates:
+            return queryset
+
+        fields = resolve_custom_fields({name for name, _, _ in predicates})
+        for name, operator, value in predicates:
+            queryset = self.filter_custom_field(queryset, fields[name], operator, value)
+        return queryset
+
+    def filter_custom_field(self, queryset, field_id, operator, value):
+        values = CustomFieldValue.objects.filter(field_definition_id=field_id)
+        if operator == 'isnull':
+            has_value = Exists(values.filter(patient=OuterRef('pk')).exclude(value_key=''))
+            return queryset.filter(~has_value if value.lower() in ('1', 'true') else has_value)
+        if operator == 'contains':
+            # No index helps a substring match, so probe each patient's row instead
+            return queryset.filter(Exists(values.filter(patient=OuterRef('pk'), value_key__contains=self.normalize(value))))
+
+        # Numbers compare numerically against number_value, anything else as case-folded text
+        try:
+            lookups = {f'number_value__{operator}': float(value)}
+        except ValueError:
+            lookups = {f'value_key__{operator}': self.normalize(value)}
+        return queryset.filter(pk__in=values.filter(**lookups).values('patient_id'))
+
+class PatientOrderingFilter(filters.OrderingFilter):
+    # Legacy sort keys mapped onto the indexed columns that replace them
+    aliases = {
+        'isi_scores__score': 'latest_isi_score',
+        'addresses__city': 'primary_city',
+    }
+
+    custom_field_prefix = PatientFilter.custom_field_prefix
+
+    def remove_invalid_fields(self, queryset, fields, view, request):
+        fields = [
+            ('-' if term.startswith('-') else '') + self.aliases.get(term.lstrip('-'), term.lstrip('-'))
+            for term in fields
+        ]
+        custom = [term for term in fields if term.lstrip('-').startswith(self.custom_field_prefix)]
+        valid = super().remove_invalid_fields(
+            queryset, [term for term in fields if term not in custom], view, request
+        )
+        if custom:
+            # Keep the requested order between custom and regular sort keys
+            valid = set(valid)
+            return [term for term in fields if term in valid or term in custom]
+        return valid
+
+    def filter_queryset(self, request, queryset, view):
+        ordering = self.get_ordering(request, queryset, view) or []
+        sorts_by_city = any(term.lstrip('-') == 'primary_city' for term in ordering)
+        if sorts_by_city and 'primary_city' not in queryset.query.annotations:
+            # Sort on the first address only, matching what the table displays
+            queryset = queryset.with_primary_address()
+
+        custom = [term for term in ordering if term.lstrip('-').startswith(self.custom_field_prefix)]
+        if not custom:
+            return super().filter_queryset(request, queryset, view)
+
+        fields = resolve_custom_fields({term.lstrip('-')[len(self.custom_field_prefix):] for term in custom})
+        order_by = []
+        for term in ordering:
+            if term not in custom:
+                order_by.append(term)
+                continue
+            name = term.lstrip('-')
+            # One lookup per patient on the (patient, field_definition) unique index;
+            # numbers sort numerically ahead of text, patients without a value last
+            value = CustomFieldValue.objects.filter(
+                patient=OuterRef('pk'), field_definition_id=fields[name[len(self.custom_field_prefix):]]
+            )
+            # Blank values sort with missing ones, as ?cf_<name>__isnull treats them
+            columns = {
+                'number_value': Subquery(value.values('number_value')[:1]),
+                'value_key': NullIf(Subquery(value.values('value_key')[:1]), Value('')),
+            }
+            for column, expression in columns.items():
+                alias = f'_cf_{len(order_by)}_{column}'
+                queryset = queryset.alias(**{alias: expression})
+                ref = F(alias)
+                order_by.append(ref.desc(nulls_last=True) if term.startswith('-') else ref.asc(nulls_last=True))
+        return queryset.order_by(*order_by)
+
+class PatientViewSet(ConditionalGetMixin, CachedResponseMixin, viewsets.ModelViewSet):
     queryset = Patient.objects.all()
     serializer_class = PatientSerializer
-    filter_backends = [filters.SearchFilter, DjangoFilterBackend, filters.OrderingFilter]
+    pagination_class = DashboardPagination
+    filter_backends = [PatientSearchFilter, DjangoFilterBackend, PatientOrderingFilter]
     search_fields = ["first_name", "last_name"]
     filterset_class = PatientFilter
     ordering_fields = [
         'first_name', 'last_name', 'status', 'date_of_birth', 'last_visit',
-        'addresses__city', 'isi_scores__score'
+        'primary_city', 'latest_isi_score', 'latest_isi_date', 'isi_trend_slope'
     ]
     ordering = ['first_name', 'last_name']  # default ordering
+    # CustomField too: ?cf_<name> filters and orderings resolve field names
+    cache_models = [Patient, Address, ISIScore, CustomField, CustomFieldValue]
+
+    def get_serializer_class(self):
+        # The table only needs a few columns per row; retrieve and writes stay fully nested
+        if self.action in ('list', 'changes'):
+            return PatientListSerializer
+        return PatientSerializer
 
     def get_queryset(self):
         queryset = super().get_queryset()
+        serializer = self.get_serializer()
 
-        # If sorting by ISI score, use the first score (which is already the latest)
-        ordering = self.request.query_params.get('ordering', '')
-        if ordering in ['isi_scores__score', '-isi_scores__score']:
-            # Since isi_scores are ordered by date descending,
-            # we can use the first score directly
-            queryset = queryset.order_by(ordering)
+        if {'primary_city', 'primary_state'} & set(serializer.fields):
+            queryset = queryset.with_primary_address()
 
-        # Always use distinct to avoid duplicates from joins
-        return queryset.distinct()
+        # Updates drop prefetched rows and re-read them after saving, so loading
+        # the patient's whole history beforehand would be wasted
+        if self.action in ('update', 'partial_update'):
+            return queryset
+
+        # Prefetch only the nested relations the serializer is going to render.
+        # Filters and orderings never join to-many relations, so no distinct() is needed.
+        return queryset.prefetch_related(*plan_prefetches(serializer))
+
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk(self, request):
+        """Import an NDJSON or CSV body of patients in chunks, reporting per-row errors."""
+        content_type = request.content_type.split(';')[0].strip().lower()
+        importer = PatientImporter()
+        if content_type in ('application/x-ndjson', 'application/ndjson', 'application/jsonl'):
+            read = importer.read_ndjson
+        elif content_type in ('text/csv', 'application/csv'):
+            read = importer.read_csv
+        else:
+            raise UnsupportedMediaType(content_type)
+
+        # Decode the body line by line rather than loading it into memory
+        lines = importer.decode_lines(request.stream or [])
+        return Response(importer.run(read(lines)))
+
+    @action(detail=False, methods=['post'], url_path='bulk-update')
+    def bulk_update(self, request):
+        """Apply one patch of flat fields to the patients named by ``ids`` or matched by ``filter``."""
+        serializer = PatientBulkUpdateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        queryset = Patient.objects.all()
+        if 'filter' in serializer.validated_data:
+            queryset = self.filter_patients(serializer.validated_data['filter'], queryset)
+        return Response(serializer.save(queryset))
+
+    def filter_patients(self, params, queryset):
+        # An unknown key would silently match everyone, so reject it rather than ignore it
+        unknown = sorted(
+            name for name in params
+            if name not in PatientFilter.base_filters and not name.startswith(PatientFilter.custom_field_prefix)
+        )
+        if unknown:
+            raise serializers.ValidationError({'filter': [f'Unknown filter "{name}".' for name in unknown]})
+        filterset = PatientFilter(data=params, queryset=queryset, request=self.request)
+        if not filterset.is_valid():
+            raise serializers.ValidationError({'filter': filterset.errors})
+        return filterset.qs
+
+    @action(detail=True, methods=['post'], url_path='isi-scores')
+    def record_isi_score(self, request, pk=None):
+        """Append one ISI score to a patient without reading or rewriting the rest of its history."""
+        patient = get_object_or_404(Patient.objects.only('pk'), pk=pk)
+        serializer = ISIScoreSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        with transaction.atomic():
+            serializer.save(patient=patient)
+            Patient.objects.filter(pk=patient.pk).refresh_latest_isi()
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=['get'], url_path='export', renderer_classes=[NDJSONRenderer, CSVRenderer])
+    def export(self, request):
+        """Stream every patient matching the list filters, search and ordering as NDJSON or CSV."""
+        # The body streams after the middleware has returned, so pick the read alias now
+        exporter = PatientExporter(self.filter_queryset(self.get_queryset()).using(read_alias()))
+        renderer = request.accepted_renderer
+        rows = exporter.csv() if renderer.format == 'csv' else exporter.ndjson()
+
+        response = StreamingHttpResponse(rows, content_type=f'{renderer.media_type}; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="patients.{renderer.format}"'
+        return response
+
+    @action(detail=False, methods=['get'], url_path='changes')
+    def changes(self, request):
+        """Return patients changed or deleted after ``?since=<token>``, plus the token for the next poll."""
+        try:
+            page_size = int(request.query_params.get('limit', 0))
+        except ValueError:
+            raise serializers.ValidationError({'limit': 'A valid integer is required.'})
+        feed = PatientChangeFeed(
+            self.get_queryset(), since=request.query_params.get('since'), page_size=page_size
+        )
+        # Tokens are positions on the primary; a lagging replica would let a poll skip rows
+        with primary_reads():
+            patients, deleted, token, has_more = feed.page()
+        return Response({
+            'changed': self.get_serializer(patients, many=True).data,
+            'deleted': deleted,
+            'next': token,
+            'has_more': has_more,
+        })
 
 class AddressViewSet(viewsets.ModelViewSet):
     queryset = Address.objects.all()
     serializer_class = AddressSerializer
 
-class ISIScoreViewSet(viewsets.ModelViewSet):
+class ISIScoreViewSet(CachedResponseMixin, viewsets.ModelViewSet):
     queryset = ISIScore.objects.all()
     serializer_class = ISIScoreSerializer
+    pagination_class = DashboardPagination
     filter_backends = [filters.SearchFilter, DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ['patient', 'date']
     ordering_fields = ['date', 'score']
     # Order by date descending, then by id descending to ensure consistent ordering
     ordering = ['-date', '-id']  # Most recent scores first, then by id for same dates
+    cache_models = [ISIScore]
+
+    # Keep the patient's cached latest ISI columns in step with every write,
+    # in the same transaction so clinic stats see the refreshed value on commit
+    @transaction.atomic
+    def perform_create(self, serializer):
+        score = serializer.save()
+        score.patient.refresh_latest_isi()
+
+    @transaction.atomic
+    def perform_update(self, serializer):
+        previous_patient = serializer.instance.patient
+        score = serializer.save()
+        score.patient.refresh_latest_isi()
+        if previous_patient.pk != score.patient_id:
+            previous_patient.refresh_latest_isi()
 
-class CustomFieldViewSet(viewsets.ModelViewSet):
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        patient = instance.patient
+        instance.delete()
+        patient.refresh_latest_isi()
+
+    @action(detail=False, methods=['get'], url_path='series')
+    def series(self, request):
+        """Weekly/monthly ISI statistics per patient or for the cohort, optionally downsampled."""
+        return self.cached_response(self.build_series, request)
+
+    def build_series(self, request):
+        params = SeriesQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        return Response(ISIScoreSeries(**params.validated_data).series())
+
+class CustomFieldViewSet(CachedResponseMixin, viewsets.ModelViewSet):
     queryset = CustomField.objects.all()
     serializer_class = CustomFieldSerializer
     pagination_class = None  # Disable pagination for this viewset
+    cache_models = [CustomField]
 
     def list(self, request, *args, **kwargs):
         response = super().list(request, *args, **kwargs)
@@ -73,3 +392,36 @@ class CustomFieldValueViewSet(viewsets.ModelViewSet):
     serializer_class = CustomFieldValueSerializer
     filter_backends = [filters.SearchFilter, DjangoFilterBackend]
     filterset_fields = ['patient', 'field_definition']
+
+    @action(detail=False, methods=['post'], url_path='bulk-upsert')
+    def bulk_upsert(self, request):
+        """Create or update many custom field values, across many patients, in one batch."""
+        serializer = CustomFieldValueUpsertSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response(serializer.save())
+
+class ResponseCacheStatsView(APIView):
+    """Hit/miss counters of the response cache, per viewset."""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(cache_stats([
+            view.__name__ for view in (PatientViewSet, ISIScoreViewSet, CustomFieldViewSet)
+        ]))
+
+class ClinicStatsView(APIView):
+    """Clinic summary read from the precomputed ClinicStat counters."""
+
+    def get(self, request):
+        return Response(clinic_summary())
+
+class RequestMetricsView(APIView):
+    """Rolling per-endpoint latency, SQL and response size percentiles of this worker."""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(request_metrics.summary())
+
+    def delete(self, request):
+        request_metrics.reset()
+        return Response(status=status.HTTP_204_NO_CONTENT)
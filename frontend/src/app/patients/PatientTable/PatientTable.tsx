@@ -1,14 +1,14 @@
 'use client';
 
-import type { ISIScore, Patient } from '@/lib/types';
+import type { PatientSummary } from '@/lib/types';
 import Image from 'next/image';
 import clsx from 'clsx';
 import { useState } from 'react';
 
 // Types
 interface PatientTableProps {
-  patients: Patient[];
-  onPatientClick: (patient: Patient) => void;
+  patients: PatientSummary[];
+  onPatientClick: (patient: PatientSummary) => void;
   isLoading: boolean;
   sortColumn: string;
   sortDirection: 'asc' | 'desc';
@@ -20,19 +20,17 @@ type ColumnConfig = {
   header: string;
   width: string;
   sortable?: boolean;
-  render: (patient: Patient) => React.ReactNode;
+  render: (patient: PatientSummary) => React.ReactNode;
 };
 
 // Utility functions
-const getPatientName = (patient: Patient) => {
+const getPatientName = (patient: PatientSummary) => {
   const middleInitial = patient.middle_name
     ? ` ${patient.middle_name.charAt(0)}.`
     : '';
   return `${patient.first_name}${middleInitial} ${patient.last_name}`;
 };
 
-const getPrimaryAddress = (patient: Patient) => patient.addresses?.[0] || null;
-
 const calculateAge = (dateOfBirth: string) => {
   const birthDate = new Date(dateOfBirth);
   const today = new Date();
@@ -49,11 +47,6 @@ const calculateAge = (dateOfBirth: string) => {
   return age;
 };
 
-const getLatestISIScore = (scores: ISIScore[]) => {
-  if (!scores || scores.length === 0) return null;
-  return scores[0]; // First score is already the most recent
-};
-
 // Utility functions for PatientAvatar
 const getInitials = (name: string) => {
   if (!name) return '';
@@ -76,10 +69,10 @@ const SortIcon = ({
   const reverseFieldMap: Record<string, string> = {
     first_name: 'name',
     status: 'status',
-    addresses__city: 'location',
+    primary_city: 'location',
     date_of_birth: 'age',
     last_visit: 'last_visit',
-    isi_scores__score: 'isi_score',
+    latest_isi_score: 'isi_score',
   };
 
   const frontendField = reverseFieldMap[sortColumn];
@@ -87,7 +80,7 @@ const SortIcon = ({
   return <span className="ml-1">{sortDirection === 'asc' ? '↑' : '↓'}</span>;
 };
 
-const StatusBadge = ({ status }: { status: Patient['status'] }) => {
+const StatusBadge = ({ status }: { status: PatientSummary['status'] }) => {
   const statusClasses = clsx('px-2 py-1 rounded-full text-xs font-medium', {
     'bg-green-100 text-green-800': status === 'active',
     'bg-blue-100 text-blue-800': status === 'inquiry',
@@ -167,14 +160,13 @@ export function PatientTable({
       header: 'Location',
       width: '1fr',
       sortable: true,
-      render: patient => {
-        const address = getPrimaryAddress(patient);
-        return (
-          <span className="truncate">
-            {address ? `${address.city}, ${address.state}` : '-'}
-          </span>
-        );
-      },
+      render: patient => (
+        <span className="truncate">
+          {patient.primary_city
+            ? `${patient.primary_city}, ${patient.primary_state}`
+            : '-'}
+        </span>
+      ),
     },
     {
       key: 'status',
@@ -189,10 +181,10 @@ export function PatientTable({
       width: '1fr',
       sortable: true,
       render: patient => {
-        const latestScore = getLatestISIScore(patient.isi_scores);
+        const hasScore = patient.latest_isi_score !== null;
         return (
-          <span className={latestScore ? 'font-medium' : 'text-gray-400'}>
-            {latestScore ? latestScore.score : '-'}
+          <span className={hasScore ? 'font-medium' : 'text-gray-400'}>
+            {hasScore ? patient.latest_isi_score : '-'}
           </span>
         );
       },
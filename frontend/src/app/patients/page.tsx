@@ -2,7 +2,7 @@
 
 'use client';
 import { useEffect, useState } from 'react';
-import { Patient } from '@/lib/types';
+import { Patient, PatientSummary } from '@/lib/types';
 import { Modal } from '@/components/Modal/Modal';
 import { PatientInfo } from './PatientInfo/PatientInfo';
 import { Searchbar } from '@/components/Searchbar/Searchbar';
@@ -10,7 +10,7 @@ import { PatientTable } from './PatientTable/PatientTable';
 import { Navbar } from '@/components/Navbar/Navbar';
 import { Button } from '@/components/Button/Button';
 import { useFilters } from './hooks/useFilters';
-import { patientsApi } from '@/lib/api';
+import { patientsApi, utils } from '@/lib/api';
 import { FiltersPanel } from '../../components/FiltersPanel/FiltersPanel';
 import {
   AdjustmentsVerticalIcon,
@@ -18,7 +18,7 @@ import {
 } from '@heroicons/react/24/solid';
 
 export default function PatientsPage() {
-  const [patients, setPatients] = useState<Patient[]>([]);
+  const [patients, setPatients] = useState<PatientSummary[]>([]);
   const [selectedPatient, setSelectedPatient] = useState<Patient | null>(null);
   const [isCreateMode, setIsCreateMode] = useState(false);
   const [isLoading, setIsLoading] = useState(false);
@@ -99,6 +99,15 @@ export default function PatientsPage() {
     }
   };
 
+  // List rows are compact, so load the full nested patient before opening it
+  const handlePatientClick = async (patient: PatientSummary) => {
+    try {
+      setSelectedPatient(await patientsApi.getPatient(patient.id.toString()));
+    } catch (err) {
+      console.error('Error fetching patient:', err);
+    }
+  };
+
   const handleAddPatient = () => {
     setIsCreateMode(true);
     const tempId = -Date.now();
@@ -119,7 +128,8 @@ export default function PatientsPage() {
     });
   };
 
-  const handlePatientSaved = (updatedPatient: Patient) => {
+  const handlePatientSaved = (savedPatient: Patient) => {
+    const updatedPatient = utils.toPatientSummary(savedPatient);
     if (isCreateMode) {
       setPatients(prevPatients =>
         prevPatients
@@ -138,10 +148,10 @@ export default function PatientsPage() {
   const fieldMap: Record<string, string> = {
     name: 'first_name',
     status: 'status',
-    location: 'addresses__city',
+    location: 'primary_city',
     age: 'date_of_birth',
     last_visit: 'last_visit',
-    isi_score: 'isi_scores__score',
+    isi_score: 'latest_isi_score',
   };
 
   const handleSort = (column: string) => {
@@ -215,7 +225,7 @@ export default function PatientsPage() {
             <div className="flex-1 overflow-auto">
               <PatientTable
                 patients={patients}
-                onPatientClick={setSelectedPatient}
+                onPatientClick={handlePatientClick}
                 isLoading={isLoading}
                 sortColumn={sortColumn}
                 sortDirection={sortDirection}
@@ -1,8 +1,10 @@
 import {
   CustomField,
   CustomFieldValue,
+  ISIScore,
   Patient,
   PatientData,
+  PatientSummary,
 } from '@/lib/types';
 
 // Determine if we're in a development or production environment
@@ -27,7 +29,7 @@ interface PaginatedResponse {
   count: number;
   next: string | null;
   previous: string | null;
-  results: Patient[];
+  results: PatientSummary[];
 }
 
 interface FetchPatientsParams {
@@ -107,8 +109,31 @@ export const customFieldsApi = {
 
     return res.json();
   },
+
+  /**
+   * Create or update many custom field values in one request
+   */
+  bulkUpsertCustomFieldValues: async (
+    values: { patient: number; field_definition: number; value: string }[],
+  ): Promise<{ upserted: number; patients: number }> => {
+    const res = await fetch(`${API_BASE_URL}/api/custom-field-values/bulk-upsert/`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ values }),
+    });
+
+    if (!res.ok) {
+      throw new Error(`Failed to upsert field values: ${res.status}`);
+    }
+
+    return res.json();
+  },
 };
 
+// Last copy of each patient with its ETag, so reopening an unchanged patient
+// costs a 304 and hands back the same object instead of a fresh tree
+const patientCache = new Map<string, { etag: string; patient: ApiPatient }>();
+
 /**
  * API functions for patients
  */
@@ -117,9 +142,18 @@ export const patientsApi = {
    * Fetch a single patient by ID
    */
   getPatient: async (id: string): Promise<ApiPatient> => {
-    const res = await fetch(`${API_BASE_URL}/api/patients/${id}/`);
+    const cached = patientCache.get(id);
+    const res = await fetch(`${API_BASE_URL}/api/patients/${id}/`, {
+      cache: 'no-store',
+      headers: cached ? { 'If-None-Match': cached.etag } : {},
+    });
+    if (res.status === 304 && cached) return cached.patient;
     if (!res.ok) throw new Error(`Failed to fetch patient: ${res.status}`);
-    return res.json();
+
+    const patient: ApiPatient = await res.json();
+    const etag = res.headers.get('ETag');
+    if (etag) patientCache.set(id, { etag, patient });
+    return patient;
   },
 
   /**
@@ -163,16 +197,60 @@ export const patientsApi = {
     return res.json();
   },
 
+  /**
+   * Record one new ISI score without resending the patient's history
+   */
+  recordIsiScore: async (
+    patientId: string,
+    score: { score: number; date: string },
+  ): Promise<ISIScore> => {
+    const res = await fetch(`${API_BASE_URL}/api/patients/${patientId}/isi-scores/`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify(score),
+    });
+
+    if (!res.ok) {
+      throw new Error(`Failed to record ISI score: ${res.status}`);
+    }
+
+    patientCache.delete(patientId);
+    return res.json();
+  },
+
+  /**
+   * Patch flat fields (status, ready_to_discharge, ...) on many patients at once,
+   * named by id or matched by list filters
+   */
+  bulkUpdatePatients: async (
+    target: { ids: number[] } | { filter: Record<string, string> },
+    patch: Partial<Pick<ApiPatient, 'status' | 'ready_to_discharge' | 'last_visit'>>,
+  ): Promise<{ matched: number; updated: number }> => {
+    const res = await fetch(`${API_BASE_URL}/api/patients/bulk-update/`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ ...target, patch }),
+    });
+
+    if (!res.ok) {
+      throw new Error(`Failed to update patients: ${res.status}`);
+    }
+
+    return res.json();
+  },
+
   /**
    * Fetch paginated patients with filters
    */
   fetchPatients: async (
     params: FetchPatientsParams,
-  ): Promise<{ patients: Patient[]; totalPages: number }> => {
+  ): Promise<{ patients: PatientSummary[]; totalPages: number }> => {
     const { page, status, city, state, search, ordering } = params;
 
     const urlParams = new URLSearchParams({
       page: page.toString(),
+      // Skip the exact COUNT(*) on large tables
+      count: 'estimated',
       ...(status && { status }),
       ...(city && { city }),
       ...(state && { state }),
@@ -191,22 +269,50 @@ export const patientsApi = {
     const data: PaginatedResponse = await res.json();
 
     // Deduplicate patients by ID
-    const uniquePatients = data.results.reduce((acc: Patient[], patient) => {
-      if (!acc.some(p => p.id.toString() === patient.id.toString())) {
-        acc.push(patient);
-      }
-      return acc;
-    }, []);
+    const uniquePatients = data.results.reduce(
+      (acc: PatientSummary[], patient) => {
+        if (!acc.some(p => p.id.toString() === patient.id.toString())) {
+          acc.push(patient);
+        }
+        return acc;
+      },
+      [],
+    );
 
     return {
       patients: uniquePatients,
-      totalPages: Math.ceil(data.count / 20),
+      // An estimated count stops at 10k rows; a next link means at least one more page
+      totalPages: Math.max(Math.ceil(data.count / 20), data.next ? page + 1 : page),
     };
   },
 };
 
 // Utils for comparison and validation
 export const utils = {
+  /**
+   * Reduce a full patient to the compact row shown in the patient table
+   */
+  toPatientSummary(patient: Patient): PatientSummary {
+    const primaryAddress = patient.addresses?.[0];
+    const latestScore = patient.isi_scores?.[0];
+    return {
+      id: patient.id,
+      first_name: patient.first_name,
+      middle_name: patient.middle_name,
+      last_name: patient.last_name,
+      date_of_birth: patient.date_of_birth,
+      status: patient.status,
+      last_visit: patient.last_visit,
+      ready_to_discharge: patient.ready_to_discharge,
+      primary_city: primaryAddress?.city ?? null,
+      primary_state: primaryAddress?.state ?? null,
+      latest_isi_score: patient.latest_isi_score ?? latestScore?.score ?? null,
+      latest_isi_date: patient.latest_isi_date ?? latestScore?.date ?? null,
+      isi_trend_slope: patient.isi_trend_slope ?? null,
+      suggested_discharge: patient.suggested_discharge ?? false,
+    };
+  },
+
   /**
    * Deep equality check for custom field values arrays
    */
@@ -41,10 +41,32 @@ export interface Patient {
   ready_to_discharge: boolean;
   isi_scores: ISIScore[];
   custom_field_values: CustomFieldValue[];
+  latest_isi_score?: number | null;
+  latest_isi_date?: string | null;
+  isi_trend_slope?: number | null;
+  suggested_discharge?: boolean;
   created_at: string;
   updated_at: string;
 }
 
+// Compact row served by the patient list endpoint
+export interface PatientSummary {
+  id: string | number;
+  first_name: string;
+  middle_name?: string;
+  last_name: string;
+  date_of_birth: string;
+  status: Patient['status'];
+  last_visit: string | null;
+  ready_to_discharge: boolean;
+  primary_city: string | null;
+  primary_state: string | null;
+  latest_isi_score: number | null;
+  latest_isi_date: string | null;
+  isi_trend_slope?: number | null;
+  suggested_discharge?: boolean;
+}
+
 // Form related types
 export interface ValidationError {
   [key: string]: string;